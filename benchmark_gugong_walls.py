@@ -0,0 +1,672 @@
+"""download_gugong_walls.py 的基准测试
+
+在本地启动一个模拟 www.dpm.org.cn 的假服务器（主页面、带分页的检索列表页、图片下载接口），
+可以配置延迟、带宽、错误率和图片大小，然后分别测量：
+
+- parse:    列表页解析（parse_listing_page，每个可用的解析后端）
+- db:       数据库读写（db_upsert_wallpaper / db_has_wallpaper，直接写库与写线程批量提交）
+- download: 单线程逐张下载（download_wallpaper）
+- crawl:    完整爬取（crawl_all / crawl_all_async，全量模式）
+- queue:    分布式模式（run_coordinator + 多个 run_worker 子进程共用一个任务队列，全量模式）；
+            --queue_kill_after 可在运行中强杀第一个工作进程，检验租约过期后任务的重新分配
+- reconcile: walls/ 目录与数据库的比对（reconcile_walls），在生成的文件树上制造各类不一致后报告并修复
+
+结果以 JSON 输出（pages/s、images/s、MB/s、p50/p99 延迟、峰值 RSS 等），
+附带当前 git 提交，方便在不同提交之间比较。不会访问真实网站。
+
+使用示例：
+    python benchmark_gugong_walls.py
+    python benchmark_gugong_walls.py --pages 20 --latency_ms 50 --bandwidth_mbps 20 --error_rate 0.02
+    python benchmark_gugong_walls.py --stages crawl --engine async --output bench.json
+    python benchmark_gugong_walls.py --stages queue --queue_workers 4 --queue_kill_after 1 --lease_seconds 3
+    python benchmark_gugong_walls.py --stages reconcile --reconcile_files 100000
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import inspect
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import concurrent.futures
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import resource  # Windows 上没有
+except ImportError:
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 假服务器上每个壁纸提供的尺寸（与真实网站的电脑壁纸一致）
+FAKE_SIZES = {
+    13: "4000 x 2250",
+    12: "2560 x 1440",
+    4: "1920 x 1080",
+    3: "1680 x 1050",
+    2: "1280 x 800",
+    1: "1920 x 1280",
+}
+
+
+class FakeSiteConfig:
+    """假服务器的参数"""
+
+    def __init__(
+        self,
+        pages: int = 10,
+        items_per_page: int = 24,
+        latency_ms: float = 0.0,
+        bandwidth_mbps: float = 0.0,
+        error_rate: float = 0.0,
+        image_kb: int = 512,
+        max_page_size: int = 0,
+        silent_truncation: bool = False,
+    ):
+        self.pages = pages
+        self.items_per_page = items_per_page
+        # 条目总数（默认 pagesize 下共 pages 页）
+        self.total_items = pages * items_per_page
+        # 检索接口支持的最大 pagesize；0 表示忽略 pagesize 参数，总是每页 items_per_page 条
+        self.max_page_size = max_page_size
+        # 超过 max_page_size 时仍按请求的 pagesize 分页和计算 data-max，但每页只返回 max_page_size 条
+        self.silent_truncation = silent_truncation
+        self.latency = latency_ms / 1000.0
+        # 每个连接的带宽（MB/s），0 表示不限速
+        self.bandwidth = bandwidth_mbps * 1024 * 1024
+        self.error_rate = error_rate
+        # 所有图片共用同一份内容（PNG 文件头 + 随机字节 + IEND 块，--reconcile 按结束标记判断是否完整）
+        iend = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+        self.image = b"\x89PNG\r\n\x1a\n" + os.urandom(max(0, image_kb * 1024 - 8 - len(iend))) + iend
+
+
+def listing_page_layout(config: FakeSiteConfig, requested: Optional[int]) -> Tuple[int, int, int]:
+    """按请求的 pagesize 返回 (每页起始条目的间隔, 每页返回的条数, data-max 总页数)"""
+    if not config.max_page_size or not requested:
+        return config.items_per_page, config.items_per_page, config.pages
+    served = min(requested, config.max_page_size)
+    stride = requested if config.silent_truncation else served
+    return stride, served, -(-config.total_items // stride)
+
+
+def build_listing_html(page_num: int, config: FakeSiteConfig, page_size: Optional[int] = None) -> str:
+    """生成一页与真实网站结构一致的列表 HTML（含 download-pop 和分页组件）"""
+    stride, served, max_page = listing_page_layout(config, page_size)
+    start = (page_num - 1) * stride
+    items = []
+    for i in range(max(0, min(served, config.total_items - start))):
+        primaryid = str(100000 + start + i)
+        links = "".join(
+            f'<a href="javascript:;" data-size="{size}">{text}</a>' for size, text in FAKE_SIZES.items()
+        )
+        items.append(
+            f'<div class="list-item" data-key="{primaryid}">'
+            f'<a class="item-a" href="/lights/royal/{primaryid}.html">'
+            f'<img src="/Uploads/image/2026/01/28/{primaryid}.jpg" alt=""></a>'
+            f'<div class="txt">故宫壁纸 {primaryid}</div>'
+            f'<span class="icon" primaryid="{primaryid}"></span>'
+            f'<div class="download-pop" primaryid="{primaryid}">{links}</div>'
+            f'</div>'
+        )
+    paging = (
+        '<div class="paging-box cross-center main-center">'
+        + "".join(f'<a class="paging-link" data-key="{p}">{p}</a>' for p in range(1, min(max_page, 5) + 1))
+        + f'<button class="paging-btn" data-max="{max_page}">跳转</button></div>'
+    )
+    return f'<div class="list-box">{"".join(items)}</div>{paging}'
+
+
+def make_handler(config: FakeSiteConfig):
+    listing_cache: Dict[Tuple[int, Optional[int]], bytes] = {}
+
+    class FakeDpmHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, extra: Optional[Dict[str, str]] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (extra or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self._write(body)
+
+        def _write(self, body: bytes):
+            if not config.bandwidth:
+                self.wfile.write(body)
+                return
+            chunk_size = 64 * 1024
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start:start + chunk_size]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / config.bandwidth)
+
+        def do_GET(self):
+            if config.latency:
+                time.sleep(config.latency)
+            path = urlparse(self.path).path
+            if config.error_rate and random.random() < config.error_rate:
+                self._send(500, b"error", "text/plain")
+                return
+            if path == "/lights/royal.html":
+                self._send(200, b"<html><body>royal</body></html>", "text/html; charset=utf-8")
+            elif path == "/searchs/royalb.html":
+                query = parse_qs(urlparse(self.path).query)
+                page_num = int(query.get("p", ["1"])[0])
+                page_size = int(query["pagesize"][0]) if "pagesize" in query else None
+                if page_num > listing_page_layout(config, page_size)[2]:
+                    self._send(200, b"", "text/html; charset=utf-8")
+                    return
+                body = listing_cache.get((page_num, page_size))
+                if body is None:
+                    body = build_listing_html(page_num, config, page_size).encode("utf-8")
+                    listing_cache[(page_num, page_size)] = body
+                self._send(200, body, "text/html; charset=utf-8")
+            elif path.startswith("/download/lights_image/"):
+                self._send_image()
+            else:
+                self._send(404, b"not found", "text/plain")
+
+        def _send_image(self):
+            image = config.image
+            range_header = self.headers.get("Range", "")
+            if range_header.startswith("bytes="):
+                start = int(range_header[len("bytes="):].split("-")[0] or 0)
+                if start >= len(image):
+                    self._send(416, b"", "text/plain")
+                    return
+                self._send(206, image[start:], "image/png", {
+                    "Content-Range": f"bytes {start}-{len(image) - 1}/{len(image)}",
+                    "Accept-Ranges": "bytes",
+                })
+                return
+            self._send(200, image, "image/png", {"Accept-Ranges": "bytes"})
+
+    return FakeDpmHandler
+
+
+class FakeDpmServer:
+    """在后台线程中运行的假服务器"""
+
+    def __init__(self, config: FakeSiteConfig):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(config))
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="假服务器", daemon=True)
+
+    def __enter__(self) -> "FakeDpmServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    """延迟统计（毫秒）"""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3) if samples else None,
+        "p99_ms": round(percentile(samples, 99) * 1000, 3) if samples else None,
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """包裹 download_gugong_walls 中的函数，记录每次调用的耗时和返回值
+
+    只替换模块属性，被包裹的函数本身不变；结束后调用 restore 还原。
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.samples: Dict[str, List[float]] = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def wrap(self, name: str, count_bytes: bool = False) -> None:
+        original = getattr(self.module, name)
+        self._originals[name] = original
+        samples = self.samples.setdefault(name, [])
+
+        if inspect.iscoroutinefunction(original):
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                result = await original(*args, **kwargs)
+                self._record(samples, started, result if count_bytes else None)
+                return result
+        else:
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                result = original(*args, **kwargs)
+                self._record(samples, started, result if count_bytes else None)
+                return result
+
+        setattr(self.module, name, timed)
+
+    def _record(self, samples: List[float], started: float, result) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            samples.append(elapsed)
+            if result is not None:
+                # download_to_file 返回 (size, sha256)
+                self.bytes += result[0]
+
+    def restore(self) -> None:
+        for name, original in self._originals.items():
+            setattr(self.module, name, original)
+        self._originals = {}
+
+
+def point_module_at(gw, base_url: str) -> None:
+    """把模块中的网站地址替换为假服务器地址"""
+    gw.ALL_URL = f"{base_url}/lights/royal.html"
+    gw.FILTER_URL_TEMPLATE = f"{base_url}/searchs/royalb.html"
+    gw.IMG_DOWNLOAD_URL_TEMPLATE = f"{base_url}/download/lights_image/id/{{primaryid}}/img_size/{{size}}.html"
+
+
+def fresh_workdir(root: str, name: str) -> str:
+    """每个阶段在单独的目录中运行（相对路径的 walls/、walls.db、.cache/ 互不影响）"""
+    path = os.path.join(root, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.chdir(path)
+    return path
+
+
+def bench_parse(gw, config: FakeSiteConfig, iterations: int) -> Dict:
+    html = build_listing_html(1, config)
+    results = {}
+    for backend in gw.LISTING_PARSERS:
+        try:
+            gw.PARSER_BACKEND = gw.resolve_parser_backend(backend)
+        except RuntimeError:
+            continue
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            gw.parse_listing_page(html, device_type="电脑")
+            samples.append(time.perf_counter() - started)
+        total = sum(samples)
+        results[backend] = {
+            "pages_per_s": round(iterations / total, 2),
+            "items_per_s": round(iterations * config.items_per_page / total, 2),
+            **latency_summary(samples),
+        }
+    gw.PARSER_BACKEND = "auto"
+    if gw.parse_pool.enabled:
+        results["pool"] = bench_parse_pool(gw, html, config, iterations)
+    return results
+
+
+def bench_parse_pool(gw, html: str, config: FakeSiteConfig, iterations: int) -> Dict:
+    """--parse_workers 启用时比较进程池的几种提交方式：每页一个任务、parse_many 分批、多线程并发 parse（排队合并）"""
+    pool = gw.parse_pool
+    pages = [(html, "电脑")] * iterations
+
+    def measure(run) -> Dict:
+        tasks, pages_sent = pool.tasks, pool.pages
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        result = {
+            "pages_per_s": round(iterations / elapsed, 2),
+            "items_per_s": round(iterations * config.items_per_page / elapsed, 2),
+        }
+        if pool.tasks > tasks:
+            result["pages_per_task"] = round((pool.pages - pages_sent) / (pool.tasks - tasks), 2)
+        return result
+
+    def per_page() -> None:
+        futures = [pool._executor.submit(gw.parse_listing_html, page, device) for page, device in pages]
+        for future in futures:
+            future.result()
+
+    def threaded() -> None:
+        # 模拟多个列表页线程同时解析
+        with concurrent.futures.ThreadPoolExecutor(max_workers=pool.workers * 4) as executor:
+            list(executor.map(lambda page: pool.parse(*page), pages))
+
+    return {
+        "per_page": {**measure(per_page), "pages_per_task": 1.0},
+        "parse_many": measure(lambda: pool.parse_many(pages)),
+        "threaded_parse": measure(threaded),
+    }
+
+
+def bench_db(gw, iterations: int) -> Dict:
+    rows = [(str(200000 + i), "电脑", "2026", "01", f"壁纸{i}", "4000 x 2250", f"walls/电脑/2026/01/{i}.png") for i in range(iterations)]
+    gw.init_db()
+
+    started = time.perf_counter()
+    for primaryid, device, year, month, name, px, rel_path in rows:
+        gw.db_upsert_wallpaper(primaryid, device, year, month, name, px, rel_path)
+    direct_upsert = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for primaryid, device, _, _, _, px, _ in rows:
+        gw.db_has_wallpaper(primaryid, px, device)
+    direct_lookup = time.perf_counter() - started
+
+    os.remove(gw.DB_PATH)
+    with gw.db_session() as writer:
+        started = time.perf_counter()
+        for primaryid, device, year, month, name, px, rel_path in rows:
+            gw.db_upsert_wallpaper(primaryid, device, year, month, name, px, rel_path)
+        writer.flush()
+        batched_upsert = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for primaryid, device, _, _, _, px, _ in rows:
+            gw.db_has_wallpaper(primaryid, px, device)
+        indexed_lookup = time.perf_counter() - started
+
+    return {
+        "rows": iterations,
+        "upsert_direct_per_s": round(iterations / direct_upsert, 2),
+        "lookup_direct_per_s": round(iterations / direct_lookup, 2),
+        "upsert_batched_per_s": round(iterations / batched_upsert, 2),
+        "lookup_indexed_per_s": round(iterations / indexed_lookup, 2),
+    }
+
+
+def bench_download(gw, count: int) -> Dict:
+    timer = StageTimer(gw)
+    timer.wrap("download_to_file", count_bytes=True)
+    try:
+        with gw.db_session():
+            started = time.perf_counter()
+            for i in range(count):
+                primaryid = str(300000 + i)
+                gw.download_wallpaper(
+                    url=gw.IMG_DOWNLOAD_URL_TEMPLATE.format(primaryid=primaryid, size=13),
+                    name=f"壁纸{i}",
+                    px="4000 x 2250",
+                    page_num=1,
+                    index=i,
+                    device_folder="电脑",
+                    primaryid=primaryid,
+                    year="2026",
+                    month="01",
+                )
+            elapsed = time.perf_counter() - started
+    finally:
+        timer.restore()
+    images = len(timer.samples["download_to_file"])
+    return {
+        "images": images,
+        "seconds": round(elapsed, 3),
+        "images_per_s": round(images / elapsed, 2),
+        "mb_per_s": round(timer.bytes / elapsed / (1024 * 1024), 2),
+        "transfer_latency": latency_summary(timer.samples["download_to_file"]),
+    }
+
+
+def bench_crawl(gw, engine: str, device_name: str, concurrency: int) -> Dict:
+    timer = StageTimer(gw)
+    if engine == "async":
+        timer.wrap("async_fetch_listing")
+        timer.wrap("async_download_to_file", count_bytes=True)
+        fetch_name, download_name = "async_fetch_listing", "async_download_to_file"
+    else:
+        timer.wrap("fetch_listing")
+        timer.wrap("download_to_file", count_bytes=True)
+        fetch_name, download_name = "fetch_listing", "download_to_file"
+    started = time.perf_counter()
+    try:
+        if engine == "async":
+            gw.crawl_all_async(device_name=device_name, full_scan=True, concurrency=concurrency)
+        else:
+            gw.crawl_all(device_name=device_name, full_scan=True)
+    finally:
+        timer.restore()
+    elapsed = time.perf_counter() - started
+    pages = len(timer.samples[fetch_name])
+    images = len(timer.samples[download_name])
+    return {
+        "engine": engine,
+        "device_name": device_name,
+        "seconds": round(elapsed, 3),
+        "pages": pages,
+        "images": images,
+        "pages_per_s": round(pages / elapsed, 2),
+        "images_per_s": round(images / elapsed, 2),
+        "mb_per_s": round(timer.bytes / elapsed / (1024 * 1024), 2),
+        "fetch_latency": latency_summary(timer.samples[fetch_name]),
+        "transfer_latency": latency_summary(timer.samples[download_name]),
+    }
+
+
+def queue_worker_process(base_url: str, workdir: str, queue_path: str, log_level: str, max_rps: float, lease_seconds: float) -> None:
+    """queue 阶段的工作进程入口（以 spawn 方式启动，在子进程中重新导入脚本）"""
+    os.chdir(workdir)
+    sys.path.insert(0, SCRIPT_DIR)
+    import download_gugong_walls as gw
+    logging.getLogger().setLevel(log_level)
+    point_module_at(gw, base_url)
+    gw.rate_limiters.configure(rps=max_rps, max_rps=max_rps)
+    gw.run_worker(queue_path, lease_seconds=lease_seconds)
+
+
+def bench_queue(gw, base_url: str, args: argparse.Namespace) -> Dict:
+    workdir = os.getcwd()
+    queue_path = os.path.join(workdir, "queue.db")
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=queue_worker_process,
+            args=(base_url, workdir, queue_path, args.log_level, args.max_rps, args.lease_seconds),
+            name=f"queue-worker-{n}",
+        )
+        for n in range(args.queue_workers)
+    ]
+    timer = StageTimer(gw)
+    timer.wrap("fetch_listing")
+    started = time.perf_counter()
+    killer = None
+    try:
+        for worker in workers:
+            worker.start()
+        if args.queue_kill_after > 0 and workers:
+            # 模拟工作进程崩溃：它持有的租约到期后，任务应由其他工作进程接手
+            killer = threading.Timer(args.queue_kill_after, workers[0].kill)
+            killer.start()
+        gw.run_coordinator(queue_path, device_name=args.device_name, full_scan=True)
+        for worker in workers:
+            worker.join()
+    finally:
+        timer.restore()
+        if killer is not None:
+            killer.cancel()
+        for worker in workers:
+            if worker.is_alive():
+                worker.kill()
+                worker.join()
+    elapsed = time.perf_counter() - started
+    counts = gw.JobQueue(queue_path).counts()
+    images = counts.get("done", 0)
+    return {
+        "workers": args.queue_workers,
+        "seconds": round(elapsed, 3),
+        "pages": len(timer.samples["fetch_listing"]),
+        "images": images,
+        "images_per_s": round(images / elapsed, 2),
+        "queue": counts,
+        "worker_exit_codes": [worker.exitcode for worker in workers],
+    }
+
+
+def bench_reconcile(gw, count: int) -> Dict:
+    """生成 count 个文件和对应记录，按 1% 的比例制造各类不一致，测量报告与修复的耗时"""
+    drift = max(1, count // 100)
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for i in range(count):
+        primaryid = str(400000 + i)
+        year, month = str(2000 + i // 1200), f"{i // 100 % 12 + 1:02d}"
+        _, filepath, rel_path = gw.build_wallpaper_path("电脑", primaryid, f"壁纸{i}", "4000 x 2250", year, month)
+        with open(filepath, "wb") as f:
+            f.write(b"\x89PNG" + bytes(60))
+        rows.append((primaryid, "电脑", year, month, f"壁纸{i}", "4000x2250", rel_path, now, now, None, 64))
+    gw.init_db()
+    conn = gw.db_get_connection()
+    try:
+        with conn:
+            conn.executemany(gw.UPSERT_WALLPAPER_SQL, rows[drift:])
+            conn.executemany("UPDATE wallpapers SET rel_path = ? WHERE primaryid = ?", [(row[6] + ".old", row[0]) for row in rows[drift:2 * drift]])
+    finally:
+        conn.close()
+    for row in rows[2 * drift:3 * drift]:
+        os.remove(row[6])
+    for row in rows[3 * drift:4 * drift]:
+        os.truncate(row[6], 10)
+
+    started = time.perf_counter()
+    found = gw.reconcile_walls()
+    report_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    gw.reconcile_walls(fix=True)
+    fix_seconds = time.perf_counter() - started
+    remaining = gw.reconcile_walls()
+    return {
+        "files": count,
+        "report_seconds": round(report_seconds, 3),
+        "fix_seconds": round(fix_seconds, 3),
+        "files_per_s": round(count / report_seconds, 2),
+        "found": found,
+        "remaining": sum(remaining.values()),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="download_gugong_walls.py 基准测试（本地假服务器）")
+    parser.add_argument("--stages", default="parse,db,download,crawl", help="要运行的阶段，逗号分隔")
+    parser.add_argument("--pages", type=int, default=10, help="假服务器的列表页总数")
+    parser.add_argument("--items_per_page", type=int, default=24)
+    parser.add_argument("--max_page_size", type=int, default=0, help="假服务器支持的最大 pagesize（0 表示忽略 pagesize 参数）")
+    parser.add_argument("--silent_truncation", action="store_true", help="超过 max_page_size 时悄悄截断每页条数（data-max 仍按请求的 pagesize 计算）")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="每个请求的服务器延迟（毫秒）")
+    parser.add_argument("--bandwidth_mbps", type=float, default=0.0, help="每个连接的带宽（MB/s），0 表示不限速")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="请求返回 500 的概率")
+    parser.add_argument("--image_kb", type=int, default=512, help="每张图片的大小（KB）")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread", help="crawl 阶段使用的引擎")
+    parser.add_argument("--device_name", default="电脑", help="crawl 阶段爬取的设备类型（可用 \"全部\"）")
+    parser.add_argument("--concurrency", type=int, default=50, help="异步引擎的并发上限")
+    parser.add_argument("--max_rps", type=float, default=1000.0, help="限速器的每秒请求数上限")
+    parser.add_argument("--parse_workers", type=int, default=0, help="crawl / queue 阶段列表页解析进程数（0 表示在抓取线程中解析）")
+    parser.add_argument("--parse_iterations", type=int, default=200)
+    parser.add_argument("--db_rows", type=int, default=5000)
+    parser.add_argument("--download_count", type=int, default=50)
+    parser.add_argument("--queue_workers", type=int, default=4, help="queue 阶段的工作进程数")
+    parser.add_argument("--lease_seconds", type=float, default=30.0, help="queue 阶段的任务租约时长（秒）")
+    parser.add_argument("--queue_kill_after", type=float, default=0.0, help="queue 阶段在多少秒后强杀第一个工作进程（0 表示不强杀）")
+    parser.add_argument("--reconcile_files", type=int, default=10000, help="reconcile 阶段生成的文件数")
+    parser.add_argument("--log_level", default="WARNING", help="脚本自身的日志级别（默认 WARNING，避免日志输出影响结果）")
+    parser.add_argument("--workdir", default=None, help="工作目录（默认使用临时目录，结束后删除）")
+    parser.add_argument("--output", default=None, help="结果 JSON 写入的文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    config = FakeSiteConfig(
+        pages=args.pages,
+        items_per_page=args.items_per_page,
+        latency_ms=args.latency_ms,
+        bandwidth_mbps=args.bandwidth_mbps,
+        error_rate=args.error_rate,
+        image_kb=args.image_kb,
+        max_page_size=args.max_page_size,
+        silent_truncation=args.silent_truncation,
+    )
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="gugong_bench_")
+    cwd = os.getcwd()
+
+    # 脚本导入时会在当前目录创建 logs/，先切换到工作目录再导入
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, SCRIPT_DIR)
+    import download_gugong_walls as gw
+    logging.getLogger().setLevel(args.log_level)
+    gw.parse_pool.start(args.parse_workers)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "workdir")},
+        "stages": {},
+    }
+    try:
+        with FakeDpmServer(config) as server:
+            point_module_at(gw, server.base_url)
+            # 基准测试关心的是脚本本身的吞吐量，限速器从较高的速率起步
+            gw.rate_limiters.configure(rps=args.max_rps, max_rps=args.max_rps, in_flight=args.concurrency, max_in_flight=args.concurrency)
+            for stage in stages:
+                fresh_workdir(workdir, stage)
+                if stage == "parse":
+                    report["stages"]["parse"] = bench_parse(gw, config, args.parse_iterations)
+                elif stage == "db":
+                    report["stages"]["db"] = bench_db(gw, args.db_rows)
+                elif stage == "download":
+                    report["stages"]["download"] = bench_download(gw, args.download_count)
+                elif stage == "crawl":
+                    report["stages"]["crawl"] = bench_crawl(gw, args.engine, args.device_name, args.concurrency)
+                elif stage == "queue":
+                    report["stages"]["queue"] = bench_queue(gw, server.base_url, args)
+                elif stage == "reconcile":
+                    report["stages"]["reconcile"] = bench_reconcile(gw, args.reconcile_files)
+                else:
+                    raise SystemExit(f"未知的阶段: {stage}")
+    finally:
+        gw.parse_pool.shutdown()
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
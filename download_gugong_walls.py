@@ -1,21 +1,86 @@
 import os
 import re
+import io
+import ast
+import json
 import time
 import pathlib
 import random
+import queue
+import asyncio
 import threading
 import logging
+import logging.handlers
+import sys
 import sqlite3
+import atexit
+import contextlib
+import hashlib
+import shutil
+import socket
+import multiprocessing
+import concurrent.futures
+import itertools
+import collections
+import cProfile
+import pstats
+import tracemalloc
 from datetime import datetime
-from urllib.parse import urljoin, urlparse, urlencode
-from typing import Dict, List, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlparse, urlencode, parse_qsl
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import requests
 from bs4 import BeautifulSoup
 
+try:
+    import lxml.html  # 可选依赖：列表页的快速解析后端（--parser lxml）
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+try:
+    import aiohttp  # 可选依赖：仅异步引擎（--engine async）需要
+except ImportError:
+    aiohttp = None
+
 # 线程数
 THREAD_COUNT = 10
 
+# 全量模式下抓取列表页的线程数（图片下载由 THREAD_COUNT 个下载线程负责）
+PAGE_THREAD_COUNT = 4
+
+# 增量模式下处理当前页时并发预取的后续页数（0 表示逐页请求）
+INCREMENTAL_PREFETCH_PAGES = 3
+
+# 列表页抓取与图片下载之间的有界队列长度（队列满时抓取线程阻塞，形成背压）
+ITEM_QUEUE_SIZE = 100
+
+# 异步引擎的最大并发请求数（同一事件循环内同时在途的请求上限）
+ASYNC_CONCURRENCY = 200
+
+# 异步引擎在没有指定 --max_rps 时的每秒请求数上限（RATE_LIMIT_MAX_RPS 下在途请求数远达不到 ASYNC_CONCURRENCY）
+ASYNC_MAX_RPS = 50.0
+
+# 异步引擎写图片时攒够多少字节交给线程池写一次（写盘和 SHA-256 不在事件循环中执行）
+ASYNC_WRITE_BUFFER_BYTES = 256 * 1024
+
+# 每张壁纸下载哪些分辨率：
+# - "best"：按设备类型的优先级只下载最高画质（默认）
+# - "all"：下载列表页 download-pop 中列出的所有分辨率
+# - 尺寸编号集合（如 {13, 12}，编号见 SIZE_FORMAT_MAP）：只下载其中可用的分辨率
+DOWNLOAD_SIZES = "best"
+
+# 列表页解析后端：auto（安装了 lxml 时用 lxml，否则用 bs4）、lxml、bs4
+PARSER_BACKEND = "auto"
+
+# 列表页解析进程数（--parse_workers），0 表示在抓取线程中直接解析
+PARSE_WORKERS = 0
+# 启用解析进程池时，小于该字节数的页面仍在本进程解析（进程间传输的开销大于解析本身）
+PARSE_POOL_MIN_HTML = 4096
+# 一个解析任务最多包含的页数（解析进程都在忙时，排队的页面合并为一个任务发送，减少进程间往返）
+PARSE_POOL_BATCH_PAGES = 8
+
 # 线程锁（用于打印输出和日志）
 print_lock = threading.Lock()
 
@@ -30,21 +95,63 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # 创建日志文件名（带时间戳）
 log_filename = os.path.join(LOG_DIR, f"download_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format=LOG_FORMAT,
-    datefmt=DATE_FORMAT,
-    handlers=[
-        logging.FileHandler(log_filename, encoding='utf-8'),  # 文件日志
-        logging.StreamHandler()  # 控制台日志
-    ]
-)
+# --log_format json 时，从日志记录的 extra 中输出的结构化字段
+LOG_STRUCTURED_FIELDS = ("primaryid", "device", "px", "bytes", "duration", "page", "url")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """--log_format json：每条日志一行 JSON（时间、级别、线程、消息，以及 LOG_STRUCTURED_FIELDS 中存在的字段）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for field in LOG_STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """只把日志记录放入队列：% 参数格式化、JSON 序列化和写文件/控制台都在后台监听线程中进行
+
+    标准的 QueueHandler 会在调用线程里先格式化消息，这里原样放入队列，工作线程不再持有任何处理器锁。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# 配置日志：各线程只把记录放入队列，由后台监听线程写入文件和控制台
+# delay：第一条日志写入时才创建文件（解析进程以 spawn / forkserver 方式重新导入脚本时不会留下空的日志文件）
+log_file_handler = logging.FileHandler(log_filename, encoding='utf-8', delay=True)  # 文件日志
+log_console_handler = logging.StreamHandler()  # 控制台日志
+for _handler in (log_file_handler, log_console_handler):
+    _handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+log_listener = logging.handlers.QueueListener(log_queue, log_file_handler, log_console_handler, respect_handler_level=True)
+logging.basicConfig(level=logging.INFO, handlers=[DeferredQueueHandler(log_queue)])
+log_listener.start()
+# 退出时先写完队列中剩余的日志
+atexit.register(log_listener.stop)
 
 logger = logging.getLogger(__name__)
 
-# 创建全局 Session 以保持 cookies（主线程使用）
-session = requests.Session()
+
+def set_log_format(log_format: str) -> None:
+    """--log_format：text（默认）或 json（日志文件改为 JSON Lines，控制台仍为文本）"""
+    if log_format == "json":
+        log_file_handler.setFormatter(JsonLinesFormatter())
+    elif log_format == "text":
+        log_file_handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    else:
+        raise ValueError(f"未知的日志格式: {log_format}（可选: text, json）")
 
 # 多个 User-Agent 列表（随机使用，模拟不同浏览器）
 USER_AGENTS = [
@@ -95,10 +202,61 @@ def get_random_headers(referer: Optional[str] = None, is_ajax: bool = False) ->
 
 # 基础配置
 DOWNLOAD_DIR = "walls"
-REQUEST_INTERVAL = 1.0
+
+# 限速配置（每个主机一个限速器，所有线程/协程的请求都要经过它）
+# - 令牌桶：平均每秒请求数，在 [RATE_LIMIT_MIN_RPS, RATE_LIMIT_MAX_RPS] 之间自适应
+# - 在途请求上限：在 [1, RATE_LIMIT_MAX_IN_FLIGHT] 之间自适应（AIMD）
+RATE_LIMIT_INITIAL_RPS = 2.0
+RATE_LIMIT_MIN_RPS = 0.2
+RATE_LIMIT_MAX_RPS = 10.0
+RATE_LIMIT_INITIAL_IN_FLIGHT = 4
+RATE_LIMIT_MAX_IN_FLIGHT = 16
+# 首字节延迟超过历史最低延迟的多少倍时，视为服务器开始吃力，不再加速
+RATE_LIMIT_LATENCY_FACTOR = 3.0
 
 # 本地数据库配置（用于记录已下载壁纸，避免重复下载）
 DB_PATH = "walls.db"
+# walls.db 是否使用 WAL 模式。分布式模式（--coordinator / --worker）下 walls.db 可能放在多台机器共用的共享卷上，
+# WAL 依赖共享内存、不能跨机器使用，此时改用默认的 DELETE 日志模式
+DB_WAL = True
+
+# 数据库写线程批量提交的条件：攒够 DB_BATCH_SIZE 条或距第一条未提交记录超过 DB_FLUSH_INTERVAL 秒
+DB_BATCH_SIZE = 200
+DB_FLUSH_INTERVAL = 1.0
+
+# --reconcile：并行扫描下载目录的线程数；每类问题在日志中列出的条数
+RECONCILE_SCAN_WORKERS = 8
+RECONCILE_REPORT_LIMIT = 20
+
+# 列表页每页条数：网站默认 LISTING_PAGE_SIZE_DEFAULT 条；启动时从大到小尝试 LISTING_PAGE_SIZE_CANDIDATES，
+# 使用检索接口如实支持的最大值（按分类缓存在数据库中，LISTING_PAGE_SIZE_TTL_DAYS 天后重新探测）
+LISTING_PAGE_SIZE_DEFAULT = 24
+LISTING_PAGE_SIZE_CANDIDATES = (240, 120, 96, 48)
+LISTING_PAGE_SIZE_TTL_DAYS = 7
+
+# 列表页缓存目录：保存每个列表页的 ETag / Last-Modified、HTML 和解析结果，用于条件 GET
+LISTING_CACHE_DIR = os.path.join(".cache", "listing")
+
+# HTTP 超时（秒）：连接超时与读取超时分开设置；读取超时是两次收到数据之间的最长间隔，图片流式下载时放宽
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_READ_TIMEOUT = 15.0
+HTTP_DOWNLOAD_READ_TIMEOUT = 30.0
+# 连接池缓存的主机数（列表页和图片在同一主机，留一些余量）
+HTTP_POOL_HOSTS = 4
+
+# 图片下载重试配置：失败后按指数退避 + 随机抖动重试，并用 Range 请求从 .part 文件的已下载位置续传
+DOWNLOAD_MAX_RETRIES = 5
+DOWNLOAD_RETRY_BASE_DELAY = 1.0
+DOWNLOAD_RETRY_MAX_DELAY = 30.0
+# 下载中的临时文件后缀（下载完成后才重命名为最终文件名）
+PART_SUFFIX = ".part"
+
+# 分布式模式（--coordinator / --worker）的共享任务队列：
+# 工作进程领取任务时获得 QUEUE_LEASE_SECONDS 秒的租约，过期未完成的任务会重新分配；
+# 同一任务最多尝试 QUEUE_MAX_ATTEMPTS 次；没有可领取的任务时每 QUEUE_POLL_INTERVAL 秒查询一次
+QUEUE_LEASE_SECONDS = 600
+QUEUE_MAX_ATTEMPTS = 3
+QUEUE_POLL_INTERVAL = 2.0
 
 # 全部壁纸URL
 ALL_URL = "https://www.dpm.org.cn/lights/royal.html"
@@ -163,6 +321,407 @@ DEVICE_TYPE_MAP = {
 # 默认分类ID
 DEFAULT_CATEGORY_ID = 624
 
+# "全部" 模式下依次下载的设备类型
+ALL_DEVICE_TYPES = ["电脑", "手机", "月历", "4K"]
+
+# 延迟直方图的桶（秒）
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# --metrics_file 模式下重写指标文件的间隔（秒）
+METRICS_TEXTFILE_INTERVAL = 15.0
+
+# 指标名称与说明（Prometheus 文本格式的 # HELP / # TYPE）
+METRIC_DEFINITIONS = {
+    "gugong_pages_fetched_total": ("counter", "抓取的列表页数（按 HTTP 状态码）"),
+    "gugong_items_parsed_total": ("counter", "从列表页解析出的壁纸条目数"),
+    "gugong_skips_total": ("counter", "跳过下载的壁纸数（db: 数据库已有, fs: 文件已存在, link: 链接已下载的相同内容）"),
+    "gugong_downloads_total": ("counter", "图片下载结果（ok / failed）"),
+    "gugong_download_bytes_total": ("counter", "下载并通过校验的图片字节数"),
+    "gugong_download_retries_total": ("counter", "图片下载的重试次数"),
+    "gugong_failures_total": ("counter", "失败次数（按阶段）"),
+    "gugong_db_rows_total": ("counter", "提交到数据库的记录数"),
+    "gugong_fetch_seconds": ("histogram", "列表页请求耗时"),
+    "gugong_parse_seconds": ("histogram", "列表页解析耗时"),
+    "gugong_db_seconds": ("histogram", "数据库操作耗时（按操作）"),
+    "gugong_transfer_seconds": ("histogram", "单张图片的传输耗时（含重试）"),
+    "gugong_in_flight_requests": ("gauge", "在途请求数（按主机）"),
+    "gugong_in_flight_limit": ("gauge", "限速器当前的在途请求上限（按主机）"),
+    "gugong_requests_per_second_limit": ("gauge", "限速器当前的每秒请求数（按主机）"),
+    "gugong_download_queue_depth": ("gauge", "下载流水线队列中等待的任务数"),
+    "gugong_http_connections_opened_total": ("counter", "新建的 HTTP 连接数（按主机；复用 keep-alive 连接时不增加）"),
+    "gugong_db_writer_queue_depth": ("gauge", "数据库写线程队列中等待的记录数"),
+}
+
+# --profile 模式下按阶段统计的阶段名
+PROFILE_STAGES = ("fetch", "parse", "sizes", "db", "write")
+
+# --profile 模式下 tracemalloc 为每次分配保留的调用栈深度（越深越能把分配归到阶段，开销也越大）
+PROFILE_TRACEMALLOC_FRAMES = 32
+
+# --profile 模式下检查内存高点并保存快照的间隔（秒）
+PROFILE_SNAPSHOT_INTERVAL = 2.0
+
+# --profile 报告中列出的函数数和分配位置数
+PROFILE_TOP_N = 40
+
+# Python 3.12 起 cProfile 基于 sys.monitoring：一个分析器即覆盖所有线程，且同一时刻只能启用一个；
+# 之前的版本每个线程需要各自启用一个 cProfile
+PROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """进程内指标：计数器、延迟直方图和按需读取的仪表，导出为 Prometheus 文本格式
+
+    - inc / observe 在各阶段调用，只在锁内做加法
+    - 仪表（在途请求数、队列深度）注册为回调，导出时才读取
+    - 通过 serve（本地 HTTP /metrics）或 start_textfile（定期写文件，供 node_exporter 的 textfile collector 读取）导出
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        # 名称 -> 标签 -> [各桶计数..., 总和, 总数]
+        self._histograms: Dict[str, Dict[LabelSet, List[float]]] = {}
+        self._gauges: Dict[str, object] = {}
+        self._textfile_stop: Optional[threading.Event] = None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, name: str, **labels):
+        """with metrics.time("gugong_parse_seconds"): ... 记录代码块的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def gauge(self, name: str, read) -> None:
+        """注册仪表：read() 返回 [(标签字典, 数值), ...]"""
+        self._gauges[name] = read
+
+    @staticmethod
+    def _format_labels(labels) -> str:
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def _header(self, lines: List[str], name: str) -> None:
+        metric_type, description = METRIC_DEFINITIONS.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+        for name, series in sorted(counters.items()):
+            self._header(lines, name)
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name)
+            for labels, values in sorted(series.items()):
+                for bound, count in zip(self.buckets, values):
+                    bucket_labels = labels + (("le", f"{bound:g}"),)
+                    lines.append(f"{name}_bucket{self._format_labels(bucket_labels)} {count:g}")
+                lines.append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {values[-1]:g}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {values[-1]:g}")
+        for name, read in sorted(self._gauges.items()):
+            self._header(lines, name)
+            for labels, value in read():
+                lines.append(f"{name}{self._format_labels(tuple(sorted(labels.items())))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """写入指标文件（先写临时文件再替换，读取方不会读到半个文件）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_textfile(self, path: str, interval: float = METRICS_TEXTFILE_INTERVAL) -> None:
+        """后台线程每隔 interval 秒重写一次指标文件，stop_textfile 时再写最后一次"""
+        stop = threading.Event()
+        self._textfile_stop = stop
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.write_textfile(path)
+                except OSError as e:
+                    logger.warning(f"写入指标文件失败: {e}")
+            self.write_textfile(path)
+
+        self._textfile_thread = threading.Thread(target=run, name="指标写线程", daemon=True)
+        self._textfile_thread.start()
+
+    def stop_textfile(self) -> None:
+        if self._textfile_stop is not None:
+            self._textfile_stop.set()
+            self._textfile_thread.join()
+            self._textfile_stop = None
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """在后台线程中提供 http://host:port/metrics"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="指标服务线程", daemon=True).start()
+        logger.info(f"指标地址: http://{host}:{server.server_port}/metrics")
+        return server
+
+
+# 全局指标
+metrics = MetricsRegistry()
+
+
+class StageProfiler:
+    """--profile 模式：用 cProfile 和 tracemalloc 分析一次爬取，并按阶段（PROFILE_STAGES）汇总
+
+    - Python 3.12 以前主线程和之后启动的所有线程（列表页线程、下载线程、to_thread 线程池）各有一个 cProfile，
+      结束时合并；3.12 起只启用一个进程级的 cProfile（PROFILE_PER_THREAD）
+    - with profiler.stage("parse"): ... 标记阶段；CPU 时间（time.thread_time）只计入最内层的阶段
+    - 内存分配按调用栈中最内层的阶段代码块归类，统计的是内存最高时的快照
+    - 未启用时 stage() 返回空上下文，几乎没有开销
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles: List[cProfile.Profile] = []
+        # 阶段 -> [次数, 墙钟秒数（含嵌套）, CPU 秒数（不含嵌套）]
+        self._stages: Dict[str, List[float]] = {}
+        # 阶段 -> {(文件名, with 语句行号)}，生成报告时用来把内存分配归到阶段
+        self._stage_sites: Dict[str, Set[Tuple[str, int]]] = {}
+        self._peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot_stop: Optional[threading.Event] = None
+        self._started_wall = 0.0
+        self._started_cpu = 0.0
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        caller = sys._getframe(1)
+        return self._stage(name, (caller.f_code.co_filename, caller.f_lineno))
+
+    @contextlib.contextmanager
+    def _stage(self, name: str, site: Tuple[str, int]):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        now = time.thread_time()
+        if stack:
+            # 外层阶段暂停计时
+            outer = stack[-1]
+            outer[2] += now - outer[1]
+        # [阶段名, 本段开始的 CPU 时间, 已累计的 CPU 时间]
+        entry = [name, now, 0.0]
+        stack.append(entry)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            now = time.thread_time()
+            stack.pop()
+            if stack:
+                stack[-1][1] = now
+            with self._lock:
+                totals = self._stages.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += entry[2] + now - entry[1]
+                self._stage_sites.setdefault(name, set()).add(site)
+
+    def start(self) -> None:
+        """开始分析：启用 cProfile（3.12 以前之后启动的线程在第一次调用时各自启用）"""
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        self._profiles = []
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread = threading.Thread(target=self._watch_peak, name="内存快照线程", daemon=True)
+        self._snapshot_thread.start()
+        self.enabled = True
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        if PROFILE_PER_THREAD:
+            threading.setprofile(self._enable_in_thread)
+        self._enable_in_thread()
+        # 重启日志监听线程，让日志的格式化和写入也出现在分析结果中
+        log_listener.stop()
+        log_listener.start()
+
+    def _enable_in_thread(self, *args) -> None:
+        # 作为 threading.setprofile 的钩子在新线程中第一次被调用，之后由该线程自己的 cProfile 接管
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def _watch_peak(self) -> None:
+        """定期检查 tracemalloc 的内存高点，创新高时保存一份快照"""
+        peak_seen = 0
+        while not self._snapshot_stop.wait(PROFILE_SNAPSHOT_INTERVAL):
+            current, _ = tracemalloc.get_traced_memory()
+            if current > peak_seen:
+                peak_seen = current
+                self._peak_snapshot = tracemalloc.take_snapshot()
+
+    def stop(self, output_prefix: str) -> Tuple[str, str]:
+        """停止分析，写入 output_prefix.txt（报告）和 output_prefix.pstats，返回两个路径"""
+        threading.setprofile(None)
+        with self._lock:
+            profiles = list(self._profiles)
+        for profile in profiles:
+            profile.disable()
+        self.enabled = False
+        wall = time.perf_counter() - self._started_wall
+        cpu = time.process_time() - self._started_cpu
+        self._snapshot_stop.set()
+        self._snapshot_thread.join()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        final_snapshot = tracemalloc.take_snapshot()
+        snapshot = self._peak_snapshot
+        if snapshot is None or sum(t.size for t in snapshot.traces) < traced_current:
+            snapshot = final_snapshot
+        tracemalloc.stop()
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            profile.create_stats()
+            if profile.stats:
+                stats.add(profile)
+        pstats_path = f"{output_prefix}.pstats"
+        stats.dump_stats(pstats_path)
+
+        report_path = f"{output_prefix}.txt"
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(self._format_report(stats, snapshot, wall, cpu, traced_current, traced_peak))
+        return report_path, pstats_path
+
+    def _stage_ranges(self) -> List[Tuple[str, str, int, int]]:
+        """把记录的 with 语句位置展开为代码块的行范围 [(阶段, 文件名, 起始行, 结束行)]"""
+        blocks: Dict[str, Dict[int, int]] = {}
+        ranges = []
+        for name, sites in self._stage_sites.items():
+            for filename, lineno in sites:
+                if filename not in blocks:
+                    blocks[filename] = {}
+                    try:
+                        with open(filename, encoding="utf-8") as f:
+                            tree = ast.parse(f.read())
+                    except (OSError, SyntaxError, ValueError):
+                        continue
+                    for node in ast.walk(tree):
+                        if isinstance(node, (ast.With, ast.AsyncWith)):
+                            blocks[filename][node.lineno] = node.end_lineno
+                end = blocks[filename].get(lineno, lineno)
+                ranges.append((name, filename, lineno, end))
+        # 较小的代码块优先匹配（嵌套时归到内层阶段）
+        ranges.sort(key=lambda r: r[3] - r[2])
+        return ranges
+
+    @staticmethod
+    def _classify(traceback: tracemalloc.Traceback, ranges) -> str:
+        for frame in reversed(traceback):
+            for name, filename, start, end in ranges:
+                if frame.lineno >= start and frame.lineno <= end and frame.filename == filename:
+                    return name
+        return "其他"
+
+    def _format_report(self, stats: pstats.Stats, snapshot, wall: float, cpu: float, traced_current: int, traced_peak: int) -> str:
+        out = io.StringIO()
+        ranges = self._stage_ranges()
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        stage_bytes: Dict[str, int] = {}
+        sites: Dict[Tuple[str, int, str], List[int]] = {}
+        for stat in snapshot.statistics("traceback"):
+            name = self._classify(stat.traceback, ranges)
+            stage_bytes[name] = stage_bytes.get(name, 0) + stat.size
+            frame = stat.traceback[-1]
+            totals = sites.setdefault((frame.filename, frame.lineno, name), [0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+
+        out.write(f"墙钟时间: {wall:.2f} 秒，进程 CPU 时间: {cpu:.2f} 秒\n")
+        out.write(f"tracemalloc: 结束时 {traced_current / 1024 / 1024:.1f} MiB，峰值 {traced_peak / 1024 / 1024:.1f} MiB\n\n")
+
+        out.write("==== 按阶段统计（墙钟时间为各线程之和，含嵌套阶段；CPU 时间不含嵌套阶段）====\n")
+        out.write(f"{'阶段':<8}{'次数':>10}{'墙钟(秒)':>12}{'CPU(秒)':>12}{'CPU占比':>10}{'内存高点(KiB)':>16}\n")
+        with self._lock:
+            stages = {name: list(values) for name, values in self._stages.items()}
+        names = [name for name in PROFILE_STAGES if name in stages] + sorted(set(stages) - set(PROFILE_STAGES))
+        staged_cpu = 0.0
+        for name in names:
+            count, stage_wall, stage_cpu = stages[name]
+            staged_cpu += stage_cpu
+            share = stage_cpu / cpu * 100 if cpu else 0.0
+            out.write(f"{name:<8}{count:>10.0f}{stage_wall:>12.3f}{stage_cpu:>12.3f}{share:>9.1f}%{stage_bytes.get(name, 0) / 1024:>16.1f}\n")
+        other_cpu = max(cpu - staged_cpu, 0.0)
+        share = other_cpu / cpu * 100 if cpu else 0.0
+        out.write(f"{'其他':<8}{'':>10}{'':>12}{other_cpu:>12.3f}{share:>9.1f}%{stage_bytes.get('其他', 0) / 1024:>16.1f}\n\n")
+
+        out.write(f"==== 内存高点时的分配位置（前 {PROFILE_TOP_N}）====\n")
+        top_sites = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)[:PROFILE_TOP_N]
+        for (filename, lineno, name), (size, count) in top_sites:
+            out.write(f"{size / 1024:>10.1f} KiB {count:>8} 块  [{name}] {filename}:{lineno}\n")
+        out.write("\n")
+
+        for sort_key, title in (("cumulative", "累计时间"), ("tottime", "自身时间")):
+            out.write(f"==== cProfile：按{title}排序（前 {PROFILE_TOP_N}，所有线程合并）====\n")
+            stats.stream = out
+            stats.sort_stats(sort_key).print_stats(PROFILE_TOP_N)
+        return out.getvalue()
+
+
+# 全局分析器（--profile 时启用）
+profiler = StageProfiler()
+
 
 def init_db(db_path: str = DB_PATH) -> None:
     """初始化本地 SQLite 数据库（如果不存在则创建）。
@@ -174,6 +733,9 @@ def init_db(db_path: str = DB_PATH) -> None:
     conn = sqlite3.connect(db_path)
     try:
         cur = conn.cursor()
+        # WAL 模式：写线程提交时不阻塞读连接（该设置持久保存在数据库文件中）；
+        # 分布式模式下切回 DELETE 模式（之前单机运行时可能已经设为 WAL）
+        cur.execute("PRAGMA journal_mode=WAL" if DB_WAL else "PRAGMA journal_mode=DELETE")
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS wallpapers (
@@ -187,10 +749,94 @@ def init_db(db_path: str = DB_PATH) -> None:
                 rel_path TEXT NOT NULL,  -- 相对路径，例如 "walls/电脑/2026/02/xxx.png"
                 created_at TEXT NOT NULL,
                 updated_at TEXT NOT NULL,
+                sha256   TEXT,           -- 文件内容的 SHA-256（下载时流式计算；历史文件补录时为空）
+                size     INTEGER,        -- 文件字节数
                 UNIQUE(primaryid, px, device)
             )
             """
         )
+        # 旧版本创建的数据库没有 sha256 / size 列，补上
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(wallpapers)")}
+        for column, column_type in (("sha256", "TEXT"), ("size", "INTEGER")):
+            if column not in columns:
+                cur.execute(f"ALTER TABLE wallpapers ADD COLUMN {column} {column_type}")
+        # 增量同步的高水位线：每个设备 + 分类记录列表中最新的已入库壁纸
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync_marks (
+                device      TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                primaryid   TEXT NOT NULL,
+                updated_at  TEXT NOT NULL,
+                PRIMARY KEY(device, category_id)
+            )
+            """
+        )
+        # 增量同步中下载失败的任务：高水位线可能已越过这些壁纸，之后每次同步都重新提交，直到下载成功
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync_retries (
+                device      TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                primaryid   TEXT NOT NULL,
+                px          TEXT NOT NULL,
+                task        TEXT NOT NULL,   -- download_wallpaper 的参数（JSON）
+                updated_at  TEXT NOT NULL,
+                PRIMARY KEY(device, category_id, primaryid, px)
+            )
+            """
+        )
+        # 全量扫描的断点记录：任务、每页状态、每个下载任务的状态
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_jobs (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                device      TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                total_pages INTEGER NOT NULL,
+                status      TEXT NOT NULL,   -- running / done / abandoned
+                created_at  TEXT NOT NULL,
+                updated_at  TEXT NOT NULL,
+                page_size   INTEGER NOT NULL DEFAULT 24   -- 页码对应的 pagesize（不同 pagesize 的页码不能混用）
+            )
+            """
+        )
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(crawl_jobs)")}
+        if "page_size" not in columns:
+            cur.execute("ALTER TABLE crawl_jobs ADD COLUMN page_size INTEGER NOT NULL DEFAULT 24")
+        # 每个分类探测到的列表页 pagesize
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS listing_page_sizes (
+                category_id INTEGER PRIMARY KEY,
+                page_size   INTEGER NOT NULL,
+                probed_at   TEXT NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_job_pages (
+                job_id   INTEGER NOT NULL,
+                page_num INTEGER NOT NULL,
+                status   TEXT NOT NULL,      -- done / empty
+                PRIMARY KEY(job_id, page_num)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_job_items (
+                job_id     INTEGER NOT NULL,
+                primaryid  TEXT NOT NULL,
+                px         TEXT NOT NULL,
+                task       TEXT NOT NULL,    -- download_wallpaper 的参数（JSON）
+                status     TEXT NOT NULL,    -- pending / done / failed
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY(job_id, primaryid, px)
+            )
+            """
+        )
         conn.commit()
     finally:
         conn.close()
@@ -221,6 +867,226 @@ def db_get_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
     return sqlite3.connect(db_path, timeout=30)
 
 
+# 去重键：(primaryid, 规范化后的分辨率, 设备类型)
+WallpaperKey = Tuple[str, str, str]
+
+
+class WallpaperIndex:
+    """已下载壁纸的内存去重索引
+
+    启动时从 walls.db 一次性加载所有 (primaryid, px, device)，之后的去重判断
+    都在内存中完成，不再为每一条壁纸打开一次 SQLite 连接；
+    db_upsert_wallpaper 写库成功后同步更新索引。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Set[WallpaperKey] = set()
+        # 索引对应的数据库路径（None 表示尚未加载，此时 db_has_wallpaper 直接查库）
+        self.db_path: Optional[str] = None
+
+    @staticmethod
+    def make_key(primaryid: str, px: str, device: str) -> WallpaperKey:
+        """构造去重键；设备、分辨率取值很少，intern 后所有键共享同一份字符串"""
+        return (primaryid, sys.intern(normalize_px(px)), sys.intern(device))
+
+    def load(self, db_path: str = DB_PATH) -> int:
+        """从数据库加载全部去重键，返回加载的条数"""
+        conn = db_get_connection(db_path)
+        try:
+            rows = conn.execute("SELECT primaryid, px, device FROM wallpapers").fetchall()
+        finally:
+            conn.close()
+        keys = {self.make_key(primaryid, px, device) for primaryid, px, device in rows}
+        with self._lock:
+            self._keys = keys
+            self.db_path = db_path
+        logger.info(f"已从数据库加载 {len(keys)} 条壁纸记录到内存去重索引")
+        return len(keys)
+
+    def contains(self, primaryid: str, px: str, device: str) -> bool:
+        with self._lock:
+            return self.make_key(primaryid, px, device) in self._keys
+
+    def add(self, primaryid: str, px: str, device: str) -> None:
+        with self._lock:
+            self._keys.add(self.make_key(primaryid, px, device))
+
+    def discard(self, primaryid: str, px: str, device: str) -> None:
+        """撤销 add（记录最终没有写入数据库时调用，下次运行会重新下载）"""
+        with self._lock:
+            self._keys.discard(self.make_key(primaryid, px, device))
+
+    def filter_new(self, keys: Iterable[WallpaperKey]) -> List[WallpaperKey]:
+        """批量判断：返回给定键中尚未入库的那些（保持原顺序）"""
+        candidates = [self.make_key(*key) for key in keys]
+        with self._lock:
+            return [key for key in candidates if key not in self._keys]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# 全局去重索引（crawl_all 启动时加载）
+wallpaper_index = WallpaperIndex()
+
+
+# 内容键：(primaryid, 规范化后的分辨率)，与设备类型无关
+ContentKey = Tuple[str, str]
+
+
+class ContentStore:
+    """跨设备的内容去重：同一 (primaryid, 分辨率) 的图片只下载一次
+
+    电脑 / 4K 等设备经常选中同一张 4000 x 2250 的图片。启动时从 walls.db 加载每个内容键
+    已有的文件路径，另一个设备需要同一张图片时直接创建硬链接（不支持硬链接时复制），
+    不再经过网络；数据库中两个设备各自记录自己的路径。
+    claim 保证多个设备同时遇到同一张图片时只有一个线程/协程下载，其余的等它完成后链接。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 内容键 -> (rel_path, sha256, size)
+        self._files: Dict[ContentKey, Tuple[str, Optional[str], Optional[int]]] = {}
+        # 内容键 -> [锁, 等待者数量]
+        self._claims: Dict[ContentKey, list] = {}
+        self._async_claims: Dict[ContentKey, list] = {}
+        self.db_path: Optional[str] = None
+
+    @staticmethod
+    def make_key(primaryid: str, px: str) -> ContentKey:
+        return (primaryid, sys.intern(normalize_px(px)))
+
+    def load(self, db_path: str = DB_PATH) -> int:
+        """从数据库加载每个内容键已下载的文件，返回加载的条数"""
+        conn = db_get_connection(db_path)
+        try:
+            rows = conn.execute("SELECT primaryid, px, rel_path, sha256, size FROM wallpapers").fetchall()
+        finally:
+            conn.close()
+        files = {self.make_key(primaryid, px): (rel_path, sha256, size) for primaryid, px, rel_path, sha256, size in rows}
+        with self._lock:
+            self._files = files
+            self.db_path = db_path
+        return len(files)
+
+    def add(self, primaryid: str, px: str, rel_path: str, sha256: Optional[str], size: Optional[int]) -> None:
+        with self._lock:
+            self._files[self.make_key(primaryid, px)] = (rel_path, sha256, size)
+
+    def get(self, primaryid: str, px: str) -> Optional[Tuple[str, Optional[str], Optional[int]]]:
+        """已记录的 (rel_path, sha256, size)，不检查文件"""
+        with self._lock:
+            return self._files.get(self.make_key(primaryid, px))
+
+    def discard(self, primaryid: str, px: str, rel_path: str) -> None:
+        """撤销 add：只有内容键仍指向该文件时才移除"""
+        with self._lock:
+            key = self.make_key(primaryid, px)
+            found = self._files.get(key)
+            if found is not None and found[0] == rel_path:
+                del self._files[key]
+
+    def lookup(self, primaryid: str, px: str) -> Optional[Tuple[str, Optional[str], Optional[int]]]:
+        """返回同一内容已下载的文件 (rel_path, sha256, size)；文件已不存在或无法确认完整时返回 None
+
+        只有记录了大小（或 SHA-256）且与磁盘上的文件一致时才作为链接来源：
+        [FS-SKIP] 补录的历史记录两者都为空，文件可能是截断的残缺图片，不能链接到新的路径。
+        """
+        with self._lock:
+            found = self._files.get(self.make_key(primaryid, px))
+        if found is None:
+            return None
+        rel_path, sha256, size = found
+        try:
+            if size is not None:
+                if os.path.getsize(rel_path) != size:
+                    return None
+            elif sha256 is not None:
+                verifier = StreamVerifier()
+                verifier.resume(rel_path)
+                if verifier.sha256.hexdigest() != sha256:
+                    return None
+            else:
+                return None
+        except OSError:
+            return None
+        return found
+
+    @contextlib.contextmanager
+    def claim(self, primaryid: str, px: str):
+        """（线程）同一内容键同一时间只允许一个线程处理"""
+        key = self.make_key(primaryid, px)
+        with self._lock:
+            entry = self._claims.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._claims[key]
+
+    @contextlib.asynccontextmanager
+    async def claim_async(self, primaryid: str, px: str):
+        """（协程）同上，只在事件循环线程中使用"""
+        key = self.make_key(primaryid, px)
+        entry = self._async_claims.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._async_claims[key]
+
+
+# 全局内容去重（db_session 启动时加载）
+content_store = ContentStore()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """为已下载的文件创建硬链接，文件系统不支持硬链接（或跨分区）时复制一份"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        part_path = dst + PART_SUFFIX
+        shutil.copyfile(src, part_path)
+        os.replace(part_path, dst)
+
+
+def reuse_downloaded_content(primaryid: str, px: str, filepath: str) -> Optional[Tuple[int, Optional[str]]]:
+    """如果其他设备已经下载过同一内容，则在本地链接到 filepath，返回 (size, sha256)；否则返回 None
+
+    同一设备的重复任务（等待 claim 期间另一个任务已下载到同一路径）直接视为已完成。
+    """
+    found = content_store.lookup(primaryid, px)
+    if found is None:
+        return None
+    rel_path, sha256, size = found
+    if os.path.abspath(rel_path) == os.path.abspath(filepath):
+        logger.info(
+            "[DB-SKIP] %s 已由另一个任务下载，跳过下载", os.path.basename(filepath),
+            extra={"primaryid": primaryid, "px": px, "bytes": size},
+        )
+        metrics.inc("gugong_skips_total", reason="db")
+        return (size if size is not None else os.path.getsize(filepath)), sha256
+    try:
+        link_or_copy(rel_path, filepath)
+    except OSError as e:
+        logger.warning("复用已下载的文件失败 %s -> %s: %s", rel_path, filepath, e)
+        return None
+    logger.info(
+        "[LINK] %s <- %s（已下载过相同内容，不再下载）", os.path.basename(filepath), rel_path,
+        extra={"primaryid": primaryid, "px": px, "bytes": size},
+    )
+    metrics.inc("gugong_skips_total", reason="link")
+    return (size if size is not None else os.path.getsize(filepath)), sha256
+
+
 def db_has_wallpaper(
     primaryid: str,
     px: str,
@@ -230,24 +1096,44 @@ def db_has_wallpaper(
     """检查数据库中是否已经存在某个壁纸记录。
 
     以 (primaryid, px, device) 作为唯一键。
+    内存去重索引已加载时直接查索引，否则查询数据库。
     """
+    if wallpaper_index.db_path == db_path:
+        return wallpaper_index.contains(primaryid, px, device)
+
     px_norm = normalize_px(px)
     conn = db_get_connection(db_path)
     try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT 1 FROM wallpapers
-            WHERE primaryid = ? AND px = ? AND device = ?
-            LIMIT 1
-            """,
-            (primaryid, px_norm, device),
-        )
-        return cur.fetchone() is not None
+        with metrics.time("gugong_db_seconds", op="lookup"), profiler.stage("db"):
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT 1 FROM wallpapers
+                WHERE primaryid = ? AND px = ? AND device = ?
+                LIMIT 1
+                """,
+                (primaryid, px_norm, device),
+            )
+            return cur.fetchone() is not None
     finally:
         conn.close()
 
 
+UPSERT_WALLPAPER_SQL = """
+    INSERT INTO wallpapers (
+        primaryid, device, year, month, name, px, rel_path, created_at, updated_at, sha256, size
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(primaryid, px, device) DO UPDATE SET
+        year      = excluded.year,
+        month     = excluded.month,
+        name      = excluded.name,
+        rel_path  = excluded.rel_path,
+        updated_at = excluded.updated_at,
+        sha256    = COALESCE(excluded.sha256, sha256),
+        size      = COALESCE(excluded.size, size)
+"""
+
+
 def db_upsert_wallpaper(
     primaryid: str,
     device: str,
@@ -257,98 +1143,782 @@ def db_upsert_wallpaper(
     px: str,
     rel_path: str,
     db_path: str = DB_PATH,
+    sha256: Optional[str] = None,
+    size: Optional[int] = None,
 ) -> None:
     """插入或更新一条壁纸记录到数据库。
 
     - primaryid + px + device 作为唯一键
     - 如果已经存在，则只更新名称、路径等信息
+    - sha256 / size 为空时（如 [FS-SKIP] 补录）保留已有的值
+    - 数据库写线程运行中时，记录交给写线程批量提交，本函数立即返回
     """
     px_norm = normalize_px(px)
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    row = (primaryid, device, year, month, name, px_norm, rel_path, now, now, sha256, size)
+
+    writer = db_writer
+    if writer is not None and writer.db_path == db_path:
+        writer.submit(row)
+    else:
+        conn = db_get_connection(db_path)
+        try:
+            with metrics.time("gugong_db_seconds", op="upsert"), profiler.stage("db"):
+                conn.execute(UPSERT_WALLPAPER_SQL, row)
+                conn.commit()
+            metrics.inc("gugong_db_rows_total")
+        finally:
+            conn.close()
+
+    if wallpaper_index.db_path == db_path:
+        wallpaper_index.add(primaryid, px_norm, device)
+    if content_store.db_path == db_path:
+        content_store.add(primaryid, px_norm, rel_path, sha256, size)
+
+
+def forget_wallpaper(row: tuple, db_path: str = DB_PATH) -> None:
+    """一条 upsert 记录（UPSERT_WALLPAPER_SQL 的参数）最终没有写入时，撤销 db_upsert_wallpaper 对内存索引的更新"""
+    primaryid, device, _, _, _, px, rel_path = row[:7]
+    if wallpaper_index.db_path == db_path:
+        wallpaper_index.discard(primaryid, px, device)
+    if content_store.db_path == db_path:
+        content_store.discard(primaryid, px, rel_path)
+
+
+def db_execute(sql: str, params: tuple, db_path: str = DB_PATH) -> None:
+    """执行一条写语句；数据库写线程运行中时交给写线程与其他记录一起批量提交"""
+    writer = db_writer
+    if writer is not None and writer.db_path == db_path:
+        writer.submit_statement(sql, params)
+        return
+    conn = db_get_connection(db_path)
+    try:
+        conn.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def db_get_sync_mark(device: str, category_id: int, db_path: str = DB_PATH) -> Optional[str]:
+    """读取增量同步的高水位线（primaryid），没有时返回 None"""
+    conn = db_get_connection(db_path)
+    try:
+        row = conn.execute(
+            "SELECT primaryid FROM sync_marks WHERE device = ? AND category_id = ?",
+            (device, category_id),
+        ).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def db_get_sync_retries(device: str, category_id: int, db_path: str = DB_PATH) -> List[Dict]:
+    """读取增量同步中之前下载失败、需要重新提交的任务"""
+    conn = db_get_connection(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT task FROM sync_retries WHERE device = ? AND category_id = ? ORDER BY primaryid DESC",
+            (device, category_id),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    finally:
+        conn.close()
+
+
+def db_update_sync_retries(
+    device: str,
+    category_id: int,
+    done: List[Dict],
+    failed: List[Dict],
+    db_path: str = DB_PATH,
+) -> None:
+    """下载成功的任务移出 sync_retries，失败的任务写入（下次同步时重新提交）"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     conn = db_get_connection(db_path)
     try:
-        cur = conn.cursor()
-        cur.execute(
+        conn.executemany(
+            "DELETE FROM sync_retries WHERE device = ? AND category_id = ? AND primaryid = ? AND px = ?",
+            [(device, category_id, task["primaryid"], normalize_px(task["px"])) for task in done],
+        )
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO sync_retries (device, category_id, primaryid, px, task, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (device, category_id, task["primaryid"], normalize_px(task["px"]), json.dumps(task, ensure_ascii=False), now)
+                for task in failed
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def db_set_sync_mark(device: str, category_id: int, primaryid: str, db_path: str = DB_PATH) -> None:
+    """更新增量同步的高水位线
+
+    先等数据库写线程提交此前的记录，保证高水位线之前的壁纸都已真正写入数据库。
+    """
+    writer = db_writer
+    if writer is not None and writer.db_path == db_path:
+        writer.flush()
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = db_get_connection(db_path)
+    try:
+        conn.execute(
             """
-            INSERT INTO wallpapers (
-                primaryid, device, year, month, name, px, rel_path, created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(primaryid, px, device) DO UPDATE SET
-                year      = excluded.year,
-                month     = excluded.month,
-                name      = excluded.name,
-                rel_path  = excluded.rel_path,
+            INSERT INTO sync_marks (device, category_id, primaryid, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(device, category_id) DO UPDATE SET
+                primaryid  = excluded.primaryid,
                 updated_at = excluded.updated_at
             """,
-            (
-                primaryid,
-                device,
-                year,
-                month,
-                name,
-                px_norm,
-                rel_path,
-                now,
-                now,
-            ),
+            (device, category_id, primaryid, now),
         )
         conn.commit()
     finally:
         conn.close()
 
-def safe_segment(name: str) -> str:
-    """把分类名/中文标题转换为安全的文件夹名"""
-    name = (name or "").strip()
-    if not name:
-        return ""
-    # Windows 禁止: \ / : * ? " < > |
-    # 同时替换其他可能有问题的字符
-    name = re.sub(r'[\\/:*?"<>|]', "_", name)
-    # 替换多个连续的下划线为单个
-    name = re.sub(r'_+', '_', name)
-    # 去掉首尾下划线
-    name = name.strip('_')
-    return name
 
+class WallpaperDbWriter:
+    """单写线程的数据库写入器（group commit）
 
-def fetch(url: str, referer: Optional[str] = None, is_ajax: bool = False, session_obj: Optional[requests.Session] = None) -> str:
-    """请求页面并返回 HTML 文本"""
-    headers = get_random_headers(referer=referer, is_ajax=is_ajax)
-    
-    # 添加随机延迟，避免请求过快
-    time.sleep(random.uniform(0.5, 1.5))
-    
-    # 使用传入的 session 或全局 session
-    sess = session_obj if session_obj else session
-    
-    logger.info(f"[GET] {url}")
-    resp = sess.get(url, headers=headers, timeout=15)
+    各下载线程通过 submit 把记录放入队列（断点记录等其他写语句通过 submit_statement），写线程用 executemany 批量写入，
+    攒够 batch_size 条或超过 flush_interval 秒提交一次，
+    避免每张图片一次 fsync，也避免多个线程争抢 SQLite 写锁。
+    进程崩溃时最多丢失一个批次（约 flush_interval 秒）的记录；
+    这些图片下次运行时会因为文件已存在而走 [FS-SKIP] 补录。
+    批量提交失败时改为逐条写入，只丢弃本身出错的语句；出错的壁纸记录同时从内存索引中撤销，下次运行重新下载。
+    参数本身有问题（如整数超出 SQLite 范围的 OverflowError）也按出错的语句处理，不会让写线程退出；
+    写线程仍因其他原因退出时，flush 抛出 RuntimeError，而不是永远等待。
+    """
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        batch_size: int = DB_BATCH_SIZE,
+        flush_interval: float = DB_FLUSH_INTERVAL,
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "WallpaperDbWriter":
+        self._thread = threading.Thread(target=self._run, name="数据库写线程", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, row: tuple) -> None:
+        """提交一条 upsert 记录（不等待写入）"""
+        self._queue.put((UPSERT_WALLPAPER_SQL, row))
+
+    def submit_statement(self, sql: str, params: tuple) -> None:
+        """提交一条其他写语句（如断点记录），按提交顺序与 upsert 记录一起批量执行"""
+        self._queue.put((sql, params))
+
+    def flush(self) -> None:
+        """阻塞直到此前提交的所有记录都已提交到数据库；写线程已退出时抛出 RuntimeError"""
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(self.flush_interval):
+            thread = self._thread
+            if (thread is None or not thread.is_alive()) and not done.is_set():
+                raise RuntimeError("数据库写线程已退出，此前提交的记录可能没有写入数据库")
+
+    def close(self) -> None:
+        """提交剩余记录并结束写线程（可重复调用）"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        conn = db_get_connection(self.db_path)
+        # WAL 模式下 NORMAL 已能保证数据库一致性，只在检查点时 fsync；DELETE 模式保持默认的 FULL
+        if DB_WAL:
+            conn.execute("PRAGMA synchronous=NORMAL")
+        # [(sql, params), ...]
+        pending: List[Tuple[str, tuple]] = []
+        deadline = 0.0
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if pending else None
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    # 距第一条未提交记录已超过 flush_interval
+                    self._commit(conn, pending)
+                    continue
+                if item is None:
+                    break
+                if isinstance(item, threading.Event):
+                    self._commit(conn, pending)
+                    item.set()
+                    continue
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(item)
+                if len(pending) >= self.batch_size:
+                    self._commit(conn, pending)
+        except Exception:
+            logger.critical("数据库写线程异常退出，未提交的 %d 条记录丢失", len(pending), exc_info=True)
+            raise
+        finally:
+            with contextlib.suppress(Exception):
+                self._commit(conn, pending)
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, pending: List[Tuple[str, tuple]]) -> None:
+        if not pending:
+            return
+        try:
+            with metrics.time("gugong_db_seconds", op="commit"), profiler.stage("db"):
+                # 相邻的同一语句合并为一次 executemany，保持提交顺序
+                for sql, group in itertools.groupby(pending, key=lambda item: item[0]):
+                    conn.executemany(sql, [params for _, params in group])
+                conn.commit()
+            metrics.inc("gugong_db_rows_total", len(pending))
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"批量写入数据库失败（{len(pending)} 条），改为逐条写入: {e}")
+            self._commit_each(conn, pending)
+        pending.clear()
+
+    def _commit_each(self, conn: sqlite3.Connection, pending: List[Tuple[str, tuple]]) -> None:
+        """逐条执行并提交；失败的壁纸记录从去重索引和内容索引中撤销"""
+        for sql, params in pending:
+            try:
+                with metrics.time("gugong_db_seconds", op="commit"), profiler.stage("db"):
+                    conn.execute(sql, params)
+                    conn.commit()
+                metrics.inc("gugong_db_rows_total")
+            except Exception as e:
+                conn.rollback()
+                metrics.inc("gugong_failures_total", stage="db")
+                logger.error("写入数据库失败: %s；语句参数: %s", e, params, exc_info=True)
+                if sql == UPSERT_WALLPAPER_SQL:
+                    forget_wallpaper(params, self.db_path)
+
+
+# 全局数据库写线程（db_session 期间运行）
+db_writer: Optional[WallpaperDbWriter] = None
+
+metrics.gauge(
+    "gugong_db_writer_queue_depth",
+    lambda: [({}, db_writer._queue.qsize() if db_writer is not None else 0)],
+)
+
+
+@contextlib.contextmanager
+def db_session(db_path: str = DB_PATH):
+    """一次爬取任务的数据库上下文
+
+    - 初始化数据库、加载内存去重索引和跨设备内容索引
+    - 启动数据库写线程，退出时（包括异常退出）保证剩余记录全部提交
+    """
+    global db_writer
+    init_db(db_path)
+    wallpaper_index.load(db_path)
+    content_store.load(db_path)
+    writer = WallpaperDbWriter(db_path).start()
+    db_writer = writer
+    # 进程被 Ctrl+C 等方式中断时，解释器退出前也会提交剩余记录
+    atexit.register(writer.close)
+    try:
+        yield writer
+    finally:
+        db_writer = None
+        writer.close()
+        atexit.unregister(writer.close)
+
+
+def safe_segment(name: str) -> str:
+    """把分类名/中文标题转换为安全的文件夹名"""
+    name = (name or "").strip()
+    if not name:
+        return ""
+    # Windows 禁止: \ / : * ? " < > |
+    # 同时替换其他可能有问题的字符
+    name = re.sub(r'[\\/:*?"<>|]', "_", name)
+    # 替换多个连续的下划线为单个
+    name = re.sub(r'_+', '_', name)
+    # 去掉首尾下划线
+    name = name.strip('_')
+    return name
+
+
+class RequestSlot:
+    """一次请求占用的限速名额，由调用方在收到响应头后调用 mark_response 记录状态码"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.status: Optional[int] = None
+        self.latency: Optional[float] = None
+
+    def mark_response(self, status: int) -> None:
+        self.status = status
+        self.latency = time.monotonic() - self.started
+
+
+def _wake_waiter(waiter: "asyncio.Future") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class HostRateLimiter:
+    """单个主机的全局限速器：令牌桶 + 自适应在途请求上限（AIMD）
+
+    替代原来散落在各处的固定随机延迟：
+    - 每个请求先占一个在途名额，再从令牌桶取一个令牌（不足时等待）
+    - 响应健康（2xx/3xx 且首字节延迟正常）时加性增加：速率 +10%·初始速率、在途上限 +1/上限
+    - 遇到 429、5xx、超时或连接错误时乘性减小：速率与在途上限减半
+      （每个冷却周期内最多减一次，避免一批并发失败把速率压到底）
+    - 线程在 threading.Condition 上等待；协程各自在所属事件循环的 Future 上等待，
+      release 按空出的名额数唤醒（可以从任意线程唤醒），不轮询
+    """
+
+    def __init__(
+        self,
+        host: str,
+        rps: float = RATE_LIMIT_INITIAL_RPS,
+        min_rps: float = RATE_LIMIT_MIN_RPS,
+        max_rps: float = RATE_LIMIT_MAX_RPS,
+        in_flight: int = RATE_LIMIT_INITIAL_IN_FLIGHT,
+        max_in_flight: int = RATE_LIMIT_MAX_IN_FLIGHT,
+    ):
+        self.host = host
+        self.rps = rps
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.rps_step = rps * 0.1
+        self.limit = float(min(in_flight, max_in_flight))
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._best_latency: Optional[float] = None
+        self._last_backoff = 0.0
+        self._cond = threading.Condition()
+        # 等待名额的协程：(事件循环, Future)，先到先得
+        self._async_waiters: "collections.deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]" = collections.deque()
+
+    def _try_reserve(self) -> Optional[float]:
+        """尝试占用一个在途名额并预约一个令牌
+
+        返回需要等待的秒数；在途请求已满时返回 None。调用方需持有 self._cond。
+        """
+        if self.in_flight >= int(self.limit):
+            return None
+        now = time.monotonic()
+        # 令牌桶容量为 1：不允许空闲一段时间后突发大量请求
+        self._tokens = min(1.0, self._tokens + (now - self._last_refill) * self.rps)
+        self._last_refill = now
+        self._tokens -= 1.0
+        self.in_flight += 1
+        return max(0.0, -self._tokens / self.rps)
+
+    def acquire(self) -> RequestSlot:
+        """（线程）阻塞直到可以发出请求"""
+        with self._cond:
+            while True:
+                wait = self._try_reserve()
+                if wait is not None:
+                    break
+                self._cond.wait()
+        if wait > 0:
+            time.sleep(wait)
+        return RequestSlot()
+
+    async def acquire_async(self) -> RequestSlot:
+        """（协程）等待直到可以发出请求，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                wait = self._try_reserve()
+                if wait is not None:
+                    break
+                entry = (loop, loop.create_future())
+                self._async_waiters.append(entry)
+            try:
+                await entry[1]
+            except asyncio.CancelledError:
+                with self._cond:
+                    if entry in self._async_waiters:
+                        self._async_waiters.remove(entry)
+                    else:
+                        # 已被唤醒但不再需要名额：把唤醒让给下一个等待者
+                        self._wake_async_waiters()
+                raise
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return RequestSlot()
+
+    def _wake_async_waiters(self) -> None:
+        """按空出的在途名额数唤醒等待的协程。调用方需持有 self._cond。"""
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # 事件循环已关闭
+                continue
+            free -= 1
+
+    def release(self, slot: RequestSlot, failed: bool = False) -> None:
+        """归还名额，并根据本次请求的结果调整速率和在途上限"""
+        status = slot.status
+        with self._cond:
+            self.in_flight -= 1
+            if failed or status == 429 or (status is not None and status >= 500):
+                self._backoff(status)
+            elif status is not None and status < 400:
+                self._on_success(slot.latency)
+            self._cond.notify_all()
+            self._wake_async_waiters()
+
+    def _on_success(self, latency: Optional[float]) -> None:
+        if latency is not None:
+            if self._best_latency is None or latency < self._best_latency:
+                self._best_latency = latency
+            if latency > self._best_latency * RATE_LIMIT_LATENCY_FACTOR:
+                # 延迟明显变高：保持当前速率，不再加速
+                return
+        self.rps = min(self.max_rps, self.rps + self.rps_step)
+        self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+
+    def _backoff(self, status: Optional[int]) -> None:
+        now = time.monotonic()
+        # 冷却周期：至少覆盖一次当前速率下的请求间隔
+        if now - self._last_backoff < max(1.0, 1.0 / self.rps):
+            return
+        self._last_backoff = now
+        self.rps = max(self.min_rps, self.rps / 2)
+        self.limit = max(1.0, self.limit / 2)
+        logger.warning(
+            "[限速] %s 响应异常（状态码: %s），降速至 %.2f 次/秒，在途上限 %d",
+            self.host, status or "超时/连接错误", self.rps, int(self.limit),
+        )
+
+    @contextlib.contextmanager
+    def request(self):
+        """（线程）with rate_limiter.request() as slot: ... 包裹一次 HTTP 请求"""
+        slot = self.acquire()
+        failed = False
+        try:
+            yield slot
+        except BaseException:
+            # 没拿到响应头就出错，说明是超时/连接错误
+            failed = slot.status is None
+            raise
+        finally:
+            self.release(slot, failed=failed)
+
+    @contextlib.asynccontextmanager
+    async def request_async(self):
+        """（协程）async with rate_limiter.request_async() as slot: ..."""
+        slot = await self.acquire_async()
+        failed = False
+        try:
+            yield slot
+        except BaseException:
+            failed = slot.status is None
+            raise
+        finally:
+            self.release(slot, failed=failed)
+
+
+class RateLimiterRegistry:
+    """按主机管理限速器，同一主机的所有请求共享一个限速器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, HostRateLimiter] = {}
+        self.settings: Dict[str, float] = {}
+
+    def configure(self, **settings) -> None:
+        """调整之后新建的限速器参数（如 max_rps / max_in_flight），并清空已有限速器"""
+        with self._lock:
+            self.settings.update({k: v for k, v in settings.items() if v is not None})
+            self._limiters = {}
+
+    def snapshot(self) -> List[HostRateLimiter]:
+        with self._lock:
+            return list(self._limiters.values())
+
+    def for_url(self, url: str) -> HostRateLimiter:
+        host = urlparse(url).netloc
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostRateLimiter(host, **self.settings)
+                self._limiters[host] = limiter
+            return limiter
+
+
+# 全局限速器
+rate_limiters = RateLimiterRegistry()
+
+metrics.gauge(
+    "gugong_in_flight_requests",
+    lambda: [({"host": limiter.host}, limiter.in_flight) for limiter in rate_limiters.snapshot()],
+)
+metrics.gauge(
+    "gugong_in_flight_limit",
+    lambda: [({"host": limiter.host}, int(limiter.limit)) for limiter in rate_limiters.snapshot()],
+)
+metrics.gauge(
+    "gugong_requests_per_second_limit",
+    lambda: [({"host": limiter.host}, limiter.rps) for limiter in rate_limiters.snapshot()],
+)
+
+
+class HttpSessions:
+    """共享的 HTTP 连接池与 cookies
+
+    - 所有线程的 Session 挂载同一个 HTTPAdapter（即同一个 urllib3 连接池），
+      keep-alive 连接在列表页、图片、不同设备之间复用；每个主机的连接池大小与限速器的在途请求上限一致
+      （请求在限速器名额内完成，同时使用的连接数不会超过在途上限，连接不会因池满被丢弃）
+    - 所有 Session 共用一个 cookie jar（CookieJar 内部有锁，可多线程读写），主页面在整个进程中只访问一次（warm）
+    - 每个线程一个 Session 对象（get），线程之间不共享 Session 本身的状态
+    """
+
+    def __init__(self):
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self._adapter: Optional[requests.adapters.HTTPAdapter] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._warm_lock = threading.Lock()
+        self._warmed = False
+
+    def pool_size(self) -> int:
+        return int(rate_limiters.settings.get("max_in_flight", RATE_LIMIT_MAX_IN_FLIGHT))
+
+    def adapter(self) -> requests.adapters.HTTPAdapter:
+        with self._lock:
+            if self._adapter is None:
+                # 重试由 download_to_file 和限速器负责，连接池本身不重试
+                self._adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=HTTP_POOL_HOSTS,
+                    pool_maxsize=self.pool_size(),
+                    max_retries=0,
+                )
+            return self._adapter
+
+    def get(self) -> requests.Session:
+        """当前线程的 Session（共享连接池和 cookies）"""
+        sess = getattr(self._local, "session", None)
+        if sess is None:
+            sess = requests.Session()
+            adapter = self.adapter()
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            sess.cookies = self.cookies
+            self._local.session = sess
+        return sess
+
+    def warm(self) -> None:
+        """访问主页面建立会话（cookies 写入共享的 cookie jar）；整个进程只访问一次，其他线程等待它完成"""
+        with self._warm_lock:
+            if self._warmed:
+                return
+            self._warmed = True
+            logger.info("访问主页面建立会话...")
+            try:
+                fetch(ALL_URL)
+            except Exception as e:
+                logger.warning(f"访问主页面失败: {e}")
+
+    def connection_counts(self) -> List[Tuple[Dict[str, str], int]]:
+        """各主机新建的连接数（urllib3 连接池的 num_connections，连接复用时不增加）"""
+        with self._lock:
+            if self._adapter is None:
+                return []
+            pools = self._adapter.poolmanager.pools
+            return [({"host": f"{key.key_host}:{key.key_port}"}, pools[key].num_connections) for key in pools.keys()]
+
+
+# 全局 HTTP 连接池（所有线程共用）
+http_sessions = HttpSessions()
+
+metrics.gauge("gugong_http_connections_opened_total", http_sessions.connection_counts)
+
+
+def fetch(url: str, referer: Optional[str] = None, is_ajax: bool = False, session_obj: Optional[requests.Session] = None) -> str:
+    """请求页面并返回 HTML 文本（经过全局限速器）"""
+    headers = get_random_headers(referer=referer, is_ajax=is_ajax)
+    
+    sess = session_obj or http_sessions.get()
+    
+    with rate_limiters.for_url(url).request() as slot:
+        logger.info("[GET] %s", url, extra={"url": url})
+        resp = sess.get(url, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        slot.mark_response(resp.status_code)
     resp.raise_for_status()
     
-    # 如果是 AJAX 请求，返回的内容可能是 JSON 格式的 HTML 字符串
-    if is_ajax and resp.headers.get("Content-Type", "").startswith("application/json"):
+    return unwrap_ajax_html(resp.text, resp.headers.get("Content-Type", ""), is_ajax)
+
+
+def unwrap_ajax_html(text: str, content_type: str, is_ajax: bool) -> str:
+    """AJAX 请求返回的内容可能是 JSON 格式的 HTML 字符串，这里统一解包"""
+    if is_ajax and content_type.startswith("application/json"):
         try:
-            import json
-            data = json.loads(resp.text)
+            data = json.loads(text)
             # 如果返回的是包含 HTML 的 JSON，提取 HTML 部分
             if isinstance(data, dict) and "html" in data:
                 return data["html"]
             elif isinstance(data, str):
                 # JSON 字符串格式的 HTML
                 return data
-        except:
+        except ValueError:
             # 如果不是 JSON，直接返回文本
             pass
     
-    return resp.text
+    return text
+
+
+def normalize_listing_url(url: str) -> str:
+    """列表页缓存的键：去掉 build_base_url 加上的随机时间戳参数（如 "0.123"），其余参数排序"""
+    parsed = urlparse(url)
+    params = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not (value == "" and re.fullmatch(r"\d*\.\d+", key))
+    ]
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{urlencode(sorted(params))}"
+
+
+class ListingCache:
+    """列表页的磁盘缓存（条件 GET）
+
+    每个列表页（按 normalize_listing_url 归一化后的 URL）保存一个 JSON 文件，
+    内容为服务器返回的 ETag / Last-Modified、页面 HTML 以及解析出的壁纸条目。
+    再次请求时带上 If-None-Match / If-Modified-Since，服务器返回 304 时直接复用缓存，
+    不再下载和解析页面。服务器没有返回任何验证器时不缓存。
+    """
+
+    def __init__(self, cache_dir: str = LISTING_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.enabled = True
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(normalize_listing_url(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, url: str) -> Optional[Dict]:
+        """读取缓存条目，不存在或已损坏时返回 None"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """根据缓存条目生成条件请求头"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, response_headers, html: str, device_type: str, wallpapers: List[Dict]) -> None:
+        """保存一页的验证器、HTML 和解析结果（先写临时文件再替换，多线程写同一页也不会读到半个文件）"""
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not self.enabled or not (etag or last_modified):
+            return
+        entry = {
+            "url": normalize_listing_url(url),
+            "etag": etag,
+            "last_modified": last_modified,
+            "html": html,
+            "device_type": device_type,
+            "wallpapers": wallpapers,
+            "raw_count": listing_item_count(wallpapers),
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("写入列表页缓存失败 %s: %s", url, e)
+
+    @staticmethod
+    def cached_page(entry: Dict, device_type: str) -> Tuple[str, List[Dict]]:
+        """服务器返回 304 时使用缓存的页面；设备类型不同（选用的分辨率不同）时重新解析 HTML"""
+        html = entry["html"]
+        if entry.get("device_type") == device_type:
+            return html, ListingItems(entry["wallpapers"], raw_count=entry.get("raw_count"))
+        return html, parse_listing_page(html, device_type=device_type)
+
+
+# 全局列表页缓存
+listing_cache = ListingCache()
+
+
+def fetch_listing(
+    url: str,
+    device_type: str = "电脑",
+    session_obj: Optional[requests.Session] = None,
+) -> Tuple[str, List[Dict]]:
+    """请求一页列表并解析，返回 (html, wallpapers)
+
+    与 fetch 相同的请求头和限速；有缓存时发送条件请求，未变化（304）时直接使用缓存的解析结果。
+    """
+    entry = listing_cache.load(url)
+    headers = get_random_headers(referer=ALL_URL, is_ajax=True)
+    headers.update(listing_cache.conditional_headers(entry))
+    
+    sess = session_obj or http_sessions.get()
+    
+    with metrics.time("gugong_fetch_seconds"), profiler.stage("fetch"), rate_limiters.for_url(url).request() as slot:
+        logger.info("[GET] %s", url, extra={"url": url})
+        resp = sess.get(url, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        slot.mark_response(resp.status_code)
+    metrics.inc("gugong_pages_fetched_total", status=str(resp.status_code))
+    if resp.status_code == 304 and entry:
+        logger.info("[304] 列表页未变化，使用缓存: %s", url, extra={"url": url, "device": device_type})
+        return listing_cache.cached_page(entry, device_type)
+    resp.raise_for_status()
+    
+    html = unwrap_ajax_html(resp.text, resp.headers.get("Content-Type", ""), True)
+    wallpapers = parse_listing_page(html, device_type=device_type)
+    listing_cache.store(url, resp.headers, html, device_type, wallpapers)
+    return html, wallpapers
 
 
-def get_total_pages(base_url: str, session_obj: Optional[requests.Session] = None) -> int:
-    """获取总页数"""
+def get_total_pages(
+    base_url: str,
+    session_obj: Optional[requests.Session] = None,
+    device_type: str = "电脑",
+) -> Tuple[int, Optional[List[Dict]]]:
+    """获取总页数，同时返回第一页解析出的壁纸
+
+    页码循环直接复用第一页的结果，不再重复请求第一页；获取失败时返回 (0, None)。
+    """
     try:
         # 先请求第一页
-        html = fetch(f"{base_url}&p=1", referer=ALL_URL, is_ajax=True, session_obj=session_obj)
-        
+        html, wallpapers = fetch_listing(f"{base_url}&p=1", device_type=device_type, session_obj=session_obj)
+        return parse_total_pages(html), wallpapers
+    except Exception as e:
+        logger.error(f"获取总页数失败: {e}", exc_info=True)
+        return 0, None
+
+
+def parse_total_pages(html: str) -> int:
+    """从第一页的 HTML 中解析总页数（同步/异步引擎共用）"""
+    try:
         # 检查是否被重定向
         if len(html) < 200 and "refresh" in html.lower():
             logger.warning(f"页面可能被重定向，HTML长度: {len(html)}")
@@ -420,23 +1990,203 @@ def get_total_pages(base_url: str, session_obj: Optional[requests.Session] = Non
         return max_pages
         
     except Exception as e:
-        logger.error(f"获取总页数失败: {e}", exc_info=True)
+        logger.error(f"解析总页数失败: {e}", exc_info=True)
         return 0
 
 
 def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> List[Dict]:
-    """解析每页的壁纸列表，从 download-pop 中获取支持的分辨率"""
-    wallpapers = []
+    """解析每页的壁纸列表，从 download-pop 中获取支持的分辨率（BeautifulSoup 后端）"""
+    return build_wallpaper_items(extract_list_items_soup(soup), device_type=device_type)
+
+
+def extract_list_items_soup(soup: BeautifulSoup) -> List[Dict]:
+    """从 BeautifulSoup 树中提取每个 .list-item 的原始字段（bs4 后端）
+
+    返回的每一项包含：
+    - name: .txt 元素的文本
+    - primaryid: download-pop 的 primaryid，没有 download-pop 时取 .icon 的 primaryid
+    - has_download_pop: 是否找到 download-pop 元素
+    - image_url: .item-a 中图片的 src
+    - available_sizes: download-pop 中列出的 {尺寸编号: 分辨率文本}
+    """
+    items = []
+    for list_item in soup.select(".list-item"):
+        # 1. 获取壁纸名称（从 .txt 元素）
+        txt_elem = list_item.select_one(".txt")
+        name = txt_elem.get_text(strip=True) if txt_elem else ""
+        
+        # 2. 获取 primaryid（从 download-pop 或 icon 元素）
+        download_pop = list_item.select_one(".download-pop[primaryid]")
+        if download_pop:
+            primaryid = download_pop.get("primaryid", "")
+        else:
+            # 备用方法：从 icon 元素获取
+            icon_elem = list_item.select_one(".icon[primaryid]")
+            primaryid = icon_elem.get("primaryid", "") if icon_elem else ""
+        
+        # 3. 获取图片URL（在 .item-a img[src] 中）
+        item_a = list_item.select_one(".item-a")
+        img_elem = item_a.select_one("img[src]") if item_a else None
+        image_url = img_elem.get("src", "") if img_elem else ""
+        
+        # 4. 从 download-pop 中查找所有 data-size 属性
+        available_sizes = {}
+        if download_pop:
+            for link in download_pop.select("a[data-size]"):
+                try:
+                    size_num = int(link.get("data-size", ""))
+                    size_text = link.get_text(strip=True)  # 例如 "1920 x 1080"
+                    if size_num and size_text:
+                        available_sizes[size_num] = size_text
+                except ValueError:
+                    continue
+        
+        items.append({
+            "name": name,
+            "primaryid": primaryid,
+            "has_download_pop": download_pop is not None,
+            "image_url": image_url,
+            "available_sizes": available_sizes,
+        })
+    return items
+
+
+def _xpath_has_class(class_name: str) -> str:
+    """与 CSS 选择器 .class_name 等价的 XPath 条件"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+# lxml 后端使用的 XPath（与 bs4 后端的 CSS 选择器一一对应）
+LXML_LIST_ITEM_XPATH = f"//*[{_xpath_has_class('list-item')}]"
+LXML_TXT_XPATH = f".//*[{_xpath_has_class('txt')}]"
+LXML_DOWNLOAD_POP_XPATH = f".//*[{_xpath_has_class('download-pop')}][@primaryid]"
+LXML_ICON_XPATH = f".//*[{_xpath_has_class('icon')}][@primaryid]"
+LXML_ITEM_A_XPATH = f".//*[{_xpath_has_class('item-a')}]"
+# get_text 不包含 script/style 中的文本和注释，这里保持一致
+LXML_TEXT_XPATH = ".//text()[not(parent::script) and not(parent::style)]"
+
+
+def _lxml_text(elem) -> str:
+    """等价于 bs4 的 get_text(strip=True)"""
+    return "".join(text.strip() for text in elem.xpath(LXML_TEXT_XPATH))
+
+
+def _lxml_first(elem, xpath: str):
+    found = elem.xpath(xpath)
+    return found[0] if found else None
+
+
+def extract_list_items_lxml(html: str) -> List[Dict]:
+    """用 lxml（libxml2，C 实现）提取列表项的原始字段，结果与 extract_list_items_soup 一致
+
+    只对需要的几个元素做 XPath 查询，不构建 BeautifulSoup 树；
+    libxml2 解析期间会释放 GIL，不会拖慢同时运行的下载线程。
+    """
+    try:
+        root = lxml.html.document_fromstring(html)
+    except lxml.etree.ParserError:
+        # 空文档
+        return []
     
-    # 遍历所有 .list-item 元素
-    list_items = soup.select(".list-item")
+    items = []
+    for list_item in root.xpath(LXML_LIST_ITEM_XPATH):
+        txt_elem = _lxml_first(list_item, LXML_TXT_XPATH)
+        name = _lxml_text(txt_elem) if txt_elem is not None else ""
+        
+        download_pop = _lxml_first(list_item, LXML_DOWNLOAD_POP_XPATH)
+        if download_pop is not None:
+            primaryid = download_pop.get("primaryid", "")
+        else:
+            icon_elem = _lxml_first(list_item, LXML_ICON_XPATH)
+            primaryid = icon_elem.get("primaryid", "") if icon_elem is not None else ""
+        
+        item_a = _lxml_first(list_item, LXML_ITEM_A_XPATH)
+        img_elem = _lxml_first(item_a, ".//img[@src]") if item_a is not None else None
+        image_url = img_elem.get("src", "") if img_elem is not None else ""
+        
+        available_sizes = {}
+        if download_pop is not None:
+            for link in download_pop.xpath(".//a[@data-size]"):
+                try:
+                    size_num = int(link.get("data-size", ""))
+                    size_text = _lxml_text(link)
+                    if size_num and size_text:
+                        available_sizes[size_num] = size_text
+                except ValueError:
+                    continue
+        
+        items.append({
+            "name": name,
+            "primaryid": primaryid,
+            "has_download_pop": download_pop is not None,
+            "image_url": image_url,
+            "available_sizes": available_sizes,
+        })
+    return items
+
+
+def extract_list_items_bs4(html: str) -> List[Dict]:
+    """bs4 后端：构建 html.parser 树后提取列表项"""
+    return extract_list_items_soup(BeautifulSoup(html, "html.parser"))
+
+
+# 列表页解析后端：名称 -> 从 HTML 提取原始列表项的函数
+LISTING_PARSERS = {
+    "bs4": extract_list_items_bs4,
+    "lxml": extract_list_items_lxml,
+}
+
+
+def resolve_parser_backend(backend: str) -> str:
+    """把 "auto" 解析为实际的后端：安装了 lxml 时用 lxml，否则用 bs4"""
+    if backend == "auto":
+        return "lxml" if lxml is not None else "bs4"
+    if backend not in LISTING_PARSERS:
+        raise ValueError(f"未知的解析后端: {backend}（可选: auto, {', '.join(LISTING_PARSERS)}）")
+    if backend == "lxml" and lxml is None:
+        raise RuntimeError("lxml 解析后端需要 lxml，请先执行: pip install lxml")
+    return backend
+
+
+def check_parser_backends(html_dir: str, repeat: int = 20) -> bool:
+    """在保存下来的列表页上比对各解析后端的结果，并测量每页的解析耗时（--check_parser）
+
+    html_dir 中的每个 *.html 文件是一页列表 HTML（即 fetch 返回的内容）。
+    以 bs4 后端的结果为准，其他后端提取的字段（包括分辨率的顺序）必须完全一致，返回是否一致。
+    """
+    paths = sorted(pathlib.Path(html_dir).glob("*.html"))
+    if not paths:
+        logger.warning(f"{html_dir} 中没有 *.html 列表页")
+        return False
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    backends = [name for name in LISTING_PARSERS if name != "lxml" or lxml is not None]
+
+    consistent = True
+    for path, html in zip(paths, pages):
+        expected = json.dumps(extract_list_items_bs4(html), ensure_ascii=False)
+        for backend in backends:
+            if json.dumps(LISTING_PARSERS[backend](html), ensure_ascii=False) != expected:
+                logger.error(f"[PARSER] {path.name}: {backend} 后端的结果与 bs4 不一致")
+                consistent = False
+
+    for backend in backends:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for html in pages:
+                LISTING_PARSERS[backend](html)
+        elapsed = time.perf_counter() - started
+        logger.info(f"[PARSER] {backend}: 平均 {elapsed * 1000 / (repeat * len(pages)):.2f} 毫秒/页（{len(pages)} 页 x {repeat} 次）")
+    return consistent
+
+
+def build_wallpaper_items(raw_items: List[Dict], device_type: str = "电脑") -> List[Dict]:
+    """把提取出的原始列表项转换为壁纸条目：提取日期、选择分辨率、构建下载URL（各解析后端共用）"""
+    wallpapers = []
     
-    if not list_items:
-        # parse_wallpaper_items 在 get_wallpapers_in_page 中调用，已在多线程环境中
-        # 但这里暂时不添加锁，因为调用它的地方已经有锁了
+    if not raw_items:
         return []
     
-    # 不在 parse_wallpaper_items 中打印，由调用者打印
+    # 不在 build_wallpaper_items 中打印，由调用者打印
     
     # 设备类型对应的尺寸优先级（从高到低）
     device_size_priority = {
@@ -449,39 +2199,25 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
     
     priority_sizes = device_size_priority.get(device_type, device_size_priority["电脑"])
     
-    for list_item in list_items:
-        # 1. 获取壁纸名称（从 .txt 元素）
-        txt_elem = list_item.select_one(".txt")
-        name = txt_elem.get_text(strip=True) if txt_elem else ""
+    for raw in raw_items:
+        name = raw["name"]
+        primaryid = raw["primaryid"]
+        has_download_pop = raw["has_download_pop"]
+        image_url = raw["image_url"]
+        available_sizes = raw["available_sizes"]
         
-        # 2. 获取 primaryid（从 download-pop 或 icon 元素）
-        download_pop = list_item.select_one(".download-pop[primaryid]")
-        if download_pop:
-            primaryid = download_pop.get("primaryid", "")
-        else:
-            # 备用方法：从 icon 元素获取
-            icon_elem = list_item.select_one(".icon[primaryid]")
-            primaryid = icon_elem.get("primaryid", "") if icon_elem else ""
-            if primaryid:
-                logger.warning(f"壁纸项未找到 download-pop 元素，使用兜底方案：从 icon 元素获取 primaryid={primaryid}")
+        if not has_download_pop and primaryid:
+            logger.warning("壁纸项未找到 download-pop 元素，使用兜底方案：从 icon 元素获取 primaryid=%s", primaryid)
         
         if not primaryid:
-            logger.warning(f"壁纸项无法获取 primaryid，跳过此项（名称: {name[:30] if name else '未命名'}）")
+            logger.warning("壁纸项无法获取 primaryid，跳过此项（名称: %s）", name[:30] if name else '未命名')
             continue
         
-        # 3. 获取图片URL并提取日期信息（年/月）
-        # 图片URL在 .item-a img[src] 中
-        item_a = list_item.select_one(".item-a")
-        img_elem = None
-        image_url = ""
+        # 从图片URL提取日期信息（年/月）
         year = ""
         month = ""
         
-        if item_a:
-            img_elem = item_a.select_one("img[src]")
-        
-        if img_elem:
-            image_url = img_elem.get("src", "")
+        if image_url:
             # 格式1：/Uploads/image/2026/01/28/...
             date_match = re.search(r'/Uploads/image/(\d{4})/(\d{2})/', image_url)
             if date_match:
@@ -506,13 +2242,20 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
             if primaryid.startswith("2"):
                 year = "更早"
                 month = ""
-                logger.warning(f"壁纸 {primaryid} ({name[:30] if name else '未命名'}) 无法从URL提取日期，primaryid以2开头，使用兜底方案：归档到'更早'文件夹")
+                logger.warning(
+                    "壁纸 %s (%s) 无法从URL提取日期，primaryid以2开头，使用兜底方案：归档到'更早'文件夹",
+                    primaryid, name[:30] if name else '未命名', extra={"primaryid": primaryid, "device": device_type},
+                )
             else:
                 # 否则使用当前日期作为默认值
                 current_time = time.localtime()
                 year = str(current_time.tm_year)
                 month = f"{current_time.tm_mon:02d}"
-                logger.warning(f"壁纸 {primaryid} ({name[:30] if name else '未命名'}) 无法从URL提取日期 ({image_url[:60] if image_url else '无URL'}...)，使用兜底方案：当前日期 {year}/{month}")
+                logger.warning(
+                    "壁纸 %s (%s) 无法从URL提取日期 (%s...)，使用兜底方案：当前日期 %s/%s",
+                    primaryid, name[:30] if name else '未命名', image_url[:60] if image_url else '无URL', year, month,
+                    extra={"primaryid": primaryid, "device": device_type},
+                )
             # 注意：这里不使用 print_lock，因为 parse_wallpaper_items 不在多线程中调用
             # 如果后续改为多线程解析，需要添加锁
             # if image_url:
@@ -520,21 +2263,12 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
             # else:
             #     print(f"[WARN] 壁纸 {primaryid} 未找到图片URL，使用当前日期: {year}/{month}")
         
-        # 3. 从 download-pop 中解析支持的分辨率
-        available_sizes = {}
-        if download_pop:
-            # 查找所有 data-size 属性
-            size_links = download_pop.select("a[data-size]")
-            for link in size_links:
-                try:
-                    size_num = int(link.get("data-size", ""))
-                    size_text = link.get_text(strip=True)  # 例如 "1920 x 1080"
-                    if size_num and size_text:
-                        available_sizes[size_num] = size_text
-                except ValueError:
-                    continue
-        else:
-            logger.warning(f"壁纸 {primaryid} ({name[:30] if name else '未命名'}) 未找到 download-pop 元素，无法解析可用分辨率")
+        # 3. download-pop 中支持的分辨率（由解析后端提取）
+        if not has_download_pop:
+            logger.warning(
+                "壁纸 %s (%s) 未找到 download-pop 元素，无法解析可用分辨率",
+                primaryid, name[:30] if name else '未命名', extra={"primaryid": primaryid, "device": device_type},
+            )
         
         # 4. 根据设备类型和可用分辨率，选择最高画质
         selected_size = None
@@ -551,9 +2285,14 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
         if not selected_size and available_sizes:
             selected_size = max(available_sizes.keys())
             selected_px = available_sizes[selected_size]
-            priority_str = ", ".join([str(s) for s in priority_sizes])
-            available_sizes_str = ", ".join([f"{k}:{v}" for k, v in available_sizes.items()])
-            logger.warning(f"壁纸 {primaryid} ({name[:30] if name else '未命名'}) 未匹配到设备类型 '{device_type}' 的推荐分辨率优先级 [{priority_str}]，使用兜底方案：可用分辨率中的最大值 {selected_px} (可用: [{available_sizes_str}])")
+            if logger.isEnabledFor(logging.WARNING):
+                priority_str = ", ".join([str(s) for s in priority_sizes])
+                available_sizes_str = ", ".join([f"{k}:{v}" for k, v in available_sizes.items()])
+                logger.warning(
+                    "壁纸 %s (%s) 未匹配到设备类型 '%s' 的推荐分辨率优先级 [%s]，使用兜底方案：可用分辨率中的最大值 %s (可用: [%s])",
+                    primaryid, name[:30] if name else '未命名', device_type, priority_str, selected_px, available_sizes_str,
+                    extra={"primaryid": primaryid, "device": device_type, "px": selected_px},
+                )
         
         # 如果还是没有找到，使用默认值
         if not selected_size:
@@ -566,8 +2305,13 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
                 "平板": (8, "2732 x 2732"),
             }
             selected_size, selected_px = default_map.get(device_type, (13, "4000 x 2250"))
-            available_sizes_str = ", ".join([f"{k}:{v}" for k, v in available_sizes.items()]) if available_sizes else "无"
-            logger.warning(f"壁纸 {primaryid} ({name[:30] if name else '未命名'}) 未匹配到设备类型 '{device_type}' 的推荐分辨率，可用分辨率: [{available_sizes_str}]，使用兜底方案：默认分辨率 {selected_px}")
+            if logger.isEnabledFor(logging.WARNING):
+                available_sizes_str = ", ".join([f"{k}:{v}" for k, v in available_sizes.items()]) if available_sizes else "无"
+                logger.warning(
+                    "壁纸 %s (%s) 未匹配到设备类型 '%s' 的推荐分辨率，可用分辨率: [%s]，使用兜底方案：默认分辨率 %s",
+                    primaryid, name[:30] if name else '未命名', device_type, available_sizes_str, selected_px,
+                    extra={"primaryid": primaryid, "device": device_type, "px": selected_px},
+                )
             # 注意：这里不使用 print_lock，因为 parse_wallpaper_items 不在多线程中调用
             # 如果后续改为多线程解析，需要添加锁
         
@@ -579,13 +2323,15 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
         # 6. 如果没有名称，使用 primaryid
         if not name:
             name = f"wallpaper_{primaryid}"
-            logger.warning(f"壁纸 {primaryid} 未找到名称，使用兜底方案：wallpaper_{primaryid}")
+            logger.warning("壁纸 %s 未找到名称，使用兜底方案：wallpaper_%s", primaryid, primaryid)
         
         wallpapers.append({
             "primaryid": primaryid,
             "name": name,
             "px": selected_px,
             "size": selected_size,
+            # 所有可用分辨率 [[尺寸编号, 分辨率文本], ...]（多分辨率模式使用；用列表以便原样存入缓存 JSON）
+            "available_sizes": [[size_num, size_text] for size_num, size_text in available_sizes.items()],
             "download_url": download_url,
             "year": year,
             "month": month,
@@ -594,27 +2340,24 @@ def parse_wallpaper_items(soup: BeautifulSoup, device_type: str = "电脑") -> L
     return wallpapers
 
 
-def download_wallpaper(
-    url: str, 
-    name: str, 
-    px: str, 
-    page_num: int, 
-    index: int,
+def build_wallpaper_path(
     device_folder: str,
     primaryid: str,
+    name: str,
+    px: str,
     year: str = "",
     month: str = "",
-    session_obj: Optional[requests.Session] = None
-):
-    """下载单张壁纸
-    
+    page_num: int = 0,
+    index: int = 0,
+) -> Tuple[str, str, str]:
+    """计算壁纸的保存位置（同步/异步引擎共用，保证落盘规则一致）
+
     文件夹结构：设备类型/年/月/ 或 设备类型/更早/
     文件名格式：文件编码_文件名_分辨率.png
-    使用 primaryid 作为文件编码，确保即使文件名相同也不会覆盖
-    """
-    device = device_folder or "未知设备"
-    px_norm = normalize_px(px)
 
+    返回:
+        (filename, filepath, rel_path)
+    """
     # 构建保存路径：设备类型/年/月/ 或 设备类型/更早/
     if year == "更早":
         # primaryid 以 2 开头且没有时间信息，归档到"更早"文件夹
@@ -625,15 +2368,16 @@ def download_wallpaper(
         # 如果没有日期信息，使用设备类型文件夹
         folder = os.path.join(DOWNLOAD_DIR, device_folder)
         logger.warning(
-            f"壁纸 {primaryid} ({name[:30] if name else '未命名'}) "
-            f"没有日期信息（year={year}, month={month}），使用兜底方案：保存到设备类型文件夹 {device_folder}"
+            "壁纸 %s (%s) 没有日期信息（year=%s, month=%s），使用兜底方案：保存到设备类型文件夹 %s",
+            primaryid, name[:30] if name else '未命名', year, month, device_folder,
+            extra={"primaryid": primaryid, "device": device_folder, "px": px},
         )
     os.makedirs(folder, exist_ok=True)
     
     # 构建文件名：文件编码_文件名_分辨率.png
     safe_name = safe_segment(name) if name else f"wallpaper_{page_num}_{index}"
     # 分辨率字符串与文件名/数据库保持一致，例如 "1920 x 1080" -> "1920x1080"
-    safe_px = px_norm
+    safe_px = normalize_px(px)
     # 再次确保没有其他特殊字符（理论上不会出现，但保留防御）
     safe_px = re.sub(r'[\\/:*?"<>|]', '_', safe_px)
     
@@ -643,21 +2387,42 @@ def download_wallpaper(
 
     # 计算数据库中使用的相对路径（相对于项目根目录）
     rel_path = os.path.relpath(filepath, pathlib.Path(".").resolve())
+    return filename, filepath, rel_path
+
+
+def skip_existing_wallpaper(
+    primaryid: str,
+    name: str,
+    px: str,
+    device: str,
+    year: str,
+    month: str,
+    filepath: str,
+    rel_path: str,
+) -> bool:
+    """按数据库 / 文件系统判断是否需要跳过下载（同步/异步引擎共用的去重规则）
+
+    - 数据库已有记录：[DB-SKIP]
+    - 数据库没有记录，但文件已经存在：视为历史文件，补一条记录后 [FS-SKIP]
+    """
+    px_norm = normalize_px(px)
 
     # 先根据数据库判断是否已经下载过
     if db_has_wallpaper(primaryid=primaryid, px=px_norm, device=device):
         logger.info(
-            f"[DB-SKIP] 壁纸 {primaryid} ({name[:30] if name else '未命名'}) "
-            f"{px_norm} 已在数据库记录中，跳过下载"
+            "[DB-SKIP] 壁纸 %s (%s) %s 已在数据库记录中，跳过下载", primaryid, name[:30] if name else '未命名', px_norm,
+            extra={"primaryid": primaryid, "device": device, "px": px_norm},
         )
-        return
+        metrics.inc("gugong_skips_total", reason="db")
+        return True
 
     # 如果数据库没有记录，但文件已经存在，则认为是“历史文件”，补一条记录后跳过下载
     if os.path.exists(filepath):
         logger.info(
-            f"[FS-SKIP] 壁纸 {primaryid} ({name[:30] if name else '未命名'}) "
-            f"{px_norm} 文件已存在但数据库无记录，补充入库并跳过下载"
+            "[FS-SKIP] 壁纸 %s (%s) %s 文件已存在但数据库无记录，补充入库并跳过下载", primaryid, name[:30] if name else '未命名', px_norm,
+            extra={"primaryid": primaryid, "device": device, "px": px_norm},
         )
+        metrics.inc("gugong_skips_total", reason="fs")
         db_upsert_wallpaper(
             primaryid=primaryid,
             device=device,
@@ -667,382 +2432,2750 @@ def download_wallpaper(
             px=px_norm,
             rel_path=rel_path,
         )
-        return
+        return True
+
+    return False
+
+
+def get_image_headers() -> Dict[str, str]:
+    """下载图片使用的请求头"""
+    headers = get_random_headers(referer=ALL_URL, is_ajax=False)
+    # 下载图片时添加额外的请求头
+    headers.update({
+        "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+        "Sec-Fetch-Dest": "image",
+        "Sec-Fetch-Mode": "no-cors",
+        "Sec-Fetch-Site": "cross-site",
+    })
+    return headers
+
+
+def download_wallpaper(
+    url: str, 
+    name: str, 
+    px: str, 
+    page_num: int, 
+    index: int,
+    device_folder: str,
+    primaryid: str,
+    year: str = "",
+    month: str = "",
+    session_obj: Optional[requests.Session] = None
+):
+    """下载单张壁纸
+    
+    文件夹结构：设备类型/年/月/ 或 设备类型/更早/
+    文件名格式：文件编码_文件名_分辨率.png
+    使用 primaryid 作为文件编码，确保即使文件名相同也不会覆盖
+    返回是否成功（跳过也算成功）
+    """
+    device = device_folder or "未知设备"
+    px_norm = normalize_px(px)
+
+    filename, filepath, rel_path = build_wallpaper_path(
+        device_folder, primaryid, name, px_norm, year, month, page_num, index
+    )
+
+    if skip_existing_wallpaper(primaryid, name, px_norm, device, year, month, filepath, rel_path):
+        return True
+    
+    headers = get_image_headers()
+    
+    sess = session_obj or http_sessions.get()
+    log_fields = {"primaryid": primaryid, "device": device, "px": px_norm}
+    started = time.perf_counter()
+    
+    try:
+        # 其他设备正在下载同一内容时先等待，之后直接链接，不再下载
+        with content_store.claim(primaryid, px_norm):
+            reused = reuse_downloaded_content(primaryid, px_norm, filepath)
+            if reused is not None:
+                size, sha256 = reused
+            else:
+                logger.info("[DOWN] %s <- %s", filename, url, extra=dict(log_fields, url=url))
+                with metrics.time("gugong_transfer_seconds"):
+                    size, sha256 = download_to_file(sess, url, filepath, headers)
+                metrics.inc("gugong_downloads_total", result="ok")
+                metrics.inc("gugong_download_bytes_total", size)
+
+            # 下载成功（且通过完整性校验）后，写入数据库；在 claim 内写入，等待中的设备随后即可链接
+            db_upsert_wallpaper(
+                primaryid=primaryid,
+                device=device,
+                year=year,
+                month=month,
+                name=name,
+                px=px_norm,
+                rel_path=rel_path,
+                sha256=sha256,
+                size=size,
+            )
+
+        logger.info(
+            "[OK] %s", filename,
+            extra=dict(log_fields, bytes=size, duration=round(time.perf_counter() - started, 3)),
+        )
+        return True
+    except Exception as e:
+        metrics.inc("gugong_downloads_total", result="failed")
+        logger.error(
+            "下载失败 %s: %s", filename, e, exc_info=True,
+            extra=dict(log_fields, url=url, duration=round(time.perf_counter() - started, 3)),
+        )
+        return False
+
+
+# 允许保存的图片格式的文件头（下载到的 HTML 错误页等内容会因文件头不匹配而被拒绝）
+IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",  # PNG
+    b"\xff\xd8\xff",         # JPEG
+)
+
+
+def expected_total_size(status: int, headers) -> Optional[int]:
+    """从响应头推算完整文件的字节数，无法确定时返回 None
+
+    - 206：取 Content-Range 中 "/" 之后的总长度
+    - 200：取 Content-Length（响应经过 gzip 等压缩时，解压后的长度与之不同，不做比较）
+    """
+    if status == 206:
+        total = headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    if headers.get("Content-Encoding", "identity") not in ("", "identity"):
+        return None
+    length = headers.get("Content-Length", "")
+    return int(length) if length.isdigit() else None
+
+
+class StreamVerifier:
+    """边下载边校验：统计字节数、检查文件头、计算 SHA-256，不需要下载完再从磁盘读回
+
+    断点续传时先用 resume 把 .part 中已有的内容计入（只读已下载的前缀一次），
+    之后每个写入的分块都调用 update，最后由 finish 检查结果。
+    """
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+
+    def update(self, chunk: bytes) -> None:
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        if len(self.head) < 8:
+            self.head += chunk[:8 - len(self.head)]
+
+    def resume(self, part_path: str) -> None:
+        """把续传前 .part 中已下载的内容计入摘要"""
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                self.update(chunk)
+
+    def finish(self, expected_size: Optional[int]) -> Tuple[int, str]:
+        """检查字节数与文件头，通过时返回 (size, sha256)，否则抛出 IOError"""
+        if expected_size is not None and self.size != expected_size:
+            raise IOError(f"文件大小不一致：已下载 {self.size} 字节，应为 {expected_size} 字节")
+        if not self.head.startswith(IMAGE_SIGNATURES):
+            raise IOError(f"下载内容不是图片（文件头: {self.head!r}）")
+        return self.size, self.sha256.hexdigest()
+
+
+def part_file_size(part_path: str) -> int:
+    """已下载的 .part 文件大小（即续传起点），文件不存在时为 0"""
+    try:
+        return os.path.getsize(part_path)
+    except OSError:
+        return 0
+
+
+def open_part_file(part_path: str, offset: int, status: int, content_range: str):
+    """根据响应决定续写还是重写 .part 文件（同步/异步引擎共用）
+
+    - 206 且 Content-Range 从续传位置开始：追加写入
+    - 200（服务器不支持 Range）：从头覆盖
+    - 206 但 Content-Range 与续传位置不一致：丢弃 .part 并抛出异常，下次重试从头下载
+    """
+    if offset and status == 206:
+        if content_range.startswith(f"bytes {offset}-"):
+            return open(part_path, "ab")
+        os.remove(part_path)
+        raise IOError(f"Content-Range 与续传位置 {offset} 不一致: {content_range or '无'}")
+    return open(part_path, "wb")
+
+
+def write_part_block(f, verifier: StreamVerifier, block: bytes) -> None:
+    """写入一块下载内容并计入校验（异步引擎在线程池中调用）"""
+    with profiler.stage("write"):
+        f.write(block)
+        verifier.update(block)
+
+
+def remove_part_file(part_path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(part_path)
+
+
+def download_error_status(e: Exception) -> Optional[int]:
+    """从 requests / aiohttp 的 HTTP 异常中取出状态码，其他异常返回 None"""
+    response = getattr(e, "response", None)
+    if response is not None:
+        return getattr(response, "status_code", None)
+    return getattr(e, "status", None)
+
+
+def is_retryable_download_error(e: Exception) -> bool:
+    """超时、连接中断、5xx、408、416、429 可以重试；其他 4xx（如 404）重试也没有意义"""
+    status = download_error_status(e)
+    if status is None:
+        return True
+    return not (400 <= status < 500) or status in (408, 416, 429)
+
+
+def download_retry_delay(attempt: int) -> float:
+    """第 attempt 次重试前的等待秒数：指数退避，并在 [0, 上限] 内随机抖动，避免多个线程同时重试"""
+    return random.uniform(0, min(DOWNLOAD_RETRY_MAX_DELAY, DOWNLOAD_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def finish_part_file(part_path: str, filepath: str, verifier: StreamVerifier, expected_size: Optional[int]) -> Tuple[int, str]:
+    """校验下载结果，通过后把 .part 重命名为最终文件名并返回 (size, sha256)
+
+    校验失败说明 .part 中的内容不可用于续传（错误页、长度不符），直接删除，下次重试从头下载。
+    """
+    with profiler.stage("write"):
+        try:
+            result = verifier.finish(expected_size)
+        except IOError:
+            os.remove(part_path)
+            raise
+        os.replace(part_path, filepath)
+        return result
+
+
+def download_to_file(sess: requests.Session, url: str, filepath: str, headers: Dict[str, str]) -> Tuple[int, str]:
+    """下载图片到 filepath.part，完整下载并通过校验后才重命名为 filepath
+
+    传输中断时保留 .part 文件，重试时用 Range 请求从已下载的位置续传；
+    这样中途失败不会留下被当作 [FS-SKIP] 的残缺图片。
+    下载过程中同时校验长度、文件头并计算 SHA-256，返回 (size, sha256)。
+    """
+    part_path = filepath + PART_SUFFIX
+    for attempt in range(DOWNLOAD_MAX_RETRIES + 1):
+        offset = part_file_size(part_path)
+        request_headers = dict(headers)
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+        try:
+            with rate_limiters.for_url(url).request() as slot:
+                with sess.get(url, headers=request_headers, stream=True, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_DOWNLOAD_READ_TIMEOUT)) as r:
+                    slot.mark_response(r.status_code)
+                    if r.status_code == 416:
+                        # 续传位置超出文件大小（服务器上的文件可能已变化），丢弃 .part 从头下载
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(part_path)
+                    r.raise_for_status()
+                    expected_size = expected_total_size(r.status_code, r.headers)
+                    verifier = StreamVerifier()
+                    with open_part_file(part_path, offset, r.status_code, r.headers.get("Content-Range", "")) as f:
+                        if f.mode == "ab":
+                            verifier.resume(part_path)
+                        for chunk in r.iter_content(chunk_size=8192):
+                            if chunk:
+                                with profiler.stage("write"):
+                                    f.write(chunk)
+                                    verifier.update(chunk)
+            return finish_part_file(part_path, filepath, verifier, expected_size)
+        except Exception as e:
+            if attempt >= DOWNLOAD_MAX_RETRIES or not is_retryable_download_error(e):
+                raise
+            delay = download_retry_delay(attempt)
+            metrics.inc("gugong_download_retries_total")
+            downloaded = part_file_size(part_path)
+            logger.warning(
+                "[RETRY] %s 下载中断（已下载 %d 字节），%.1f 秒后第 %d 次重试: %s",
+                os.path.basename(filepath), downloaded, delay, attempt + 1, e,
+                extra={"url": url, "bytes": downloaded},
+            )
+            time.sleep(delay)
+
+
+def get_wallpapers_in_page(
+    base_url: str,
+    page_num: int,
+    device_folder: str,
+    device_type: str = "电脑",
+    session_obj: Optional[requests.Session] = None,
+    thread_id: int = 0,
+    device_label: Optional[str] = None,
+    pipeline: Optional["DownloadPipeline"] = None,
+    wallpapers: Optional[List[Dict]] = None,
+    sync: Optional["IncrementalSync"] = None,
+    job: Optional["CrawlJob"] = None,
+    layout: Optional["ListingLayout"] = None,
+) -> tuple[bool, bool]:
+    """获取并下载每页的壁纸
+
+    如果传入 pipeline，则只负责抓取和解析列表页，壁纸交给流水线的下载线程处理，
+    本函数不等待图片下载完成即可返回。
+    如果传入 wallpapers（例如 get_total_pages 已经解析过的第一页），则不再请求该页。
+    如果传入 sync（增量模式），只下载第一张已知壁纸之前的新壁纸。
+    如果传入 job（全量模式的断点记录），记录本页已完成以及每个下载任务的结果。
+    如果传入 layout（分页参数），非最后一页的条数少于 pagesize 时抛出 ListingTruncatedError。
+
+    返回:
+        (has_data, has_new)
+        - has_data: 该页是否有壁纸数据
+        - has_new:  该页是否至少包含一条数据库中尚不存在的壁纸；
+                    传入 sync 时表示本页没有遇到已知壁纸，需要继续扫描下一页
+    """
+    logger.info("=====>>> 当前页: %d", page_num, extra={"page": page_num, "device": device_type})
+    
+    # 添加页码参数
+    url = f"{base_url}&p={page_num}"
+    logger.info("=====>>> 当前页URL: %s", url, extra={"page": page_num, "url": url})
+    if wallpapers is None:
+        _, wallpapers = fetch_listing(url, device_type=device_type, session_obj=session_obj)
+    logger.info("本页找到 %d 张壁纸", len(wallpapers), extra={"page": page_num, "device": device_type})
+    
+    if len(wallpapers) == 0:
+        logger.info("第 %d 页没有壁纸，停止爬取", page_num)
+        if job is not None:
+            job.record_empty_page(page_num)
+        return False, False
+    if layout is not None:
+        layout.check(page_num, listing_item_count(wallpapers))
+
+    if sync is not None:
+        items = sync.take(wallpapers)
+        has_new = not sync.stopped
+    else:
+        # 判断该页是否存在“数据库中尚不存在”的新壁纸
+        label = device_label or (device_folder or "未知设备")
+        has_new = page_has_new_wallpapers(wallpapers, label)
+        items = list(enumerate(wallpapers))
+    
+    tasks = [task for index, wp in items for task in build_download_tasks(wp, page_num, index, device_folder)]
+    if job is not None:
+        job.record_page(page_num, tasks)
+    for task in tasks:
+        if job is not None:
+            on_done = job.task_callback(task)
+        else:
+            on_done = sync.task_callback(task) if sync is not None else None
+        if pipeline is not None:
+            # 队列满时阻塞，等待下载线程消费（背压）
+            pipeline.submit(task, on_done)
+            continue
+        ok = download_wallpaper(**task, session_obj=session_obj)
+        if on_done is not None:
+            on_done(ok)
+    
+    return True, has_new
+
+
+def parse_download_sizes(value: str):
+    """解析 --sizes 参数："best"、"all" 或逗号分隔的尺寸编号（如 "13,12"）"""
+    value = value.strip()
+    if value in ("best", "all"):
+        return value
+    sizes = {int(part) for part in value.split(",") if part.strip()}
+    unknown = sizes - set(SIZE_FORMAT_MAP)
+    if not sizes or unknown:
+        raise ValueError(f"无效的尺寸编号: {value}（可选: best, all 或 {', '.join(str(k) for k in SIZE_FORMAT_MAP)}）")
+    return sizes
+
+
+def plan_download_sizes(wp: Dict) -> List[Tuple[int, str]]:
+    """按 DOWNLOAD_SIZES 列出一张壁纸需要下载的 (尺寸编号, 分辨率文本)"""
+    with profiler.stage("sizes"):
+        if DOWNLOAD_SIZES == "best":
+            return [(wp["size"], wp["px"])]
+        # 旧版本缓存的条目没有 available_sizes，只能下载已选中的分辨率
+        available = [(size_num, size_text) for size_num, size_text in wp.get("available_sizes") or [[wp["size"], wp["px"]]]]
+        if DOWNLOAD_SIZES == "all":
+            return available
+        return [(size_num, size_text) for size_num, size_text in available if size_num in DOWNLOAD_SIZES]
+
+
+def page_has_new_wallpapers(wallpapers: List[Dict], device: str) -> bool:
+    """判断一页壁纸中是否至少有一个需要下载的分辨率尚未入库（索引已加载时一次性批量判断）"""
+    keys = [(wp["primaryid"], size_text, device) for wp in wallpapers for _, size_text in plan_download_sizes(wp)]
+    if wallpaper_index.db_path == DB_PATH:
+        return bool(wallpaper_index.filter_new(keys))
+    return any(
+        not db_has_wallpaper(primaryid=primaryid, px=px, device=device)
+        for primaryid, px, device in keys
+    )
+
+
+class IncrementalSync:
+    """增量模式的扫描状态与高水位线（每个设备 + 分类一条，保存在 sync_marks 表中）
+
+    - take：列表按新到旧排列，遇到高水位线记录的壁纸，或所有待下载分辨率都已入库的壁纸时停止，
+            只有它之前的新壁纸交给下载，不再逐页检查数据库、也不再把整页交给下载
+    - retry_tasks：之前的同步中下载失败的任务。高水位线可能已经越过这些壁纸（例如 A 成功、B 失败、
+                   C 已入库时高水位线推进到 A，下次扫描在 A 处停止），因此扫描结束后总是重新提交它们
+    - commit：下载全部结束后调用，把高水位线推进到本次扫描到的最新一张已入库的壁纸，
+              并把本次下载失败的任务记入 sync_retries 表，成功的任务移出；
+              有列表页处理失败（failed_pages）时不推进高水位线，失败页及之后的壁纸下次同步时重新扫描
+    """
+
+    def __init__(self, device: str, category_id: Optional[int] = None, db_path: str = DB_PATH):
+        self.device = device
+        self.category_id = category_id or DEFAULT_CATEGORY_ID
+        self.db_path = db_path
+        self.high_water = db_get_sync_mark(device, self.category_id, db_path)
+        self.retries = db_get_sync_retries(device, self.category_id, db_path)
+        # 按列表顺序扫描过的壁纸（包括停止时遇到的那一张）
+        self.scanned: List[Dict] = []
+        self.stopped = False
+        # 本次扫描中处理失败的页数（如 ListingTruncatedError）
+        self.failed_pages = 0
+        # 本次提交的下载任务：(primaryid, 分辨率) -> (任务, 是否成功；尚未结束时为 None)
+        self.results: Dict[Tuple[str, str], Tuple[Dict, Optional[bool]]] = {}
+        self._lock = threading.Lock()
+
+    def is_known(self, wp: Dict) -> bool:
+        return wp["primaryid"] == self.high_water or not page_has_new_wallpapers([wp], self.device)
+
+    def take(self, wallpapers: List[Dict]) -> List[Tuple[int, Dict]]:
+        """返回本页中需要下载的 [(页内序号, 壁纸)]；遇到已知壁纸时 stopped 置为 True"""
+        new_items = []
+        for index, wp in enumerate(wallpapers):
+            self.scanned.append(wp)
+            if self.is_known(wp):
+                self.stopped = True
+                break
+            new_items.append((index, wp))
+        return new_items
+
+    def task_callback(self, task: Dict) -> Callable[[bool], None]:
+        """登记一个已提交的下载任务，返回记录其结果的回调"""
+        key = (task["primaryid"], normalize_px(task["px"]))
+        with self._lock:
+            self.results[key] = (task, None)
+
+        def on_done(ok: bool) -> None:
+            with self._lock:
+                self.results[key] = (task, ok)
+
+        return on_done
+
+    def retry_tasks(self) -> List[Dict]:
+        """之前失败、本次扫描没有再次提交的任务（在列表页扫描结束后调用）"""
+        with self._lock:
+            return [task for task in self.retries if (task["primaryid"], normalize_px(task["px"])) not in self.results]
+
+    def commit(self) -> None:
+        with self._lock:
+            results = list(self.results.values())
+        done = [task for task, ok in results if ok]
+        failed = [task for task, ok in results if not ok]
+        if done or failed:
+            db_update_sync_retries(self.device, self.category_id, done, failed, self.db_path)
+        if failed:
+            logger.warning("设备 %s 有 %d 个下载失败，下次增量同步时重试", self.device, len(failed))
+        if self.failed_pages:
+            logger.warning("设备 %s 有 %d 页处理失败，本次不更新高水位线", self.device, self.failed_pages)
+            return
+        for wp in self.scanned:
+            if wp["primaryid"] == self.high_water:
+                return
+            if not page_has_new_wallpapers([wp], self.device):
+                db_set_sync_mark(self.device, self.category_id, wp["primaryid"], self.db_path)
+                logger.info("设备 %s 的高水位线更新为 %s", self.device, wp["primaryid"])
+                return
+
+
+class CrawlJob:
+    """全量扫描的断点记录（crawl_jobs / crawl_job_pages / crawl_job_items 表）
+
+    - 每页抓取解析后记录该页已完成，并把本页的下载任务记为 pending
+    - 每个下载任务结束后记为 done 或 failed
+    - --resume：继续该设备最近一次未完成的任务，跳过已完成的页，并先重新提交 pending 的下载任务
+    - --retry_failed：只重新下载最近一次任务中失败的图片，不再抓取列表页
+
+    状态更新交给数据库写线程批量提交；进程崩溃时最多丢失最后一个批次，
+    恢复时这些页/任务会重新执行一次（图片走 [DB-SKIP] / [FS-SKIP]，不会重复下载）。
+    """
+
+    def __init__(self, job_id: int, device: str, category_id: int, total_pages: int, db_path: str = DB_PATH):
+        self.job_id = job_id
+        self.device = device
+        self.category_id = category_id
+        self.total_pages = total_pages
+        self.db_path = db_path
+        self.pages_done: Set[int] = set()
+        # 已知的第一个空页页码
+        self.empty_from: Optional[int] = None
+        # 本次运行中处理失败的页数（有失败页时任务保持 running，可用 --resume 重新抓取）
+        self.failed_pages = 0
+
+    @classmethod
+    def start(
+        cls,
+        device: str,
+        category_id: Optional[int],
+        total_pages: int,
+        resume: bool = False,
+        db_path: str = DB_PATH,
+        page_size: int = LISTING_PAGE_SIZE_DEFAULT,
+    ) -> "CrawlJob":
+        """resume 时继续最近一次未完成的任务，否则新建任务（之前未完成的任务标记为 abandoned）
+
+        页码与 pagesize 对应，pagesize 变化后（重新探测）不能继续之前的任务，改为新建任务。
+        """
+        category_id = category_id or DEFAULT_CATEGORY_ID
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = db_get_connection(db_path)
+        try:
+            row = None
+            if resume:
+                row = conn.execute(
+                    """
+                    SELECT id FROM crawl_jobs
+                    WHERE device = ? AND category_id = ? AND status = 'running' AND page_size = ?
+                    ORDER BY id DESC LIMIT 1
+                    """,
+                    (device, category_id, page_size),
+                ).fetchone()
+            if row is not None:
+                job = cls(row[0], device, category_id, total_pages, db_path)
+                for page_num, status in conn.execute(
+                    "SELECT page_num, status FROM crawl_job_pages WHERE job_id = ?", (job.job_id,)
+                ):
+                    if status == "empty":
+                        job.empty_from = page_num if job.empty_from is None else min(job.empty_from, page_num)
+                    else:
+                        job.pages_done.add(page_num)
+                conn.execute(
+                    "UPDATE crawl_jobs SET total_pages = ?, updated_at = ? WHERE id = ?",
+                    (total_pages, now, job.job_id),
+                )
+                logger.info(f"继续设备 {device} 的断点任务 #{job.job_id}：已完成 {len(job.pages_done)}/{total_pages} 页")
+            else:
+                conn.execute(
+                    """
+                    UPDATE crawl_jobs SET status = 'abandoned', updated_at = ?
+                    WHERE device = ? AND category_id = ? AND status = 'running'
+                    """,
+                    (now, device, category_id),
+                )
+                cur = conn.execute(
+                    """
+                    INSERT INTO crawl_jobs (device, category_id, total_pages, status, created_at, updated_at, page_size)
+                    VALUES (?, ?, ?, 'running', ?, ?, ?)
+                    """,
+                    (device, category_id, total_pages, now, now, page_size),
+                )
+                job = cls(cur.lastrowid, device, category_id, total_pages, db_path)
+                if resume:
+                    logger.info(f"设备 {device} 没有未完成的断点任务，新建任务 #{job.job_id}")
+            conn.commit()
+            return job
+        finally:
+            conn.close()
+
+    @classmethod
+    def latest(cls, device: str, category_id: Optional[int], db_path: str = DB_PATH) -> Optional["CrawlJob"]:
+        """该设备最近一次的任务（不论是否完成）"""
+        category_id = category_id or DEFAULT_CATEGORY_ID
+        conn = db_get_connection(db_path)
+        try:
+            row = conn.execute(
+                "SELECT id, total_pages FROM crawl_jobs WHERE device = ? AND category_id = ? ORDER BY id DESC LIMIT 1",
+                (device, category_id),
+            ).fetchone()
+        finally:
+            conn.close()
+        return cls(row[0], device, category_id, row[1], db_path) if row else None
+
+    def tasks_with_status(self, status: str) -> List[Dict]:
+        conn = db_get_connection(self.db_path)
+        try:
+            rows = conn.execute(
+                "SELECT task FROM crawl_job_items WHERE job_id = ? AND status = ?",
+                (self.job_id, status),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+    def record_page(self, page_num: int, tasks: List[Dict]) -> None:
+        """记录一页已抓取：本页的下载任务记为 pending（已有记录的任务保持原状态）"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for task in tasks:
+            db_execute(
+                """
+                INSERT OR IGNORE INTO crawl_job_items (job_id, primaryid, px, task, status, updated_at)
+                VALUES (?, ?, ?, ?, 'pending', ?)
+                """,
+                (self.job_id, task["primaryid"], normalize_px(task["px"]), json.dumps(task, ensure_ascii=False), now),
+                self.db_path,
+            )
+        db_execute(
+            "INSERT OR REPLACE INTO crawl_job_pages (job_id, page_num, status) VALUES (?, ?, 'done')",
+            (self.job_id, page_num),
+            self.db_path,
+        )
+
+    def record_empty_page(self, page_num: int) -> None:
+        db_execute(
+            "INSERT OR REPLACE INTO crawl_job_pages (job_id, page_num, status) VALUES (?, ?, 'empty')",
+            (self.job_id, page_num),
+            self.db_path,
+        )
+
+    def record_task(self, task: Dict, ok: bool) -> None:
+        """记录一个下载任务的结果"""
+        db_execute(
+            "UPDATE crawl_job_items SET status = ?, updated_at = ? WHERE job_id = ? AND primaryid = ? AND px = ?",
+            (
+                "done" if ok else "failed",
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                self.job_id,
+                task["primaryid"],
+                normalize_px(task["px"]),
+            ),
+            self.db_path,
+        )
+
+    def task_callback(self, task: Dict) -> Callable[[bool], None]:
+        return lambda ok: self.record_task(task, ok)
+
+    def commit(self) -> None:
+        """所有页抓取完毕、下载结束后调用：任务标记为 done（失败的图片仍可用 --retry_failed 重试）"""
+        if self.failed_pages:
+            logger.warning(
+                "设备 %s 有 %d 页处理失败，断点任务 #%d 保持未完成，可用 --resume 继续",
+                self.device, self.failed_pages, self.job_id,
+            )
+            return
+        db_execute(
+            "UPDATE crawl_jobs SET status = 'done', updated_at = ? WHERE id = ?",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), self.job_id),
+            self.db_path,
+        )
+
+
+def build_download_tasks(wp: Dict, page_num: int, index: int, device_folder: str) -> List[Dict]:
+    """把解析出的壁纸条目转换为 download_wallpaper 的参数，每个需要下载的分辨率一个任务
+
+    去重按 (primaryid, 分辨率, 设备) 进行，同一壁纸的不同分辨率各自入库、各自跳过。
+    """
+    return [
+        {
+            "url": IMG_DOWNLOAD_URL_TEMPLATE.format(primaryid=wp["primaryid"], size=size_num),
+            "name": wp["name"],
+            "px": size_text,
+            "page_num": page_num,
+            "index": index,
+            "device_folder": device_folder,
+            "primaryid": wp["primaryid"],
+            "year": wp.get("year", ""),
+            "month": wp.get("month", ""),
+        }
+        for size_num, size_text in plan_download_sizes(wp)
+    ]
+
+
+# 运行中的下载流水线（用于导出队列深度）
+download_pipelines: Set["DownloadPipeline"] = set()
+download_pipelines_lock = threading.Lock()
+
+
+def download_queue_depth() -> List[Tuple[Dict[str, str], int]]:
+    with download_pipelines_lock:
+        return [({}, sum(pipeline.tasks.qsize() for pipeline in download_pipelines))]
+
+
+metrics.gauge("gugong_download_queue_depth", download_queue_depth)
+
+
+class DownloadPipeline:
+    """列表页抓取与图片下载解耦的流水线
+
+    - 列表页抓取线程把解析出的下载任务放入有界队列（submit）
+    - 下载线程池从队列中取出任务并下载
+    - 队列满时 submit 阻塞，抓取速度自动跟随下载速度，内存占用与总页数无关
+    """
+
+    def __init__(self, worker_count: int = THREAD_COUNT, queue_size: int = ITEM_QUEUE_SIZE):
+        self.worker_count = worker_count
+        self.tasks: "queue.Queue[Optional[Tuple[Dict, Optional[Callable[[bool], None]]]]]" = queue.Queue(maxsize=queue_size)
+        self.workers: List[threading.Thread] = []
+
+    def start(self) -> "DownloadPipeline":
+        """启动下载线程"""
+        with download_pipelines_lock:
+            download_pipelines.add(self)
+        for worker_id in range(1, self.worker_count + 1):
+            worker = threading.Thread(
+                target=self._download_worker,
+                args=(worker_id,),
+                name=f"下载线程{worker_id}",
+            )
+            worker.start()
+            self.workers.append(worker)
+        return self
+
+    def submit(self, task: Dict, on_done: Optional[Callable[[bool], None]] = None) -> None:
+        """提交一个下载任务（队列满时阻塞）；on_done(是否成功) 在下载结束后由下载线程调用"""
+        self.tasks.put((task, on_done))
+
+    def close(self) -> None:
+        """所有列表页提交完毕后调用：通知下载线程退出，并等待队列中剩余任务下载完成"""
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        with download_pipelines_lock:
+            download_pipelines.discard(self)
+
+    def _download_worker(self, worker_id: int) -> None:
+        """下载线程：不断从队列中取任务下载，收到 None 时退出"""
+        http_sessions.warm()
+        thread_session = http_sessions.get()
+
+        while True:
+            item = self.tasks.get()
+            if item is None:
+                break
+            task, on_done = item
+            try:
+                ok = download_wallpaper(**task, session_obj=thread_session)
+            except Exception as e:
+                ok = False
+                logger.error("下载任务异常 %s: %s", task.get("primaryid"), e, exc_info=True)
+            if on_done is not None:
+                on_done(ok)
+
+
+class ListingItems(list):
+    """一页解析出的壁纸条目，raw_count 为页面中 .list-item 的原始个数
+
+    缺少 primaryid 等无法使用的列表项会被 build_wallpaper_items 跳过，
+    判断每页条数是否被服务器截断（ListingLayout.check）时按原始个数计算。
+    """
+
+    def __init__(self, wallpapers: Iterable[Dict] = (), raw_count: Optional[int] = None):
+        super().__init__(wallpapers)
+        self.raw_count = len(self) if raw_count is None else raw_count
+
+
+def listing_item_count(wallpapers: List[Dict]) -> int:
+    """列表页中 .list-item 的原始个数（普通列表按条目数计算）"""
+    return getattr(wallpapers, "raw_count", len(wallpapers))
+
+
+def parse_listing_html(html: str, device_type: str = "电脑") -> List[Dict]:
+    """提取列表项并构建壁纸条目（parse_listing_page 的计算部分，也在解析进程中执行）"""
+    with profiler.stage("parse"):
+        raw_items = LISTING_PARSERS[resolve_parser_backend(PARSER_BACKEND)](html)
+    with profiler.stage("sizes"):
+        return ListingItems(build_wallpaper_items(raw_items, device_type=device_type), raw_count=len(raw_items))
+
+
+def _parse_listing_batch(pages: List[Tuple[str, str]]) -> List[List[Dict]]:
+    """在解析进程中依次解析多页 [(html, device_type), ...]"""
+    return [parse_listing_html(html, device_type=device_type) for html, device_type in pages]
+
+
+def _init_parse_worker(parser_backend: str, log_queue_mp) -> None:
+    """解析进程的初始化：同步主进程的解析后端，日志经进程间队列交回主进程写入"""
+    global PARSER_BACKEND
+    PARSER_BACKEND = parser_backend
+    profiler.enabled = False
+    threading.current_thread().name = f"解析进程{os.getpid()}"
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue_mp)]
+
+
+class ParsePool:
+    """--parse_workers：列表页解析的进程池
+
+    BeautifulSoup / lxml 建树和条目构建都持有 GIL，与下载线程争用同一个核；
+    启用后 parse_listing_page 把列表页 HTML（字符串）交给解析进程，取回壁纸条目（普通 dict 列表），
+    soup / lxml 对象只在解析进程内部存在，不会被 pickle。
+
+    - 调用线程等待结果时释放 GIL，多个列表页线程 / 设备可以同时占满多个核
+    - 每个解析进程同一时间只分到一个任务：解析进程都在忙时，各线程提交的页面在分发线程处排队，
+      有进程空闲时把排队的页面（最多 PARSE_POOL_BATCH_PAGES 页）合并为一个任务发送，
+      负载低时每页仍单独发送，不额外等待；手上已有多页时用 parse_many（executor.map 按 chunksize 分批）
+    - 小于 PARSE_POOL_MIN_HTML 字节的页面（空页、重定向页）直接在本进程解析，进程间传输反而更慢
+    - 解析进程用 forkserver（不支持时用 spawn）启动，不使用 fork：导入脚本时日志监听线程就已经在运行，
+      多线程进程 fork 出的子进程可能继承被其他线程持有的锁而死锁。子进程重新导入脚本，
+      日志经进程间队列交回主进程写入（日志文件在第一次写入时才创建，子进程不会新建日志文件）
+    """
+
+    def __init__(self):
+        self.workers = 0
+        # 已发送的任务数与页数（基准测试据此统计每个任务的平均页数）
+        self.tasks = 0
+        self.pages = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._log_queue = None
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
+        # [(html, device_type, future), ...]，None 表示结束分发线程
+        self._pending: "queue.Queue" = queue.Queue()
+        self._slots: Optional[threading.Semaphore] = None
+        self._dispatcher: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(self, workers: int) -> None:
+        if workers <= 0 or self._executor is not None:
+            return
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        else:
+            context = multiprocessing.get_context("spawn")
+        self._log_queue = context.Queue()
+        # 解析进程的日志转入主进程的日志队列，与其他日志一起写入文件和控制台
+        self._log_listener = logging.handlers.QueueListener(self._log_queue, DeferredQueueHandler(log_queue))
+        self._log_listener.start()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_parse_worker,
+            initargs=(PARSER_BACKEND, self._log_queue),
+        )
+        self.workers = workers
+        self.tasks = self.pages = 0
+        # 子进程启动时需要重新导入脚本，在这里提前启动，不占用第一批列表页的解析时间
+        for future in [self._executor.submit(int) for _ in range(workers)]:
+            future.result()
+        self._slots = threading.Semaphore(workers)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="解析分发线程", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"列表页解析进程池: {workers} 个进程（{context.get_start_method()}）")
+
+    def parse(self, html: str, device_type: str) -> List[Dict]:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._pending.put((html, device_type, future))
+        return future.result()
+
+    def parse_many(self, pages: List[Tuple[str, str]]) -> List[List[Dict]]:
+        """解析多页 [(html, device_type), ...]，按顺序返回；每个进程大约分到 4 批"""
+        if not pages:
+            return []
+        chunksize = max(1, min(PARSE_POOL_BATCH_PAGES, len(pages) // (self.workers * 4)))
+        self._count(-(-len(pages) // chunksize), len(pages))
+        htmls, device_types = zip(*pages)
+        return list(self._executor.map(parse_listing_html, htmls, device_types, chunksize=chunksize))
+
+    def _count(self, tasks: int, pages: int) -> None:
+        with self._lock:
+            self.tasks += tasks
+            self.pages += pages
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            # 等到有解析进程空闲再取排队的页面，这期间到达的页面合并进同一个任务
+            self._slots.acquire()
+            batch = [item]
+            limit = min(PARSE_POOL_BATCH_PAGES, 1 + self._pending.qsize() // self.workers)
+            while len(batch) < limit:
+                try:
+                    item = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)
+                    break
+                batch.append(item)
+            try:
+                task = self._executor.submit(_parse_listing_batch, [(html, device_type) for html, device_type, _ in batch])
+            except Exception as e:
+                # 进程池已损坏（子进程被杀）等情况：把错误交给等待的调用线程
+                self._slots.release()
+                for *_, future in batch:
+                    future.set_exception(e)
+                continue
+            self._count(1, len(batch))
+            task.add_done_callback(lambda task, batch=batch: self._deliver(task, batch))
+
+    def _deliver(self, task: concurrent.futures.Future, batch: List[tuple]) -> None:
+        self._slots.release()
+        error = task.exception()
+        if error is not None:
+            for *_, future in batch:
+                future.set_exception(error)
+            return
+        for (*_, future), wallpapers in zip(batch, task.result()):
+            future.set_result(wallpapers)
+
+    def shutdown(self) -> None:
+        if self._executor is None:
+            return
+        self._pending.put(None)
+        self._dispatcher.join()
+        self._dispatcher = None
+        self._executor.shutdown()
+        self._executor = None
+        self._log_listener.stop()
+        self._log_listener = None
+
+
+# 全局解析进程池（未启动时在调用线程中解析）
+parse_pool = ParsePool()
+
+
+def parse_listing_page(html: str, device_type: str = "电脑") -> List[Dict]:
+    """解析一页列表 HTML（同步/异步引擎共用）
+
+    返回的结果为空列表时，表示该页没有数据（被重定向或空页面）。
+    """
+    # 检查是否返回空结果
+    if len(html) < 200 and ("refresh" in html.lower() or not html.strip()):
+        return []
+    
+    with metrics.time("gugong_parse_seconds"):
+        if parse_pool.enabled and len(html) >= PARSE_POOL_MIN_HTML:
+            with profiler.stage("parse"):
+                wallpapers = parse_pool.parse(html, device_type)
+        else:
+            wallpapers = parse_listing_html(html, device_type=device_type)
+    metrics.inc("gugong_items_parsed_total", len(wallpapers))
+    return wallpapers
+
+
+class PageFrontier:
+    """全量模式共享的页码前沿（替代按线程静态切分页码范围）
+
+    - 空闲的列表页线程随时领取下一个未处理的页码，慢页面只拖住领取它的线程，
+      总耗时取决于总工作量，而不是最慢的那一段页码
+    - 任意线程遇到空页后记录该页码，所有线程都不再领取其后的页码（全局停止），
+      get_total_pages 兜底返回 100 时也不会去请求大量空页
+    """
+
+    def __init__(
+        self,
+        total_pages: int,
+        start_page: int = 1,
+        done_pages: Iterable[int] = (),
+        empty_from: Optional[int] = None,
+    ):
+        self._lock = threading.Lock()
+        self._next_page = start_page
+        self.total_pages = total_pages
+        # 断点续爬时已经完成的页码，不再分配
+        self.done_pages = set(done_pages)
+        # 已知的第一个空页页码（None 表示尚未遇到空页）
+        self.empty_from: Optional[int] = empty_from
+
+    def claim(self) -> Optional[int]:
+        """领取下一个待抓取的页码，没有剩余页时返回 None"""
+        with self._lock:
+            while self._next_page in self.done_pages:
+                self._next_page += 1
+            page_num = self._next_page
+            if page_num > self.total_pages:
+                return None
+            if self.empty_from is not None and page_num >= self.empty_from:
+                return None
+            self._next_page += 1
+            return page_num
+
+    def mark_empty(self, page_num: int) -> None:
+        """记录空页：该页及之后的页码不再分配"""
+        with self._lock:
+            if self.empty_from is None or page_num < self.empty_from:
+                self.empty_from = page_num
+
+
+def download_pages_range(
+    base_url: str,
+    frontier: PageFrontier,
+    device_folder: str,
+    device_type: str,
+    thread_id: int,
+    pipeline: Optional[DownloadPipeline] = None,
+    job: Optional[CrawlJob] = None,
+    layout: Optional["ListingLayout"] = None,
+):
+    """线程工作函数：从共享页码前沿不断领取页面并下载，直到没有剩余页
+
+    传入 pipeline 时只抓取列表页，壁纸交给流水线的下载线程下载。
+    传入 job 时把每页和每个下载任务的进度记入断点记录。
+    """
+    # 设置线程名称（多个设备同时爬取时带上设备类型，便于区分日志）
+    threading.current_thread().name = f"{device_type}线程{thread_id}"
+    
+    # 本线程的 Session（共享连接池和 cookies，主页面已由 crawl_by_device_type 访问过）
+    thread_session = http_sessions.get()
+    
+    pages_done = 0
+    while True:
+        page_num = frontier.claim()
+        if page_num is None:
+            break
+        try:
+            has_data, _ = get_wallpapers_in_page(
+                base_url,
+                page_num,
+                device_folder,
+                device_type,
+                session_obj=thread_session,
+                thread_id=thread_id,
+                device_label=device_type or device_folder,
+                pipeline=pipeline,
+                job=job,
+                layout=layout,
+            )
+        except Exception as e:
+            # 单页失败不影响其他页面
+            metrics.inc("gugong_failures_total", stage="page")
+            logger.error("第 %d 页处理失败: %s", page_num, e, exc_info=True)
+            if job is not None:
+                job.failed_pages += 1
+            continue
+        if not has_data:
+            logger.info("第 %d 页没有数据，之后的页面不再分配", page_num)
+            frontier.mark_empty(page_num)
+            continue
+        pages_done += 1
+    
+    logger.info("列表页线程完成，共处理 %d 页", pages_done)
+
+
+def build_base_url(
+    category_id: Optional[int] = None,
+    is_pc: int = 0,
+    is_wap: int = 0,
+    is_calendar: int = 0,
+    is_four_k: int = 0,
+    title: str = "",
+    page_size: int = LISTING_PAGE_SIZE_DEFAULT,
+) -> str:
+    """构建检索条件的基础URL（不包含页码）"""
+    # 使用默认 category_id
+    if category_id is None:
+        category_id = DEFAULT_CATEGORY_ID
+    
+    # 构建基础参数（不包含页码）
+    base_params = {
+        "category_id": category_id,
+        "pagesize": page_size,
+        "title": title,
+        "is_pc": is_pc,
+        "is_wap": is_wap,
+        "is_calendar": is_calendar,
+        "is_four_k": is_four_k,
+    }
+    
+    # 构建基础URL（时间戳格式：0.xxx，作为第一个参数）
+    timestamp = time.time() % 1  # 只取小数部分，格式为 0.xxx
+    return f"{FILTER_URL_TEMPLATE}?{timestamp}&{urlencode(base_params)}"
+
+
+class ListingTruncatedError(IOError):
+    """非最后一页的条数少于 pagesize：服务器悄悄截断了每页条数"""
+
+
+def page_size_honored(page_size: int, count: int, max_page: int, base_count: int, base_max_page: int) -> bool:
+    """判断 pagesize=page_size 的第一页（count 条、data-max 为 max_page）是否被服务器如实执行
+
+    用默认 pagesize 的第一页（base_count 条、共 base_max_page 页）估计总条数的范围 [low, high]：
+    - 不止一页时，第一页必须正好 page_size 条（更少说明每页条数被截断），且 data-max 与总条数按 page_size 分页一致
+    - 只有一页时，这一页必须包含全部条目
+    """
+    if base_max_page <= 1:
+        low = high = base_count
+    else:
+        low = (base_max_page - 1) * LISTING_PAGE_SIZE_DEFAULT + 1
+        high = base_max_page * LISTING_PAGE_SIZE_DEFAULT
+    if max_page > 1:
+        return count == page_size and -(-low // page_size) <= max_page <= -(-high // page_size)
+    return low <= count <= min(high, page_size)
+
+
+class ListingPageSizes:
+    """每个分类的列表页 pagesize：探测检索接口实际支持的最大值，结果缓存在 listing_page_sizes 表中
+
+    - 先请求默认 pagesize 的第一页作为基准，再从大到小尝试 LISTING_PAGE_SIZE_CANDIDATES，
+      第一页的条数和 data-max 都与基准一致（page_size_honored）时采用该值；都不满足时使用默认值
+    - 探测结果保存 LISTING_PAGE_SIZE_TTL_DAYS 天，同一进程中每个分类只探测一次
+    - 爬取中发现非最后一页的条数不足（check）时清除该分类的探测结果，下次运行重新探测
+    - --page_size N 时固定使用 N，不探测
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.fixed: Optional[int] = None
+        self._lock = threading.Lock()
+        self._sizes: Dict[int, int] = {}
+
+    def get(self, category_id: Optional[int] = None) -> int:
+        if self.fixed:
+            return self.fixed
+        category_id = category_id or DEFAULT_CATEGORY_ID
+        # 多个设备线程同时启动时，同一分类只探测一次，其他线程等待结果
+        with self._lock:
+            size = self._sizes.get(category_id)
+            if size is None:
+                size = self._load(category_id)
+                if size is None:
+                    size = self._probe(category_id)
+                    self._save(category_id, size)
+                self._sizes[category_id] = size
+            return size
+
+    def check(self, category_id: Optional[int], page_size: int, page_num: int, total_pages: int, count: int) -> None:
+        """非最后一页的条数少于 pagesize 时，清除探测结果并抛出 ListingTruncatedError（该页按失败处理）"""
+        if page_size <= LISTING_PAGE_SIZE_DEFAULT or page_num >= total_pages or count >= page_size:
+            return
+        category_id = category_id or DEFAULT_CATEGORY_ID
+        with self._lock:
+            self._sizes.pop(category_id, None)
+            conn = db_get_connection(self.db_path)
+            try:
+                conn.execute("DELETE FROM listing_page_sizes WHERE category_id = ?", (category_id,))
+                conn.commit()
+            finally:
+                conn.close()
+        raise ListingTruncatedError(
+            f"第 {page_num}/{total_pages} 页只有 {count} 条（pagesize={page_size}），服务器可能截断了每页条数；"
+            f"已清除分类 {category_id} 的 pagesize 探测结果，下次运行重新探测"
+        )
+
+    def _load(self, category_id: int) -> Optional[int]:
+        conn = db_get_connection(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT page_size, probed_at FROM listing_page_sizes WHERE category_id = ?", (category_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        probed_at = datetime.strptime(row[1], "%Y-%m-%d %H:%M:%S")
+        if (datetime.now() - probed_at).total_seconds() > LISTING_PAGE_SIZE_TTL_DAYS * 86400:
+            return None
+        return row[0]
+
+    def _save(self, category_id: int, page_size: int) -> None:
+        conn = db_get_connection(self.db_path)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO listing_page_sizes (category_id, page_size, probed_at) VALUES (?, ?, ?)",
+                (category_id, page_size, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _first_page(self, category_id: int, page_size: int) -> Tuple[int, int]:
+        """请求 pagesize=page_size 的第一页，返回 (条数, data-max 总页数)"""
+        url = f"{build_base_url(category_id=category_id, page_size=page_size)}&p=1"
+        html = fetch(url, referer=ALL_URL, is_ajax=True)
+        if len(html) < 200 and ("refresh" in html.lower() or not html.strip()):
+            return 0, 0
+        count = len(LISTING_PARSERS[resolve_parser_backend(PARSER_BACKEND)](html))
+        return count, parse_total_pages(html)
+
+    def _probe(self, category_id: int) -> int:
+        http_sessions.warm()
+        logger.info(f"探测分类 {category_id} 的列表页支持的最大 pagesize...")
+        try:
+            base_count, base_max_page = self._first_page(category_id, LISTING_PAGE_SIZE_DEFAULT)
+        except Exception as e:
+            logger.warning(f"pagesize 探测失败，使用默认值 {LISTING_PAGE_SIZE_DEFAULT}: {e}")
+            return LISTING_PAGE_SIZE_DEFAULT
+        if base_count == 0 or base_max_page <= 1:
+            # 只有一页，不需要更大的 pagesize
+            return LISTING_PAGE_SIZE_DEFAULT
+        for page_size in sorted(LISTING_PAGE_SIZE_CANDIDATES, reverse=True):
+            if page_size <= LISTING_PAGE_SIZE_DEFAULT:
+                continue
+            try:
+                count, max_page = self._first_page(category_id, page_size)
+            except Exception as e:
+                logger.warning(f"pagesize={page_size} 的探测请求失败: {e}")
+                continue
+            if page_size_honored(page_size, count, max_page, base_count, base_max_page):
+                logger.info(
+                    f"分类 {category_id} 使用 pagesize={page_size}：共 {max_page} 页"
+                    f"（默认 {LISTING_PAGE_SIZE_DEFAULT} 条/页时 {base_max_page} 页）"
+                )
+                return page_size
+            logger.info(f"pagesize={page_size} 未被如实执行（第一页 {count} 条，data-max={max_page}）")
+        logger.info(f"分类 {category_id} 使用默认 pagesize={LISTING_PAGE_SIZE_DEFAULT}")
+        return LISTING_PAGE_SIZE_DEFAULT
+
+
+# 全局 pagesize 探测结果
+listing_page_sizes = ListingPageSizes()
+
+
+class ListingLayout:
+    """一次扫描的分页参数（分类、pagesize、总页数），用于检测每页条数被截断"""
+
+    def __init__(self, category_id: Optional[int], page_size: int, total_pages: int):
+        self.category_id = category_id
+        self.page_size = page_size
+        self.total_pages = total_pages
+
+    def check(self, page_num: int, count: int) -> None:
+        listing_page_sizes.check(self.category_id, self.page_size, page_num, self.total_pages, count)
+
+
+def get_device_flags(device_name: str) -> Dict[str, int]:
+    """根据设备名称设置对应的标志（is_pc / is_wap / is_calendar / is_four_k）"""
+    flags = {"is_pc": 0, "is_wap": 0, "is_calendar": 0, "is_four_k": 0}
+    for flag, name in DEVICE_TYPE_MAP.items():
+        if name == device_name:
+            flags[flag] = 1
+    return flags
+
+
+def crawl_by_device_type(
+    category_id: Optional[int] = None,
+    is_pc: int = 0,
+    is_wap: int = 0,
+    is_calendar: int = 0,
+    is_four_k: int = 0,
+    title: str = "",
+    device_name: str = "全部",
+    full_scan: bool = False,
+    session_obj: Optional[requests.Session] = None,
+    pipeline: Optional[DownloadPipeline] = None,
+    resume: bool = False,
+):
+    """按设备类型爬取壁纸
+
+    参数:
+    - full_scan: 如果为 True，则强制全量扫描所有页；
+                 如果为 False，则按列表顺序（新 → 旧）扫描：
+                     遇到高水位线记录的壁纸或已在数据库中的壁纸即停止，只下载它之前的新壁纸。
+    - session_obj: 抓取列表页使用的 Session（默认为当前线程的共享连接池 Session）
+    - pipeline: 多个设备共用的下载流水线；传入时壁纸交给它下载，本函数只负责列表页，
+                返回时图片可能仍在下载中（由调用方 close）
+    - resume: 全量模式下继续该设备最近一次未完成的断点任务（跳过已完成的页，先重新提交未完成的下载）
+
+    返回本次的扫描状态（增量模式为 IncrementalSync，全量模式为 CrawlJob）：传入 pipeline 时，
+    调用方需要在流水线 close 之后调用其 commit（更新高水位线 / 标记任务完成）；未传入时本函数已经提交。
+    """
+    # 先访问主页面建立会话（整个进程只访问一次）
+    http_sessions.warm()
+    
+    # 该分类支持的最大 pagesize（首次运行时探测，之后使用数据库中的缓存）
+    page_size = listing_page_sizes.get(category_id)
+    base_url = build_base_url(
+        category_id=category_id,
+        is_pc=is_pc,
+        is_wap=is_wap,
+        is_calendar=is_calendar,
+        is_four_k=is_four_k,
+        title=title,
+        page_size=page_size,
+    )
+
+    # 设备文件夹名 / 设备标识（用于数据库 device 字段）
+    device_folder = safe_segment(device_name) if device_name != "全部" else ""
+    device_label = device_folder or "未知设备"
+
+    # 获取总页数
+    total_pages, first_page = get_total_pages(base_url, session_obj=session_obj, device_type=device_name)
+    
+    if total_pages == 0:
+        logger.warning("未找到任何页面，请检查参数是否正确")
+        return
+    layout = ListingLayout(category_id, page_size, total_pages)
+
+    if not full_scan:
+        # 增量模式：按列表顺序处理各页，遇到第一张已下载的壁纸（高水位线）即停止，只下载它之前的新壁纸；
+        # 当前页没有遇到已知壁纸时，并发预取之后的 INCREMENTAL_PREFETCH_PAGES 页，确认停止后取消尚未开始的预取
+        sync = IncrementalSync(device_label, category_id)
+        logger.info(
+            "增量模式：设备 %s 将按列表顺序扫描（高水位线: %s），遇到第一张已下载的壁纸即停止后续扫描。",
+            device_name, sync.high_water or "无",
+        )
+        shared_pipeline = pipeline is not None
+        if not shared_pipeline:
+            pipeline = DownloadPipeline(worker_count=THREAD_COUNT).start()
+        prefetcher = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, INCREMENTAL_PREFETCH_PAGES),
+            thread_name_prefix=f"{device_name}预取线程",
+        )
+        # 页码 -> 预取该页的 Future（结果为解析出的壁纸列表）
+        prefetched: Dict[int, concurrent.futures.Future] = {}
+        try:
+            page_num = 1
+            while page_num <= total_pages:
+                if page_num == 1:
+                    wallpapers = first_page
+                else:
+                    future = prefetched.pop(page_num, None)
+                    wallpapers = future.result() if future is not None else None
+                try:
+                    has_data, has_new = get_wallpapers_in_page(
+                        base_url,
+                        page_num,
+                        device_folder,
+                        device_type=device_name,
+                        session_obj=session_obj,
+                        thread_id=0,
+                        device_label=device_label,
+                        pipeline=pipeline,
+                        wallpapers=wallpapers,
+                        sync=sync,
+                        layout=layout,
+                    )
+                except ListingTruncatedError as e:
+                    # 与全量模式的失败页相同：记录后停止扫描（已提交的下载和之前失败的重试照常完成）
+                    metrics.inc("gugong_failures_total", stage="page")
+                    logger.error("设备 %s 第 %d 页处理失败，停止扫描: %s", device_name, page_num, e)
+                    sync.failed_pages += 1
+                    break
+                if not has_data:
+                    logger.info("设备 %s 第 %d 页没有数据，停止扫描。", device_name, page_num)
+                    break
+                if not has_new:
+                    logger.info(
+                        "设备 %s 第 %d 页遇到已下载的壁纸，根据增量规则，停止后续扫描。",
+                        device_name, page_num,
+                    )
+                    break
+                # 本页全是新壁纸，后面很可能还有：预取之后的几页，与本页的下载并行
+                for ahead in range(page_num + 1, min(page_num + INCREMENTAL_PREFETCH_PAGES, total_pages) + 1):
+                    if ahead not in prefetched:
+                        prefetched[ahead] = prefetcher.submit(
+                            lambda url: fetch_listing(url, device_type=device_name)[1],
+                            f"{base_url}&p={ahead}",
+                        )
+                page_num += 1
+            # 之前同步失败的任务（高水位线可能已越过它们）重新提交
+            retries = sync.retry_tasks()
+            if retries:
+                logger.info("设备 %s 重新提交之前增量同步失败的 %d 个下载", device_name, len(retries))
+            for task in retries:
+                pipeline.submit(task, sync.task_callback(task))
+        finally:
+            # 已确认停止（或出错）：取消尚未开始的预取，正在进行的请求完成后丢弃
+            cancelled = sum(future.cancel() for future in prefetched.values())
+            prefetcher.shutdown(wait=False, cancel_futures=True)
+            if not shared_pipeline:
+                pipeline.close()
+        if cancelled:
+            logger.info("设备 %s 增量扫描已停止，取消 %d 个尚未开始的预取页", device_name, cancelled)
+        if not shared_pipeline:
+            sync.commit()
+        return sync
+
+    # full_scan=True 时，使用流水线全量下载：
+    # PAGE_THREAD_COUNT 个线程抓取列表页，THREAD_COUNT 个线程下载图片，中间用有界队列衔接
+    logger.info("总页数: %d", total_pages)
+    logger.info(
+        "使用 %d 个列表页线程 + %d 个下载线程并发下载（full_scan 模式）",
+        PAGE_THREAD_COUNT, THREAD_COUNT,
+    )
+    shared_pipeline = pipeline is not None
+    if not shared_pipeline:
+        pipeline = DownloadPipeline(worker_count=THREAD_COUNT).start()
+    
+    job = CrawlJob.start(device_label, category_id, total_pages, resume=resume, page_size=page_size)
+    if resume:
+        # 上次已抓取但未下载完成（或未记录结果）的任务先重新提交
+        pending_tasks = job.tasks_with_status("pending")
+        if pending_tasks:
+            logger.info("重新提交断点任务中未完成的 %d 个下载", len(pending_tasks))
+        for task in pending_tasks:
+            pipeline.submit(task, job.task_callback(task))
+    
+    # 第一页在获取总页数时已经解析，直接交给流水线；其余页由列表页线程从共享页码前沿动态领取
+    if 1 not in job.pages_done:
+        try:
+            get_wallpapers_in_page(
+                base_url,
+                1,
+                device_folder,
+                device_type=device_name,
+                device_label=device_label,
+                pipeline=pipeline,
+                wallpapers=first_page,
+                job=job,
+                layout=layout,
+            )
+        except Exception as e:
+            # 与其他页一样按单页失败处理（流水线仍需正常关闭）
+            metrics.inc("gugong_failures_total", stage="page")
+            logger.error("第 1 页处理失败: %s", e, exc_info=True)
+            job.failed_pages += 1
+    frontier = PageFrontier(total_pages, start_page=2, done_pages=job.pages_done, empty_from=job.empty_from)
+    
+    threads = []
+    for thread_id in range(min(PAGE_THREAD_COUNT, total_pages - 1)):
+        # 创建线程
+        thread = threading.Thread(
+            target=download_pages_range,
+            args=(base_url, frontier, device_folder, device_name, thread_id + 1, pipeline, job, layout)
+        )
+        thread.start()
+        threads.append(thread)
+    
+    # 等待所有列表页抓取完成，再等待队列中剩余的图片下载完成
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        if not shared_pipeline:
+            pipeline.close()
+    
+    if shared_pipeline:
+        logger.info("设备 %s 所有列表页抓取完成", device_name)
+    else:
+        job.commit()
+        logger.info("所有线程下载完成")
+    return job
+
+
+def crawl_all(
+    category_id: Optional[int] = None,
+    device_name: str = "全部",
+    full_scan: bool = False,
+    resume: bool = False,
+    retry_failed: bool = False,
+    pipeline: Optional[DownloadPipeline] = None,
+):
+    """爬取壁纸
+    
+    如果 device_name 为 "全部"，会按4种设备类型分别下载到4个不同的文件夹：
+    - walls/电脑/
+    - walls/手机/
+    - walls/月历/
+    - walls/4K/
+
+    - resume: 全量模式下从上次中断的断点继续
+    - retry_failed: 只重新下载最近一次全量任务中失败的图片，不抓取列表页
+    - pipeline: 下载任务的去向（默认新建 DownloadPipeline 在本进程下载；
+                --coordinator 传入 JobQueuePublisher，只把任务写入共享任务队列）。
+                传入时由本函数 close
+    """
+    logger.info("开始爬取壁纸...")
+    logger.info(f"category_id: {category_id or DEFAULT_CATEGORY_ID}")
+    logger.info(f"device_name: {device_name}")
+    logger.info(f"full_scan: {full_scan}")
+    
+    with db_session():
+        # 定义所有设备类型
+        all_device_types = ALL_DEVICE_TYPES
+        
+        if retry_failed:
+            retry_failed_downloads(all_device_types if device_name == "全部" else [device_name], category_id)
+            return
+        
+        # 如果 device_name 是 "全部"，则下载所有4种设备类型
+        if device_name == "全部":
+            logger.info("="*60)
+            logger.info("将按设备类型分别下载到4个不同的文件夹...")
+            logger.info("文件夹结构：")
+            for dt in all_device_types:
+                folder_path = os.path.join(DOWNLOAD_DIR, safe_segment(dt))
+                logger.info(f"  - {folder_path}/")
+            logger.info("="*60)
+            
+            # 只访问一次主页面建立会话，各设备线程共用其 cookies 和连接池
+            http_sessions.warm()
+            
+            # 所有设备并发爬取，共用一个下载流水线（THREAD_COUNT 个下载线程）和全局限速器，
+            # 总耗时约等于最大的那个设备，而不是四个设备之和
+            if pipeline is None:
+                pipeline = DownloadPipeline(worker_count=THREAD_COUNT).start()
+            # 各设备的扫描状态（高水位线 / 断点任务），图片全部下载完成后再提交
+            scan_states = []
+            
+            def crawl_device(idx: int, device_type: str):
+                logger.info("[%d/%d] 开始下载 %s 壁纸...", idx, len(all_device_types), device_type)
+                try:
+                    state = crawl_by_device_type(
+                        category_id=category_id,
+                        **get_device_flags(device_type),
+                        title="",
+                        device_name=device_type,
+                        full_scan=full_scan,
+                        pipeline=pipeline,
+                        resume=resume,
+                    )
+                    if state is not None:
+                        scan_states.append(state)
+                    logger.info("✓ %s 列表页扫描完成", device_type)
+                except Exception as e:
+                    logger.error("✗ %s 壁纸下载失败: %s", device_type, e, exc_info=True)
+            
+            threads = []
+            for idx, device_type in enumerate(all_device_types, 1):
+                thread = threading.Thread(
+                    target=crawl_device,
+                    args=(idx, device_type),
+                    name=f"{device_type}设备线程",
+                )
+                thread.start()
+                threads.append(thread)
+            
+            # 等待所有设备的列表页扫描完成，再等待队列中剩余的图片下载完成
+            try:
+                for thread in threads:
+                    thread.join()
+            finally:
+                pipeline.close()
+            for state in scan_states:
+                state.commit()
+            logger.info("✓ 所有设备壁纸下载完成")
+        else:
+            # 单个设备类型下载
+            if device_name not in all_device_types:
+                logger.warning(f"未知的设备类型: {device_name}")
+                logger.info(f"支持的设备类型: {', '.join(all_device_types)}")
+                return
+            
+            logger.info(f"将下载到文件夹: {os.path.join(DOWNLOAD_DIR, safe_segment(device_name))}/")
+            
+            if pipeline is None:
+                crawl_by_device_type(
+                    category_id=category_id,
+                    **get_device_flags(device_name),
+                    title="",
+                    device_name=device_name,
+                    full_scan=full_scan,
+                    resume=resume,
+                )
+                return
+            try:
+                state = crawl_by_device_type(
+                    category_id=category_id,
+                    **get_device_flags(device_name),
+                    title="",
+                    device_name=device_name,
+                    full_scan=full_scan,
+                    pipeline=pipeline,
+                    resume=resume,
+                )
+            finally:
+                pipeline.close()
+            if state is not None:
+                state.commit()
+
+
+def retry_failed_downloads(device_types: List[str], category_id: Optional[int] = None) -> None:
+    """--retry_failed：重新下载各设备最近一次全量任务中失败的图片（不抓取列表页）"""
+    pipeline = DownloadPipeline(worker_count=THREAD_COUNT).start()
+    try:
+        for device_type in device_types:
+            job = CrawlJob.latest(safe_segment(device_type), category_id)
+            if job is None:
+                logger.info(f"设备 {device_type} 没有全量任务记录")
+                continue
+            failed_tasks = job.tasks_with_status("failed")
+            logger.info(f"设备 {device_type} 的任务 #{job.job_id} 中有 {len(failed_tasks)} 个失败的下载，重新下载")
+            for task in failed_tasks:
+                pipeline.submit(task, job.task_callback(task))
+    finally:
+        pipeline.close()
+
+
+# 磁盘文件名：primaryid_文件名_分辨率.png（与 build_wallpaper_path 一致）
+WALLPAPER_FILENAME_RE = re.compile(r"^(?P<primaryid>[^_]+)_(?P<name>.*)_(?P<px>\d+x\d+)\.png$")
+
+
+# 图片的文件头与结束标记：没有记录大小的文件按结束标记判断是否被截断
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TRAILER = b"IEND\xaeB`\x82"
+JPEG_SIGNATURE = b"\xff\xd8"
+JPEG_TRAILER = b"\xff\xd9"
+
+
+def image_file_truncated(path: str, size: int) -> bool:
+    """检查没有记录大小的图片是否被截断：PNG 应以 IEND 块结尾，JPEG 应以 FFD9 结尾
+
+    只读取文件头和最后几个字节；无法识别的格式或读取失败时不判断（返回 False）。
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(PNG_SIGNATURE))
+            f.seek(max(0, size - 16))
+            tail = f.read()
+    except OSError:
+        return False
+    if head.startswith(PNG_SIGNATURE):
+        return not tail.endswith(PNG_TRAILER)
+    if head.startswith(JPEG_SIGNATURE):
+        # 部分编码器会在 EOI 之后补零
+        return not tail.rstrip(b"\x00").endswith(JPEG_TRAILER)
+    return False
+
+
+def reconcile_download_task(primaryid: str, device: str, year: str, month: str, name: str, px: str) -> Optional[Dict]:
+    """为修复时删除的壁纸构造下载任务（download_wallpaper 的参数）；分辨率不在 SIZE_FORMAT_MAP 中时返回 None"""
+    size_nums = {normalize_px(size_text): size_num for size_num, size_text in SIZE_FORMAT_MAP.items()}
+    size_num = size_nums.get(px)
+    if size_num is None:
+        return None
+    return {
+        "url": IMG_DOWNLOAD_URL_TEMPLATE.format(primaryid=primaryid, size=size_num),
+        "name": name or "",
+        "px": px,
+        "page_num": 0,
+        "index": 0,
+        "device_folder": "" if device == "未知设备" else device,
+        "primaryid": primaryid,
+        "year": year or "",
+        "month": month or "",
+    }
+
+
+def scan_directory(path: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """扫描一个目录（不递归），返回 ([(文件路径, 字节数)], [子目录])"""
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+    return files, subdirs
+
+
+def scan_download_dir(root: str = DOWNLOAD_DIR, workers: int = RECONCILE_SCAN_WORKERS) -> List[Tuple[str, int]]:
+    """用线程池并行扫描下载目录（每个目录一个任务，发现的子目录继续提交），返回全部 (文件路径, 字节数)"""
+    if not os.path.isdir(root):
+        return []
+    files: List[Tuple[str, int]] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="扫描线程") as executor:
+        pending = {executor.submit(scan_directory, root)}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                found, subdirs = future.result()
+                files.extend(found)
+                pending.update(executor.submit(scan_directory, subdir) for subdir in subdirs)
+    return files
+
+
+def parse_wallpaper_file(path: str, size: int, prefix: str) -> Tuple:
+    """把扫描到的文件转换为临时表 fs_files 的一行
+
+    路径格式：设备类型/年/月/文件、设备类型/更早/文件 或 设备类型/文件（见 build_wallpaper_path）；
+    文件名不符合 primaryid_文件名_分辨率.png 时 primaryid 等字段为 None。
+    prefix 为下载目录加路径分隔符：扫描得到的路径都以它开头，直接切分（文件数很多时 os.path.relpath 是主要开销）。
+    """
+    parts = path[len(prefix):].split(os.sep)
+    match = WALLPAPER_FILENAME_RE.match(parts[-1])
+    if match is None or len(parts) < 2:
+        return (path, None, None, None, "", "", None, size)
+    year, month = "", ""
+    if len(parts) == 3 and parts[1] == "更早":
+        year = "更早"
+    elif len(parts) == 4:
+        year, month = parts[1], parts[2]
+    # 正则保证分辨率已是规范形式（如 4000x2250），与 normalize_px 的结果相同
+    return (path, match["primaryid"], match["px"], parts[0], year, month, match["name"], size)
+
+
+def reconcile_walls(fix: bool = False, db_path: str = DB_PATH, root: str = DOWNLOAD_DIR) -> Dict[str, int]:
+    """--reconcile：比对 walls/ 目录与数据库 wallpapers 表，报告（fix=True 时修复）不一致之处
+
+    扫描结果批量写入临时表 fs_files，用几条 JOIN 一次比对，不逐条查询：
+    - missing_file：有记录但文件不存在 —— 修复时删除记录，之后 --full_scan 会重新下载
+    - missing_row：文件名合法但没有记录 —— 修复时补录（sha256 为空，与 [FS-SKIP] 相同）
+    - size_mismatch：文件大小与记录不符，或 0 字节，或没有记录大小且图片缺少结束标记（下载被截断）
+                     —— 修复时删除文件和记录
+    - stale_path：记录的 rel_path 不存在，但同一 (primaryid, 分辨率, 设备) 的文件在别处 —— 修复时更新 rel_path
+    - duplicate：已有记录且记录的文件存在，同一壁纸的另一份文件 —— 修复时删除
+    - unknown：文件名无法识别的文件（不含 .part 临时文件）—— 只报告，不处理
+
+    修复时删除了记录（或截断文件）的壁纸写入 sync_retries 表，下次增量同步时重新下载。
+    返回各类问题的数量。
+    """
+    started = time.perf_counter()
+    init_db(db_path)
+    scanned = scan_download_dir(root)
+    partials = sum(1 for path, _ in scanned if path.endswith(PART_SUFFIX))
+    prefix = os.path.join(root, "")
+    rows = [parse_wallpaper_file(path, size, prefix) for path, size in scanned if not path.endswith(PART_SUFFIX)]
+    scan_seconds = time.perf_counter() - started
+
+    conn = db_get_connection(db_path)
+    try:
+        conn.execute(
+            """
+            CREATE TEMP TABLE fs_files (
+                rel_path  TEXT PRIMARY KEY,
+                primaryid TEXT,
+                px        TEXT,
+                device    TEXT,
+                year      TEXT,
+                month     TEXT,
+                name      TEXT,
+                size      INTEGER NOT NULL
+            )
+            """
+        )
+        conn.executemany("INSERT OR IGNORE INTO fs_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("CREATE INDEX temp.fs_files_key ON fs_files(primaryid, px, device)")
+
+        # 每条记录对应的文件：rel_path 对应的文件，不存在时取同一壁纸在别处的文件
+        record_rows = conn.execute(
+            """
+            SELECT w.id, w.rel_path, w.size, f.size,
+                   CASE WHEN f.rel_path IS NULL THEN
+                       (SELECT g.rel_path FROM fs_files g
+                         WHERE g.primaryid = w.primaryid AND g.px = w.px AND g.device = w.device
+                         ORDER BY g.rel_path LIMIT 1)
+                   END AS moved_to,
+                   w.primaryid, w.device, w.year, w.month, w.name, w.px
+            FROM wallpapers w LEFT JOIN fs_files f ON f.rel_path = w.rel_path
+            """
+        ).fetchall()
+        # 没有按 rel_path 对上记录的文件，以及同一壁纸的已有记录
+        file_rows = conn.execute(
+            """
+            SELECT f.rel_path, f.primaryid, f.px, f.device, f.year, f.month, f.name, f.size, k.id
+            FROM fs_files f
+            LEFT JOIN wallpapers w ON w.rel_path = f.rel_path
+            LEFT JOIN wallpapers k ON k.primaryid = f.primaryid AND k.px = f.px AND k.device = f.device
+            WHERE w.id IS NULL
+            """
+        ).fetchall()
+        conn.execute("DROP TABLE temp.fs_files")
+
+        file_sizes = {row[0]: row[7] for row in rows}
+        # 没有记录大小的文件（[FS-SKIP] 补录的记录、没有记录的文件）无法按大小比对，并行检查图片的结束标记
+        unsized = [
+            moved_to or rel_path
+            for _, rel_path, size, file_size, moved_to, *_ in record_rows
+            if size is None and (file_size or moved_to)
+        ]
+        unsized += [row[0] for row in file_rows if row[1] is not None and row[7] and row[8] is None]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=RECONCILE_SCAN_WORKERS, thread_name_prefix="检查线程") as executor:
+            checked = executor.map(image_file_truncated, unsized, [file_sizes[path] for path in unsized])
+            truncated = {path for path, is_truncated in zip(unsized, checked) if is_truncated}
+
+        issues: Dict[str, List[Tuple]] = {
+            name: [] for name in ("missing_file", "missing_row", "size_mismatch", "stale_path", "duplicate", "unknown")
+        }
+        claimed: Set[str] = set()
+        # 修复时删除的壁纸：(primaryid, 设备, 年, 月, 名称, 分辨率)，之后重新下载
+        removed: List[Tuple] = []
+        for row_id, rel_path, size, file_size, moved_to, *wallpaper in record_rows:
+            if file_size is None:
+                if moved_to is None:
+                    issues["missing_file"].append((row_id, rel_path))
+                    removed.append(tuple(wallpaper))
+                    continue
+                rel_path, file_size = moved_to, file_sizes[moved_to]
+                claimed.add(moved_to)
+            if file_size == 0 or (size is not None and size != file_size) or rel_path in truncated:
+                issues["size_mismatch"].append((row_id, rel_path, size, file_size))
+                removed.append(tuple(wallpaper))
+            elif rel_path in claimed:
+                issues["stale_path"].append((row_id, rel_path))
+        for rel_path, primaryid, px, device, year, month, name, size, recorded_id in file_rows:
+            if rel_path in claimed:
+                continue
+            if primaryid is None:
+                issues["unknown"].append((rel_path,))
+            elif size == 0 or rel_path in truncated:
+                issues["size_mismatch"].append((recorded_id, rel_path, None, size))
+                if recorded_id is None:
+                    removed.append((primaryid, device, year, month, name, px))
+            elif recorded_id is None:
+                issues["missing_row"].append((primaryid, device, year, month, name, px, rel_path, size))
+            else:
+                issues["duplicate"].append((rel_path,))
+
+        logger.info(
+            f"[RECONCILE] 扫描 {root}/：{len(rows)} 个文件（另有 {partials} 个 {PART_SUFFIX} 临时文件），"
+            f"数据库 {len(record_rows)} 条记录，扫描耗时 {scan_seconds:.2f} 秒"
+        )
+        for kind, items in issues.items():
+            if not items:
+                continue
+            logger.warning(f"[RECONCILE] {kind}: {len(items)} 项")
+            for item in items[:RECONCILE_REPORT_LIMIT]:
+                logger.info(f"[RECONCILE]   {kind}: {item}")
+            if len(items) > RECONCILE_REPORT_LIMIT:
+                logger.info(f"[RECONCILE]   ...（其余 {len(items) - RECONCILE_REPORT_LIMIT} 项省略）")
+
+        if fix:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # 0 字节且没有记录的文件只删除文件
+            deleted_ids = [(item[0],) for item in issues["missing_file"] + issues["size_mismatch"] if item[0] is not None]
+            for _, rel_path, _, _ in issues["size_mismatch"]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(rel_path)
+            for (rel_path,) in issues["duplicate"]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(rel_path)
+            with conn:
+                conn.executemany("DELETE FROM wallpapers WHERE id = ?", deleted_ids)
+                conn.executemany(
+                    "UPDATE wallpapers SET rel_path = ?, updated_at = ? WHERE id = ?",
+                    [(rel_path, now, row_id) for row_id, rel_path in issues["stale_path"]],
+                )
+                conn.executemany(
+                    UPSERT_WALLPAPER_SQL,
+                    [
+                        (primaryid, device, year, month, name, px, rel_path, now, now, None, size)
+                        for primaryid, device, year, month, name, px, rel_path, size in issues["missing_row"]
+                    ],
+                )
+            logger.info(
+                f"[RECONCILE] 已修复：删除 {len(deleted_ids)} 条记录、{len(issues['size_mismatch']) + len(issues['duplicate'])} 个文件，"
+                f"更新 {len(issues['stale_path'])} 条 rel_path，补录 {len(issues['missing_row'])} 条记录"
+            )
+            # 被删除的壁纸可能早于增量同步的高水位线：写入默认分类的重试列表，下次增量同步时重新下载
+            requeued: Dict[str, List[Dict]] = {}
+            for wallpaper in removed:
+                task = reconcile_download_task(*wallpaper)
+                if task is not None:
+                    requeued.setdefault(wallpaper[1], []).append(task)
+            for device, tasks in requeued.items():
+                db_update_sync_retries(device, DEFAULT_CATEGORY_ID, [], tasks, db_path)
+            requeued_count = sum(len(tasks) for tasks in requeued.values())
+            if requeued_count:
+                logger.info("[RECONCILE] %d 个壁纸已加入重试列表，下次增量同步时重新下载", requeued_count)
+            if removed:
+                logger.info("[RECONCILE] 重试列表只用于默认分类的增量同步；其他分类或无法识别分辨率的壁纸请用 --full_scan 重新下载")
+    finally:
+        conn.close()
+
+    logger.info(f"[RECONCILE] 完成，耗时 {time.perf_counter() - started:.2f} 秒")
+    return {kind: len(items) for kind, items in issues.items()}
+
+
+class JobQueue:
+    """分布式模式（--coordinator / --worker）的共享任务队列
+
+    任务队列是一个独立的 SQLite 文件，可以放在多台机器都能访问的共享卷上：
+    - 协调进程抓取列表页，把下载任务（download_wallpaper 的参数）写入 queue_jobs 表
+    - 任意数量的工作进程用租约领取任务：领取时记录 lease_owner 和 lease_expires，
+      下载结束后回报 done / failed；工作进程崩溃或卡住时租约到期，任务重新分配给其他工作进程
+    - done 的任务附带工作进程写入的壁纸记录（result），协调进程下次运行时导入自己的 walls.db
+    - 下载失败的任务重新排队，最多尝试 QUEUE_MAX_ATTEMPTS 次（租约到期也算一次尝试）
+
+    领取在 BEGIN IMMEDIATE 事务中完成，同一任务同一时刻只租给一个工作进程。
+    不使用 WAL 模式（WAL 依赖共享内存，不能跨机器使用）；租约到期时间使用各机器的本地时钟，
+    多机运行时需要同步时钟（NTP）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def connect(self) -> sqlite3.Connection:
+        # 事务由 BEGIN IMMEDIATE 显式控制
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def init(self) -> "JobQueue":
+        conn = self.connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS queue_jobs (
+                    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device        TEXT NOT NULL,
+                    primaryid     TEXT NOT NULL,
+                    px            TEXT NOT NULL,
+                    task          TEXT NOT NULL,    -- download_wallpaper 的参数（JSON）
+                    status        TEXT NOT NULL,    -- pending / leased / done / failed
+                    lease_owner   TEXT,             -- 主机名:进程号:线程号
+                    lease_expires REAL,             -- 租约到期时间（Unix 时间戳）
+                    attempts      INTEGER NOT NULL DEFAULT 0,
+                    updated_at    TEXT NOT NULL,
+                    result        TEXT,             -- 下载成功时的壁纸记录（JSON：rel_path / sha256 / size）
+                    imported      INTEGER NOT NULL DEFAULT 0,   -- result 是否已导入协调进程的 walls.db
+                    UNIQUE(device, primaryid, px)
+                )
+                """
+            )
+            # 旧版本创建的任务队列没有 result / imported 列，补上
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(queue_jobs)")}
+            if "result" not in columns:
+                conn.execute("ALTER TABLE queue_jobs ADD COLUMN result TEXT")
+            if "imported" not in columns:
+                conn.execute("ALTER TABLE queue_jobs ADD COLUMN imported INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS queue_jobs_status ON queue_jobs(status, lease_expires)")
+            # coordinator: running / done（done 之后工作进程在队列清空时退出）
+            conn.execute("CREATE TABLE IF NOT EXISTS queue_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        finally:
+            conn.close()
+        return self
+
+    def set_meta(self, key: str, value: str) -> None:
+        conn = self.connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO queue_meta (key, value) VALUES (?, ?)", (key, value))
+        finally:
+            conn.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT value FROM queue_meta WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def enqueue(self, tasks: List[Dict]) -> None:
+        """写入一批下载任务：同一 (设备, primaryid, 分辨率) 只入队一次，之前失败的任务重新排队"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [
+            (
+                task["device_folder"] or "未知设备",
+                task["primaryid"],
+                normalize_px(task["px"]),
+                json.dumps(task, ensure_ascii=False),
+                now,
+            )
+            for task in tasks
+        ]
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    """
+                    INSERT INTO queue_jobs (device, primaryid, px, task, status, updated_at)
+                    VALUES (?, ?, ?, ?, 'pending', ?)
+                    ON CONFLICT(device, primaryid, px) DO UPDATE SET
+                        task = excluded.task,
+                        status = 'pending',
+                        attempts = 0,
+                        updated_at = excluded.updated_at
+                    WHERE queue_jobs.status = 'failed'
+                    """,
+                    rows,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def lease(self, owner: str, lease_seconds: float = QUEUE_LEASE_SECONDS) -> Optional[Tuple[int, Dict]]:
+        """领取一个待下载（或租约已过期）的任务，返回 (任务 id, 任务参数)；没有可领取的任务时返回 None"""
+        now = time.time()
+        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租约过期且已用完尝试次数的任务不再分配
+                conn.execute(
+                    """
+                    UPDATE queue_jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                    WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+                    """,
+                    (updated_at, now, QUEUE_MAX_ATTEMPTS),
+                )
+                row = conn.execute(
+                    """
+                    SELECT id, task, status, lease_owner FROM queue_jobs
+                    WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                    ORDER BY id LIMIT 1
+                    """,
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        """
+                        UPDATE queue_jobs
+                        SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                        WHERE id = ?
+                        """,
+                        (owner, now + lease_seconds, updated_at, row[0]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job_id, task, status, previous_owner = row
+        if status == "leased":
+            logger.warning("任务 #%d 的租约（%s）已过期，重新分配给 %s", job_id, previous_owner, owner)
+        return job_id, json.loads(task)
+
+    def complete(self, job_id: int, owner: str, ok: bool, result: Optional[Dict] = None) -> bool:
+        """回报任务结果：成功记为 done（附带壁纸记录 result）；失败时重新排队，用完尝试次数后记为 failed
+
+        只有仍持有租约的工作进程的结果才会记录：租约已过期并分配给其他工作进程（或已由其完成）时，
+        本次结果（成功或失败）都不记录，以新租约的结果为准，返回 False。
+        每个 owner（主机名:进程号:线程号）同一时刻最多持有一个租约，lease_owner 即可区分新旧租约。
+        """
+        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.connect()
+        try:
+            if ok:
+                cur = conn.execute(
+                    """
+                    UPDATE queue_jobs
+                    SET status = 'done', lease_owner = NULL, lease_expires = NULL, updated_at = ?, result = ?, imported = 0
+                    WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                    """,
+                    (updated_at, json.dumps(result, ensure_ascii=False) if result is not None else None, job_id, owner),
+                )
+                if cur.rowcount == 0:
+                    logger.warning("任务 #%d 的租约已不属于 %s，本次成功结果不记录", job_id, owner)
+                return cur.rowcount > 0
+            cur = conn.execute(
+                """
+                UPDATE queue_jobs
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (QUEUE_MAX_ATTEMPTS, updated_at, job_id, owner),
+            )
+            if cur.rowcount == 0:
+                logger.warning("任务 #%d 的租约已不属于 %s，本次失败结果不记录", job_id, owner)
+            return cur.rowcount > 0
+        finally:
+            conn.close()
+
+    def unimported_results(self) -> List[Tuple[int, Dict, Dict]]:
+        """工作进程已完成、尚未导入协调进程 walls.db 的任务：[(任务 id, 任务参数, 壁纸记录)]"""
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, task, result FROM queue_jobs WHERE status = 'done' AND imported = 0 AND result IS NOT NULL"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [(job_id, json.loads(task), json.loads(result)) for job_id, task, result in rows]
+
+    def mark_imported(self, job_ids: List[int]) -> None:
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("UPDATE queue_jobs SET imported = 1 WHERE id = ?", [(job_id,) for job_id in job_ids])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        conn = self.connect()
+        try:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM queue_jobs GROUP BY status").fetchall())
+        finally:
+            conn.close()
+
+    def is_drained(self) -> bool:
+        """协调进程已结束，且没有待下载或下载中的任务"""
+        if self.get_meta("coordinator") != "done":
+            return False
+        counts = self.counts()
+        return not counts.get("pending") and not counts.get("leased")
+
+
+class JobQueuePublisher:
+    """与 DownloadPipeline 接口相同（start / submit / close），但只把下载任务写入共享任务队列
+
+    --coordinator 用它代替 DownloadPipeline：列表页的抓取、解析、高水位线和断点记录与单机模式完全一致，
+    下载交给工作进程。任务按 DB_BATCH_SIZE 条或 DB_FLUSH_INTERVAL 秒批量入队；
+    入队即视为本进程内已完成（on_done(True)），下载结果记录在任务队列中。
+    """
+
+    def __init__(self, job_queue: JobQueue, batch_size: int = DB_BATCH_SIZE, flush_interval: float = DB_FLUSH_INTERVAL):
+        self.job_queue = job_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueued = 0
+        self._pending: List[Tuple[Dict, Optional[Callable[[bool], None]]]] = []
+        self._deadline = 0.0
+        self._lock = threading.Lock()
+
+    def start(self) -> "JobQueuePublisher":
+        return self
+
+    def submit(self, task: Dict, on_done: Optional[Callable[[bool], None]] = None) -> None:
+        with self._lock:
+            if not self._pending:
+                self._deadline = time.monotonic() + self.flush_interval
+            self._pending.append((task, on_done))
+            if len(self._pending) < self.batch_size and time.monotonic() < self._deadline:
+                return
+            batch, self._pending = self._pending, []
+        self._publish(batch)
+
+    def close(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        self._publish(batch)
+
+    def _publish(self, batch: List[Tuple[Dict, Optional[Callable[[bool], None]]]]) -> None:
+        if not batch:
+            return
+        self.job_queue.enqueue([task for task, _ in batch])
+        with self._lock:
+            self.enqueued += len(batch)
+        for _, on_done in batch:
+            if on_done is not None:
+                on_done(True)
+
+
+def run_coordinator(
+    queue_path: str,
+    category_id: Optional[int] = None,
+    device_name: str = "全部",
+    full_scan: bool = False,
+    resume: bool = False,
+) -> None:
+    """--coordinator：抓取列表页，把下载任务写入共享任务队列（本进程不下载图片）
+
+    协调进程正常结束后才标记 coordinator=done；中途失败时工作进程会继续等待，
+    重新运行协调进程（可加 --resume）即可接着入队。
+    开始抓取前先导入工作进程回报的下载记录，增量模式才能在已下载的壁纸处停止并推进高水位线。
+    """
+    global DB_WAL
+    DB_WAL = False
+    job_queue = JobQueue(queue_path).init()
+    import_queue_results(job_queue)
+    job_queue.set_meta("coordinator", "running")
+    logger.info(f"协调进程：下载任务写入 {pathlib.Path(queue_path).resolve()}")
+    publisher = JobQueuePublisher(job_queue)
+    crawl_all(
+        category_id=category_id,
+        device_name=device_name,
+        full_scan=full_scan,
+        resume=resume,
+        pipeline=publisher,
+    )
+    job_queue.set_meta("coordinator", "done")
+    logger.info(f"协调进程完成：本次入队 {publisher.enqueued} 个下载任务，队列状态: {job_queue.counts()}")
+
+
+def import_queue_results(job_queue: JobQueue, db_path: str = DB_PATH) -> int:
+    """把工作进程回报的下载记录写入协调进程的 walls.db，返回导入的条数
+
+    工作进程把图片和记录写入各自工作目录中的 walls.db；协调进程的去重和高水位线只看本地的 walls.db，
+    不导入时增量模式永远遇不到已下载的壁纸。
+    """
+    init_db(db_path)
+    results = job_queue.unimported_results()
+    if not results:
+        return 0
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [
+        (
+            task["primaryid"],
+            task["device_folder"] or "未知设备",
+            task.get("year", ""),
+            task.get("month", ""),
+            task["name"],
+            normalize_px(task["px"]),
+            result["rel_path"],
+            now,
+            now,
+            result.get("sha256"),
+            result.get("size"),
+        )
+        for _, task, result in results
+    ]
+    conn = db_get_connection(db_path)
+    try:
+        with conn:
+            conn.executemany(UPSERT_WALLPAPER_SQL, rows)
+    finally:
+        conn.close()
+    job_queue.mark_imported([job_id for job_id, _, _ in results])
+    logger.info("从任务队列导入 %d 条工作进程的下载记录", len(rows))
+    return len(rows)
+
+
+def queue_download_result(task: Dict) -> Dict:
+    """下载成功（或已跳过）的任务在本进程 walls.db 中的记录，随任务结果回报给协调进程"""
+    px_norm = normalize_px(task["px"])
+    _, _, rel_path = build_wallpaper_path(
+        task["device_folder"], task["primaryid"], task["name"], px_norm,
+        task.get("year", ""), task.get("month", ""), task["page_num"], task["index"],
+    )
+    found = content_store.get(task["primaryid"], px_norm)
+    sha256, size = (found[1], found[2]) if found is not None else (None, None)
+    return {"rel_path": rel_path, "sha256": sha256, "size": size}
+
+
+def run_worker(
+    queue_path: str,
+    worker_count: int = THREAD_COUNT,
+    lease_seconds: float = QUEUE_LEASE_SECONDS,
+) -> None:
+    """--worker：从共享任务队列领取下载任务，直到协调进程结束且队列清空
+
+    每个进程启动 worker_count 个下载线程，各自领取、下载、回报；图片和 walls.db 写入本进程的工作目录
+    （多台机器共用同一份图片时，在共享卷上的同一目录中运行即可，walls.db 不使用 WAL 模式）。
+    成功的任务连同壁纸记录一起回报，协调进程下次运行时导入。
+    """
+    global DB_WAL
+    DB_WAL = False
+    job_queue = JobQueue(queue_path).init()
+    process_name = f"{socket.gethostname()}:{os.getpid()}"
+    results = {"done": 0, "failed": 0}
+    results_lock = threading.Lock()
+    logger.info(f"工作进程 {process_name}：从 {pathlib.Path(queue_path).resolve()} 领取任务（{worker_count} 个下载线程，租约 {lease_seconds} 秒）")
+
+    def queue_worker(worker_id: int) -> None:
+        owner = f"{process_name}:{worker_id}"
+        http_sessions.warm()
+        thread_session = http_sessions.get()
+
+        while True:
+            try:
+                leased = job_queue.lease(owner, lease_seconds)
+                if leased is None:
+                    if job_queue.is_drained():
+                        break
+                    time.sleep(QUEUE_POLL_INTERVAL * random.uniform(0.5, 1.5))
+                    continue
+            except sqlite3.Error as e:
+                # 其他进程长时间持有写锁或共享卷暂时不可用，稍后重试
+                logger.warning("访问任务队列失败: %s", e)
+                time.sleep(QUEUE_POLL_INTERVAL)
+                continue
+            job_id, task = leased
+            result = None
+            try:
+                ok = download_wallpaper(**task, session_obj=thread_session)
+                if ok:
+                    result = queue_download_result(task)
+            except Exception as e:
+                ok = False
+                logger.error("下载任务异常 %s: %s", task.get("primaryid"), e, exc_info=True)
+            try:
+                job_queue.complete(job_id, owner, ok, result)
+            except sqlite3.Error as e:
+                # 结果未记录时租约到期后任务会重新分配（图片走 [DB-SKIP] / [FS-SKIP]，不会重复下载）
+                logger.warning("回报任务 #%d 结果失败: %s", job_id, e)
+            with results_lock:
+                results["done" if ok else "failed"] += 1
+
+    with db_session():
+        threads = []
+        for worker_id in range(1, worker_count + 1):
+            thread = threading.Thread(target=queue_worker, args=(worker_id,), name=f"队列下载线程{worker_id}")
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    logger.info(
+        f"工作进程 {process_name} 退出：本进程成功 {results['done']} 个，失败 {results['failed']} 个；"
+        f"队列状态: {job_queue.counts()}"
+    )
+
+
+# ============================================================
+# 异步引擎（--engine async）
+#
+# 与线程版本（fetch / get_wallpapers_in_page / download_wallpaper）行为一致：
+# 相同的请求头、随机延迟、落盘路径以及数据库/文件系统去重规则；
+# 区别在于所有请求都在同一个事件循环中执行，在途请求数由信号量限制，
+# 不再需要为了提高并发而增加线程。
+# ============================================================
+
+
+async def async_fetch(
+    client: "aiohttp.ClientSession",
+    limit: asyncio.Semaphore,
+    url: str,
+    referer: Optional[str] = None,
+    is_ajax: bool = False,
+) -> str:
+    """异步请求页面并返回 HTML 文本（对应同步版本的 fetch）"""
+    headers = get_random_headers(referer=referer, is_ajax=is_ajax)
+    
+    async with limit, rate_limiters.for_url(url).request_async() as slot:
+        logger.info("[GET] %s", url, extra={"url": url})
+        async with client.get(url, headers=headers, timeout=aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)) as resp:
+            slot.mark_response(resp.status)
+            resp.raise_for_status()
+            text = await resp.text()
+            return unwrap_ajax_html(text, resp.headers.get("Content-Type", ""), is_ajax)
+
+
+async def async_fetch_listing(
+    client: "aiohttp.ClientSession",
+    limit: asyncio.Semaphore,
+    url: str,
+    device_type: str = "电脑",
+) -> Tuple[str, List[Dict]]:
+    """异步请求一页列表并解析，返回 (html, wallpapers)（对应同步版本的 fetch_listing，共用列表页缓存）"""
+    entry = await asyncio.to_thread(listing_cache.load, url)
+    headers = get_random_headers(referer=ALL_URL, is_ajax=True)
+    headers.update(listing_cache.conditional_headers(entry))
     
-    logger.info(f"[DOWN] {filename} <- {url}")
-    headers = get_random_headers(referer=ALL_URL, is_ajax=False)
-    # 下载图片时添加额外的请求头
-    headers.update({
-        "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
-        "Sec-Fetch-Dest": "image",
-        "Sec-Fetch-Mode": "no-cors",
-        "Sec-Fetch-Site": "cross-site",
-    })
+    started = time.perf_counter()
+    async with limit, rate_limiters.for_url(url).request_async() as slot:
+        logger.info("[GET] %s", url, extra={"url": url})
+        async with client.get(url, headers=headers, timeout=aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)) as resp:
+            slot.mark_response(resp.status)
+            metrics.observe("gugong_fetch_seconds", time.perf_counter() - started)
+            metrics.inc("gugong_pages_fetched_total", status=str(resp.status))
+            if resp.status == 304 and entry:
+                logger.info("[304] 列表页未变化，使用缓存: %s", url, extra={"url": url, "device": device_type})
+                return await asyncio.to_thread(listing_cache.cached_page, entry, device_type)
+            resp.raise_for_status()
+            text = await resp.text()
+            response_headers = resp.headers
     
-    # 添加随机延迟
-    time.sleep(random.uniform(0.3, 0.8))
+    html = unwrap_ajax_html(text, response_headers.get("Content-Type", ""), True)
+    wallpapers = await asyncio.to_thread(parse_listing_page, html, device_type)
+    await asyncio.to_thread(listing_cache.store, url, response_headers, html, device_type, wallpapers)
+    return html, wallpapers
+
+
+async def async_download_wallpaper(
+    client: "aiohttp.ClientSession",
+    limit: asyncio.Semaphore,
+    url: str,
+    name: str,
+    px: str,
+    page_num: int,
+    index: int,
+    device_folder: str,
+    primaryid: str,
+    year: str = "",
+    month: str = "",
+):
+    """异步下载单张壁纸（对应同步版本的 download_wallpaper），返回是否成功（跳过也算成功）"""
+    device = device_folder or "未知设备"
+    px_norm = normalize_px(px)
+
+    filename, filepath, rel_path = build_wallpaper_path(
+        device_folder, primaryid, name, px_norm, year, month, page_num, index
+    )
+
+    # 内存索引命中时直接记录 [DB-SKIP]；其余情况可能需要检查文件并写库，放到线程池中执行
+    if wallpaper_index.contains(primaryid, px_norm, device):
+        skip_existing_wallpaper(primaryid, name, px_norm, device, year, month, filepath, rel_path)
+        return True
+    skipped = await asyncio.to_thread(
+        skip_existing_wallpaper, primaryid, name, px_norm, device, year, month, filepath, rel_path
+    )
+    if skipped:
+        return True
     
-    # 使用传入的 session 或全局 session
-    sess = session_obj if session_obj else session
+    headers = get_image_headers()
+    log_fields = {"primaryid": primaryid, "device": device, "px": px_norm}
+    started = time.perf_counter()
     
     try:
-        with sess.get(url, headers=headers, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            with open(filepath, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-
-        # 下载成功后，写入数据库
-        db_upsert_wallpaper(
-            primaryid=primaryid,
-            device=device,
-            year=year,
-            month=month,
-            name=name,
-            px=px_norm,
-            rel_path=rel_path,
-        )
+        async with content_store.claim_async(primaryid, px_norm):
+            reused = await asyncio.to_thread(reuse_downloaded_content, primaryid, px_norm, filepath)
+            if reused is not None:
+                size, sha256 = reused
+            else:
+                logger.info("[DOWN] %s <- %s", filename, url, extra=dict(log_fields, url=url))
+                transfer_started = time.perf_counter()
+                size, sha256 = await async_download_to_file(client, limit, url, filepath, headers)
+                metrics.observe("gugong_transfer_seconds", time.perf_counter() - transfer_started)
+                metrics.inc("gugong_downloads_total", result="ok")
+                metrics.inc("gugong_download_bytes_total", size)
+
+            # 下载成功（且通过完整性校验）后，写入数据库（交给数据库写线程，不阻塞事件循环）
+            db_upsert_wallpaper(
+                primaryid=primaryid,
+                device=device,
+                year=year,
+                month=month,
+                name=name,
+                px=px_norm,
+                rel_path=rel_path,
+                sha256=sha256,
+                size=size,
+            )
 
-        logger.info(f"[OK] {filename}")
+        logger.info(
+            "[OK] %s", filename,
+            extra=dict(log_fields, bytes=size, duration=round(time.perf_counter() - started, 3)),
+        )
+        return True
     except Exception as e:
-        logger.error(f"下载失败 {filename}: {e}", exc_info=True)
+        metrics.inc("gugong_downloads_total", result="failed")
+        logger.error(
+            "下载失败 %s: %s", filename, e, exc_info=True,
+            extra=dict(log_fields, url=url, duration=round(time.perf_counter() - started, 3)),
+        )
+        return False
 
 
-def get_wallpapers_in_page(
+async def async_download_to_file(
+    client: "aiohttp.ClientSession",
+    limit: asyncio.Semaphore,
+    url: str,
+    filepath: str,
+    headers: Dict[str, str],
+) -> Tuple[int, str]:
+    """异步下载图片到 filepath.part，完整下载并通过校验后才重命名（对应同步版本的 download_to_file）
+
+    打开、写入（每 ASYNC_WRITE_BUFFER_BYTES 字节一次，连同 SHA-256 计算）、校验和重命名都在线程池中执行，
+    事件循环只负责接收数据。
+    """
+    part_path = filepath + PART_SUFFIX
+    for attempt in range(DOWNLOAD_MAX_RETRIES + 1):
+        offset = await asyncio.to_thread(part_file_size, part_path)
+        request_headers = dict(headers)
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+        try:
+            async with limit, rate_limiters.for_url(url).request_async() as slot:
+                async with client.get(url, headers=request_headers, timeout=aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_DOWNLOAD_READ_TIMEOUT)) as r:
+                    slot.mark_response(r.status)
+                    if r.status == 416:
+                        await asyncio.to_thread(remove_part_file, part_path)
+                    r.raise_for_status()
+                    expected_size = expected_total_size(r.status, r.headers)
+                    verifier = StreamVerifier()
+                    f = await asyncio.to_thread(open_part_file, part_path, offset, r.status, r.headers.get("Content-Range", ""))
+                    try:
+                        if f.mode == "ab":
+                            await asyncio.to_thread(verifier.resume, part_path)
+                        buffer = bytearray()
+                        async for chunk in r.content.iter_chunked(8192):
+                            buffer += chunk
+                            if len(buffer) >= ASYNC_WRITE_BUFFER_BYTES:
+                                await asyncio.to_thread(write_part_block, f, verifier, bytes(buffer))
+                                buffer.clear()
+                        if buffer:
+                            await asyncio.to_thread(write_part_block, f, verifier, bytes(buffer))
+                    finally:
+                        await asyncio.to_thread(f.close)
+            return await asyncio.to_thread(finish_part_file, part_path, filepath, verifier, expected_size)
+        except Exception as e:
+            if attempt >= DOWNLOAD_MAX_RETRIES or not is_retryable_download_error(e):
+                raise
+            delay = download_retry_delay(attempt)
+            metrics.inc("gugong_download_retries_total")
+            downloaded = part_file_size(part_path)
+            logger.warning(
+                "[RETRY] %s 下载中断（已下载 %d 字节），%.1f 秒后第 %d 次重试: %s",
+                os.path.basename(filepath), downloaded, delay, attempt + 1, e,
+                extra={"url": url, "bytes": downloaded},
+            )
+            await asyncio.sleep(delay)
+
+
+class AsyncDownloadQueue:
+    """异步引擎共享的有界下载队列（对应线程版本列表页线程与下载线程之间的 ITEM_QUEUE_SIZE 队列）
+
+    页面协程把解析出的下载任务放入队列后就继续处理下一页，不等待本页的图片下载完；
+    concurrency 个下载协程从队列中取任务，一张慢图片只占住一个下载协程，不会拖住整页和后面的页。
+    队列满时 put 等待（背压），列表页不会无限超前于下载。所有设备共用同一个队列。
+    """
+
+    def __init__(self, client: "aiohttp.ClientSession", limit: asyncio.Semaphore, workers: int, maxsize: int = ITEM_QUEUE_SIZE):
+        self.client = client
+        self.limit = limit
+        self.workers = workers
+        # [(任务参数, 结果回调, Future), ...]
+        self._queue: "asyncio.Queue" = asyncio.Queue(maxsize=max(maxsize, workers))
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> "AsyncDownloadQueue":
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def put(self, task: Dict, on_done: Optional[Callable[[bool], None]] = None) -> "asyncio.Future":
+        """放入一个下载任务（队列满时等待），返回下载结束时完成的 Future，结果为是否成功"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((task, on_done, future))
+        return future
+
+    async def join(self) -> None:
+        """等待队列中的任务全部下载结束"""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """结束下载协程（正常结束时先调用 join）"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self) -> None:
+        while True:
+            task, on_done, future = await self._queue.get()
+            try:
+                ok = await async_download_wallpaper(self.client, self.limit, **task)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                ok = False
+                logger.error("下载任务异常 %s: %s", task.get("primaryid"), e, exc_info=True)
+            finally:
+                self._queue.task_done()
+            if on_done is not None:
+                on_done(ok)
+            future.set_result(ok)
+
+
+async def async_get_wallpapers_in_page(
+    client: "aiohttp.ClientSession",
+    limit: asyncio.Semaphore,
+    downloads: AsyncDownloadQueue,
     base_url: str,
     page_num: int,
     device_folder: str,
     device_type: str = "电脑",
-    session_obj: Optional[requests.Session] = None,
-    thread_id: int = 0,
     device_label: Optional[str] = None,
-) -> tuple[bool, bool]:
-    """获取并下载每页的壁纸
+    wallpapers: Optional[List[Dict]] = None,
+    sync: Optional[IncrementalSync] = None,
+    layout: Optional["ListingLayout"] = None,
+    pending: Optional[List["asyncio.Future"]] = None,
+) -> Tuple[bool, bool]:
+    """异步获取每页的壁纸并放入下载队列（对应同步版本的 get_wallpapers_in_page）
 
-    返回:
-        (has_data, has_new)
-        - has_data: 该页是否有壁纸数据
-        - has_new:  该页是否至少包含一条数据库中尚不存在的壁纸
+    本页的下载任务放入共享的下载队列后即返回，不等待下载完成；各任务的 Future 追加到 pending，
+    调用方在需要时（更新高水位线之前）统一等待。返回值含义与同步版本一致：(has_data, has_new)
+    传入 wallpapers 时（已解析的第一页）不再请求该页；传入 sync 时只下载第一张已知壁纸之前的新壁纸；
+    传入 layout 时检测每页条数是否被截断。
     """
-    logger.info(f"=====>>> 当前页: {page_num}")
+    logger.info("=====>>> 当前页: %d", page_num, extra={"page": page_num, "device": device_type})
     
-    # 添加页码参数
     url = f"{base_url}&p={page_num}"
-    logger.info(f"=====>>> 当前页URL: {url}")
-    html = fetch(url, referer=ALL_URL, is_ajax=True, session_obj=session_obj)
-    
-    # 检查是否返回空结果
-    if len(html) < 200 and ("refresh" in html.lower() or not html.strip()):
-        logger.info(f"第 {page_num} 页没有数据，停止爬取")
-        return False, False
-    
-    soup = BeautifulSoup(html, "html.parser")
-    
-    wallpapers = parse_wallpaper_items(soup, device_type=device_type)
-    logger.info(f"本页找到 {len(wallpapers)} 张壁纸")
+    logger.info("=====>>> 当前页URL: %s", url, extra={"page": page_num, "url": url})
+    if wallpapers is None:
+        _, wallpapers = await async_fetch_listing(client, limit, url, device_type)
+    logger.info("本页找到 %d 张壁纸", len(wallpapers), extra={"page": page_num, "device": device_type})
     
     if len(wallpapers) == 0:
-        logger.info(f"第 {page_num} 页没有壁纸，停止爬取")
+        logger.info("第 %d 页没有壁纸，停止爬取", page_num)
         return False, False
+    if layout is not None:
+        await asyncio.to_thread(layout.check, page_num, listing_item_count(wallpapers))
 
-    # 判断该页是否存在“数据库中尚不存在”的新壁纸
-    label = device_label or (device_folder or "未知设备")
-    has_new = False
-    for wp in wallpapers:
-        if not db_has_wallpaper(
-            primaryid=wp["primaryid"],
-            px=wp["px"],
-            device=label,
-        ):
-            has_new = True
-            break
+    if sync is not None:
+        items = sync.take(wallpapers)
+        has_new = not sync.stopped
+    else:
+        # 判断该页是否存在“数据库中尚不存在”的新壁纸
+        label = device_label or (device_folder or "未知设备")
+        has_new = page_has_new_wallpapers(wallpapers, label)
+        items = list(enumerate(wallpapers))
     
-    for index, wp in enumerate(wallpapers):
-        download_wallpaper(
-            url=wp["download_url"],
-            name=wp["name"],
-            px=wp["px"],
-            page_num=page_num,
-            index=index,
-            device_folder=device_folder,
-            primaryid=wp["primaryid"],
-            year=wp.get("year", ""),
-            month=wp.get("month", ""),
-            session_obj=session_obj,
-        )
-        time.sleep(REQUEST_INTERVAL * 0.5)  # 下载间隔稍短
+    tasks = [task for index, wp in items for task in build_download_tasks(wp, page_num, index, device_folder)]
+    futures = await async_download_tasks(downloads, tasks, sync)
+    if pending is not None:
+        pending.extend(futures)
     
     return True, has_new
 
 
-def download_pages_range(
-    base_url: str,
-    start_page: int,
-    end_page: int,
-    device_folder: str,
-    device_type: str,
-    thread_id: int
-):
-    """线程工作函数：下载指定范围的页面"""
-    # 设置线程名称
-    threading.current_thread().name = f"线程{thread_id}"
-    
-    # 每个线程创建独立的 Session
-    thread_session = requests.Session()
-    
-    # 先访问主页面建立会话
-    try:
-        fetch(ALL_URL, session_obj=thread_session)
-        time.sleep(0.5)
-    except Exception as e:
-        logger.warning(f"访问主页面失败: {e}")
-    
-    logger.info(f"开始下载页面范围: {start_page} - {end_page}")
-    
-    for page_num in range(start_page, end_page + 1):
-        has_data, _ = get_wallpapers_in_page(
-            base_url,
-            page_num,
-            device_folder,
-            device_type,
-            session_obj=thread_session,
-            thread_id=thread_id,
-            device_label=device_type or device_folder,
-        )
-        if not has_data:
-            logger.info(f"第 {page_num} 页没有数据，停止爬取")
-            break
-        time.sleep(REQUEST_INTERVAL)
-    
-    logger.info(f"完成页面范围: {start_page} - {end_page}")
+async def async_download_tasks(
+    downloads: AsyncDownloadQueue,
+    tasks: List[Dict],
+    sync: Optional[IncrementalSync] = None,
+) -> List["asyncio.Future"]:
+    """把一组任务放入下载队列，返回各任务的 Future；传入 sync 时记录每个任务的结果（失败的任务下次增量同步时重试）"""
+    return [
+        await downloads.put(task, sync.task_callback(task) if sync is not None else None)
+        for task in tasks
+    ]
 
 
-def crawl_by_device_type(
+async def async_crawl_by_device_type(
+    client: "aiohttp.ClientSession",
+    limit: asyncio.Semaphore,
+    downloads: AsyncDownloadQueue,
     category_id: Optional[int] = None,
-    is_pc: int = 0,
-    is_wap: int = 0,
-    is_calendar: int = 0,
-    is_four_k: int = 0,
-    title: str = "",
-    device_name: str = "全部",
+    device_name: str = "电脑",
     full_scan: bool = False,
 ):
-    """按设备类型爬取壁纸
+    """异步按设备类型爬取壁纸（对应同步版本的 crawl_by_device_type）
 
-    参数:
-    - full_scan: 如果为 True，则强制全量扫描所有页；
-                 如果为 False，则先只看第一页：
-                     若第一页所有壁纸都已在数据库中，则认为没有新内容，直接结束该设备类型的任务。
+    - 增量模式：按列表顺序扫描，遇到第一张已下载的壁纸（高水位线）即停止；本设备的下载全部结束后才更新高水位线
+    - 全量模式：与线程版本相同，PAGE_THREAD_COUNT 个页面协程从共享的页码前沿领取页码，
+               一旦某页没有数据，页码更大的页不再请求
+    两种模式的图片都交给共享的下载队列（AsyncDownloadQueue），在途请求数由信号量限制；返回前等待本设备的所有下载结束。
     """
-    # 先访问主页面建立会话
-    logger.info("访问主页面建立会话...")
+    # pagesize 探测只在首次运行时发出少量请求，沿用同步实现
+    page_size = await asyncio.to_thread(listing_page_sizes.get, category_id)
+    base_url = build_base_url(category_id=category_id, title="", page_size=page_size, **get_device_flags(device_name))
+    device_folder = safe_segment(device_name)
+    device_label = device_folder or "未知设备"
+
+    # 第一页的解析结果同时交给页码循环，不再重复请求第一页
+    first_page = None
     try:
-        fetch(ALL_URL)
-        time.sleep(0.5)
+        html, first_page = await async_fetch_listing(client, limit, f"{base_url}&p=1", device_name)
+        total_pages = await asyncio.to_thread(parse_total_pages, html)
     except Exception as e:
-        logger.warning(f"访问主页面失败: {e}")
-    
-    # 使用默认 category_id
-    if category_id is None:
-        category_id = DEFAULT_CATEGORY_ID
-    
-    # 构建基础参数（不包含页码）
-    base_params = {
-        "category_id": category_id,
-        "pagesize": 24,
-        "title": title,
-        "is_pc": is_pc,
-        "is_wap": is_wap,
-        "is_calendar": is_calendar,
-        "is_four_k": is_four_k,
-    }
-    
-    # 构建基础URL（时间戳格式：0.xxx，作为第一个参数）
-    timestamp = time.time() % 1  # 只取小数部分，格式为 0.xxx
-    base_url = f"{FILTER_URL_TEMPLATE}?{timestamp}&{urlencode(base_params)}"
+        logger.error("获取总页数失败: %s", e, exc_info=True)
+        total_pages = 0
 
-    # 设备文件夹名 / 设备标识（用于数据库 device 字段）
-    device_folder = safe_segment(device_name) if device_name != "全部" else ""
-    device_label = device_folder or "未知设备"
-
-    # 获取总页数
-    total_pages = get_total_pages(base_url)
-    
     if total_pages == 0:
         logger.warning("未找到任何页面，请检查参数是否正确")
         return
+    layout = ListingLayout(category_id, page_size, total_pages)
 
     if not full_scan:
-        # 增量模式：单线程顺序扫描，只要遇到一页全部在库，就停止后续扫描
+        sync = await asyncio.to_thread(IncrementalSync, device_label, category_id)
+        pending: List[asyncio.Future] = []
         logger.info(
-            f"增量模式：设备 {device_name} 将按页顺序扫描，"
-            f"一旦遇到某一页所有壁纸都已在数据库中，则停止后续页面扫描。"
+            "增量模式（异步）：设备 %s 将按列表顺序扫描（高水位线: %s），遇到第一张已下载的壁纸即停止后续扫描。",
+            device_name, sync.high_water or "无",
         )
-        page_num = 1
-        while page_num <= total_pages:
-            has_data, has_new = get_wallpapers_in_page(
-                base_url,
-                page_num,
-                device_folder,
-                device_type=device_name,
-                session_obj=None,
-                thread_id=0,
-                device_label=device_label,
-            )
+        for page_num in range(1, total_pages + 1):
+            try:
+                has_data, has_new = await async_get_wallpapers_in_page(
+                    client, limit, downloads, base_url, page_num, device_folder,
+                    device_type=device_name, device_label=device_label,
+                    wallpapers=first_page if page_num == 1 else None,
+                    sync=sync,
+                    layout=layout,
+                    pending=pending,
+                )
+            except ListingTruncatedError as e:
+                metrics.inc("gugong_failures_total", stage="page")
+                logger.error("设备 %s 第 %d 页处理失败，停止扫描: %s", device_name, page_num, e)
+                sync.failed_pages += 1
+                break
             if not has_data:
-                logger.info(f"设备 {device_name} 第 {page_num} 页没有数据，停止扫描。")
+                logger.info("设备 %s 第 %d 页没有数据，停止扫描。", device_name, page_num)
                 break
             if not has_new:
                 logger.info(
-                    f"设备 {device_name} 第 {page_num} 页所有壁纸都已在数据库中，"
-                    f"根据增量规则，停止后续页面扫描。"
+                    "设备 %s 第 %d 页遇到已下载的壁纸，根据增量规则，停止后续扫描。",
+                    device_name, page_num,
                 )
                 break
-            page_num += 1
-            time.sleep(REQUEST_INTERVAL)
+        retries = sync.retry_tasks()
+        if retries:
+            logger.info("设备 %s 重新提交之前增量同步失败的 %d 个下载", device_name, len(retries))
+            pending.extend(await async_download_tasks(downloads, retries, sync))
+        # 等待本设备的下载全部结束，再更新高水位线
+        await asyncio.gather(*pending)
+        await asyncio.to_thread(sync.commit)
         return
 
-    # full_scan=True 时，仍然使用多线程全量下载
-    logger.info(f"总页数: {total_pages}")
-    logger.info(f"使用 {THREAD_COUNT} 个线程并发下载（full_scan 模式）")
-    
-    # 计算每个线程负责的页面范围
-    pages_per_thread = total_pages // THREAD_COUNT
-    remainder = total_pages % THREAD_COUNT
-    
-    threads = []
-    start_page = 1
-    
-    for thread_id in range(THREAD_COUNT):
-        # 分配页面范围
-        end_page = start_page + pages_per_thread - 1
-        if thread_id < remainder:  # 前 remainder 个线程多分配一页
-            end_page += 1
-        
-        if start_page > total_pages:
-            break
-        
-        # 创建线程
-        thread = threading.Thread(
-            target=download_pages_range,
-            args=(base_url, start_page, end_page, device_folder, device_name, thread_id + 1)
-        )
-        thread.start()
-        threads.append(thread)
-        
-        start_page = end_page + 1
-    
-    # 等待所有线程完成
-    for thread in threads:
-        thread.join()
-    
-    logger.info("所有线程下载完成")
+    logger.info("总页数: %d", total_pages)
+    logger.info("异步引擎全量下载：%d 个页面协程领取页码，由并发上限控制在途请求数", PAGE_THREAD_COUNT)
 
+    # 与线程版本共用页码前沿：每个协程领取页码之前才检查空页，遇到空页后不再请求之后的页
+    frontier = PageFrontier(total_pages)
+    pending = []
 
-def crawl_all(
+    async def page_worker():
+        while True:
+            page_num = frontier.claim()
+            if page_num is None:
+                return
+            try:
+                has_data, _ = await async_get_wallpapers_in_page(
+                    client, limit, downloads, base_url, page_num, device_folder,
+                    device_type=device_name, device_label=device_label,
+                    wallpapers=first_page if page_num == 1 else None,
+                    layout=layout,
+                    pending=pending,
+                )
+            except Exception as e:
+                metrics.inc("gugong_failures_total", stage="page")
+                logger.error("第 %d 页处理失败: %s", page_num, e, exc_info=True)
+                continue
+            if not has_data:
+                frontier.mark_empty(page_num)
+
+    await asyncio.gather(*(page_worker() for _ in range(min(PAGE_THREAD_COUNT, total_pages))))
+    await asyncio.gather(*pending)
+    logger.info("所有页面下载完成")
+
+
+async def async_crawl_all(
     category_id: Optional[int] = None,
     device_name: str = "全部",
     full_scan: bool = False,
+    concurrency: int = ASYNC_CONCURRENCY,
 ):
-    """爬取壁纸
-    
-    如果 device_name 为 "全部"，会按4种设备类型分别下载到4个不同的文件夹：
-    - walls/电脑/
-    - walls/手机/
-    - walls/月历/
-    - walls/4K/
-    """
-    logger.info("开始爬取壁纸...")
-    logger.info(f"category_id: {category_id or DEFAULT_CATEGORY_ID}")
-    logger.info(f"device_name: {device_name}")
-    logger.info(f"full_scan: {full_scan}")
-    
-    # 定义所有设备类型
-    all_device_types = ["电脑", "手机", "月历", "4K"]
-    
-    # 如果 device_name 是 "全部"，则下载所有4种设备类型
+    """异步爬取壁纸（对应同步版本的 crawl_all），所有设备类型并发爬取并共用一个连接池"""
     if device_name == "全部":
-        logger.info("="*60)
-        logger.info("将按设备类型分别下载到4个不同的文件夹...")
-        logger.info("文件夹结构：")
-        for dt in all_device_types:
-            folder_path = os.path.join(DOWNLOAD_DIR, safe_segment(dt))
-            logger.info(f"  - {folder_path}/")
-        logger.info("="*60)
-        
-        for idx, device_type in enumerate(all_device_types, 1):
-            logger.info("="*60)
-            logger.info(f"[{idx}/4] 开始下载 {device_type} 壁纸...")
-            logger.info("="*60)
-            
-            # 根据设备名称设置对应的标志
-            is_pc = 0
-            is_wap = 0
-            is_calendar = 0
-            is_four_k = 0
-            
-            if device_type == "电脑":
-                is_pc = 1
-            elif device_type == "手机":
-                is_wap = 1
-            elif device_type == "月历":
-                is_calendar = 1
-            elif device_type == "4K":
-                is_four_k = 1
-            
+        device_types = ALL_DEVICE_TYPES
+    elif device_name in ALL_DEVICE_TYPES:
+        device_types = [device_name]
+    else:
+        logger.warning(f"未知的设备类型: {device_name}")
+        logger.info(f"支持的设备类型: {', '.join(ALL_DEVICE_TYPES)}")
+        return
+
+    limit = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    # unsafe=True：允许保存 IP 地址形式主机的 cookies（本地替身服务器测试时需要）
+    async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.CookieJar(unsafe=True)) as client:
+        # 先访问主页面建立会话（只需一次，所有请求共享 cookies）
+        logger.info("访问主页面建立会话...")
+        try:
+            await async_fetch(client, limit, ALL_URL)
+        except Exception as e:
+            logger.warning(f"访问主页面失败: {e}")
+
+        # 所有设备共用的下载队列：concurrency 个下载协程
+        downloads = AsyncDownloadQueue(client, limit, concurrency).start()
+
+        async def crawl_device(idx: int, device_type: str):
+            logger.info("[%d/%d] 开始下载 %s 壁纸（异步引擎）...", idx, len(device_types), device_type)
             try:
-                crawl_by_device_type(
+                await async_crawl_by_device_type(
+                    client, limit, downloads,
                     category_id=category_id,
-                    is_pc=is_pc,
-                    is_wap=is_wap,
-                    is_calendar=is_calendar,
-                    is_four_k=is_four_k,
-                    title="",
                     device_name=device_type,
                     full_scan=full_scan,
                 )
-                logger.info(f"✓ {device_type} 壁纸下载完成")
+                logger.info("✓ %s 壁纸下载完成", device_type)
             except Exception as e:
-                logger.error(f"✗ {device_type} 壁纸下载失败: {e}", exc_info=True)
-            
-            # 每个设备类型下载完成后稍作延迟（最后一个不需要延迟）
-            if idx < len(all_device_types):
-                logger.info("等待 2 秒后继续下一个设备类型...")
-                time.sleep(2)
-    else:
-        # 单个设备类型下载
-        if device_name not in all_device_types:
-            logger.warning(f"未知的设备类型: {device_name}")
-            logger.info(f"支持的设备类型: {', '.join(all_device_types)}")
-            return
-        
-        logger.info(f"将下载到文件夹: {os.path.join(DOWNLOAD_DIR, safe_segment(device_name))}/")
-        
-        is_pc = 0
-        is_wap = 0
-        is_calendar = 0
-        is_four_k = 0
-        
-        if device_name == "电脑":
-            is_pc = 1
-        elif device_name == "手机":
-            is_wap = 1
-        elif device_name == "月历":
-            is_calendar = 1
-        elif device_name == "4K":
-            is_four_k = 1
-        
-        crawl_by_device_type(
+                logger.error("✗ %s 壁纸下载失败: %s", device_type, e, exc_info=True)
+
+        # 所有设备类型并发爬取，共用同一个并发上限、限速器和下载队列
+        try:
+            await asyncio.gather(*(
+                crawl_device(idx, device_type) for idx, device_type in enumerate(device_types, 1)
+            ))
+            # 某个设备中途失败时，它已放入队列的任务仍会下载完
+            await downloads.join()
+        finally:
+            await downloads.close()
+
+
+def crawl_all_async(
+    category_id: Optional[int] = None,
+    device_name: str = "全部",
+    full_scan: bool = False,
+    concurrency: int = ASYNC_CONCURRENCY,
+):
+    """异步引擎入口：参数与 crawl_all 一致，额外支持 concurrency（最大在途请求数）"""
+    if aiohttp is None:
+        raise RuntimeError("异步引擎需要 aiohttp，请先执行: pip install aiohttp")
+    logger.info("开始爬取壁纸（异步引擎）...")
+    logger.info(f"category_id: {category_id or DEFAULT_CATEGORY_ID}")
+    logger.info(f"device_name: {device_name}")
+    logger.info(f"full_scan: {full_scan}")
+    logger.info(f"concurrency: {concurrency}")
+    # 异步引擎的并发上限同时作为限速器的在途请求上限；在途上限从并发上限的 1/4 起步（之后每个往返 +1），
+    # 没有指定 --max_rps 时每秒请求数上限放宽到 ASYNC_MAX_RPS（仍会在 429/5xx 时自动降速）
+    rate_limiters.configure(
+        max_in_flight=concurrency,
+        in_flight=max(RATE_LIMIT_INITIAL_IN_FLIGHT, concurrency // 4),
+        max_rps=None if "max_rps" in rate_limiters.settings else ASYNC_MAX_RPS,
+    )
+    with db_session():
+        asyncio.run(async_crawl_all(
             category_id=category_id,
-            is_pc=is_pc,
-            is_wap=is_wap,
-            is_calendar=is_calendar,
-            is_four_k=is_four_k,
-            title="",
             device_name=device_name,
             full_scan=full_scan,
-        )
+            concurrency=concurrency,
+        ))
 
 
 if __name__ == "__main__":
@@ -1068,6 +5201,47 @@ if __name__ == "__main__":
     
     # 或者明确指定
     python download_gugong_walls.py --device_name "全部"
+    
+    # 列表页固定每页 24 条（默认 auto：探测网站支持的最大 pagesize 并按分类缓存）
+    python download_gugong_walls.py --page_size 24
+    
+    # 增量同步时并发预取之后的 5 页（默认 3 页，0 表示逐页请求）
+    python download_gugong_walls.py --prefetch_pages 5
+    
+    # 使用异步引擎（需要 aiohttp），最多 200 个在途请求
+    python download_gugong_walls.py --full_scan --engine async --concurrency 200
+    
+    # 每张壁纸下载所有可用分辨率 / 只下载 4K 和 2K
+    python download_gugong_walls.py --sizes all
+    python download_gugong_walls.py --sizes 13,12
+    
+    # 在 http://127.0.0.1:9108/metrics 提供 Prometheus 指标 / 定期写入指标文件
+    python download_gugong_walls.py --metrics_port 9108
+    python download_gugong_walls.py --metrics_file gugong.prom
+    
+    # 全量下载中断后从断点继续 / 只重新下载上次失败的图片
+    python download_gugong_walls.py --full_scan --resume
+    python download_gugong_walls.py --retry_failed
+    
+    # 分布式下载：协调进程把下载任务写入共享任务队列，任意多个工作进程（可在多台机器上）领取下载
+    python download_gugong_walls.py --full_scan --coordinator /mnt/shared/queue.db
+    python download_gugong_walls.py --worker /mnt/shared/queue.db --lease_seconds 600
+    
+    # 日志文件改为 JSON Lines（带 primaryid、device、px、bytes、duration 等字段）
+    python download_gugong_walls.py --log_format json
+    
+    # 分析各阶段的 CPU 和内存占用，报告写入 logs/profile_*.txt 和 logs/profile_*.pstats
+    python download_gugong_walls.py --full_scan --profile
+    
+    # 列表页解析交给进程池（auto 为 CPU 核数），解析不再与下载线程争用 GIL
+    python download_gugong_walls.py --full_scan --parse_workers auto
+    
+    # 在保存的列表页上检查各解析后端结果是否一致，并比较解析速度
+    python download_gugong_walls.py --check_parser pages/
+    
+    # 比对 walls/ 目录与数据库（缺失的文件/记录、大小不符、过期的路径），加 --fix 时修复
+    python download_gugong_walls.py --reconcile
+    python download_gugong_walls.py --reconcile --fix
     """
     import sys
     
@@ -1078,6 +5252,27 @@ if __name__ == "__main__":
     category_id = None
     device_name = "全部"
     full_scan = False
+    engine = "thread"
+    concurrency = ASYNC_CONCURRENCY
+    max_rps = None
+    parser = PARSER_BACKEND
+    parse_workers = PARSE_WORKERS
+    prefetch_pages = INCREMENTAL_PREFETCH_PAGES
+    page_size = "auto"
+    check_parser_dir = None
+    reconcile = False
+    fix = False
+    use_listing_cache = True
+    sizes = DOWNLOAD_SIZES
+    metrics_port = None
+    metrics_file = None
+    profile = False
+    log_format = "text"
+    resume = False
+    retry_failed = False
+    coordinator_queue = None
+    worker_queue = None
+    lease_seconds = QUEUE_LEASE_SECONDS
     
     # 简单的参数解析
     args = sys.argv[1:]
@@ -1092,14 +5287,149 @@ if __name__ == "__main__":
         elif args[i] == "--full_scan":
             full_scan = True
             i += 1
+        elif args[i] == "--engine" and i + 1 < len(args):
+            engine = args[i + 1]
+            i += 2
+        elif args[i] == "--concurrency" and i + 1 < len(args):
+            concurrency = int(args[i + 1])
+            i += 2
+        elif args[i] == "--max_rps" and i + 1 < len(args):
+            max_rps = float(args[i + 1])
+            i += 2
+        elif args[i] == "--parser" and i + 1 < len(args):
+            parser = args[i + 1]
+            i += 2
+        elif args[i] == "--page_size" and i + 1 < len(args):
+            page_size = args[i + 1]
+            i += 2
+        elif args[i] == "--prefetch_pages" and i + 1 < len(args):
+            prefetch_pages = int(args[i + 1])
+            i += 2
+        elif args[i] == "--parse_workers" and i + 1 < len(args):
+            parse_workers = (os.cpu_count() or 1) if args[i + 1] == "auto" else int(args[i + 1])
+            i += 2
+        elif args[i] == "--sizes" and i + 1 < len(args):
+            sizes = args[i + 1]
+            i += 2
+        elif args[i] == "--metrics_port" and i + 1 < len(args):
+            metrics_port = int(args[i + 1])
+            i += 2
+        elif args[i] == "--metrics_file" and i + 1 < len(args):
+            metrics_file = args[i + 1]
+            i += 2
+        elif args[i] == "--log_format" and i + 1 < len(args):
+            log_format = args[i + 1]
+            i += 2
+        elif args[i] == "--resume":
+            resume = True
+            i += 1
+        elif args[i] == "--retry_failed":
+            retry_failed = True
+            i += 1
+        elif args[i] == "--coordinator" and i + 1 < len(args):
+            coordinator_queue = args[i + 1]
+            i += 2
+        elif args[i] == "--worker" and i + 1 < len(args):
+            worker_queue = args[i + 1]
+            i += 2
+        elif args[i] == "--lease_seconds" and i + 1 < len(args):
+            lease_seconds = float(args[i + 1])
+            i += 2
+        elif args[i] == "--profile":
+            profile = True
+            i += 1
+        elif args[i] == "--no_listing_cache":
+            use_listing_cache = False
+            i += 1
+        elif args[i] == "--reconcile":
+            reconcile = True
+            i += 1
+        elif args[i] == "--fix":
+            fix = True
+            i += 1
+        elif args[i] == "--check_parser" and i + 1 < len(args):
+            check_parser_dir = args[i + 1]
+            i += 2
         else:
             i += 1
     
-    crawl_all(
-        category_id=category_id,
-        device_name=device_name,
-        full_scan=full_scan,
-    )
+    set_log_format(log_format)
+    
+    if check_parser_dir is not None:
+        sys.exit(0 if check_parser_backends(check_parser_dir) else 1)
+    if fix and not reconcile:
+        logger.error("--fix 只能与 --reconcile 一起使用")
+        sys.exit(2)
+    if reconcile:
+        issues = reconcile_walls(fix=fix)
+        sys.exit(0 if fix or not any(issues.values()) else 1)
+    
+    if engine == "async" and (resume or retry_failed):
+        logger.error("--resume / --retry_failed 目前只支持线程引擎（--engine thread）")
+        sys.exit(2)
+    if coordinator_queue and worker_queue:
+        logger.error("--coordinator 和 --worker 不能同时使用")
+        sys.exit(2)
+    if engine == "async" and (coordinator_queue or worker_queue):
+        logger.error("--coordinator / --worker 目前只支持线程引擎（--engine thread）")
+        sys.exit(2)
+    if resume and not full_scan:
+        logger.info("--resume 只用于全量模式，已自动启用 --full_scan")
+        full_scan = True
+    
+    PARSER_BACKEND = resolve_parser_backend(parser)
+    logger.info(f"列表页解析后端: {PARSER_BACKEND}")
+    listing_cache.enabled = use_listing_cache
+    INCREMENTAL_PREFETCH_PAGES = prefetch_pages
+    listing_page_sizes.fixed = None if page_size == "auto" else int(page_size)
+    DOWNLOAD_SIZES = parse_download_sizes(sizes)
+    logger.info(f"下载分辨率: {DOWNLOAD_SIZES}")
+    rate_limiters.configure(max_rps=max_rps)
+    # 解析进程在爬取开始前启动（forkserver / spawn 需要重新导入脚本）
+    parse_pool.start(parse_workers)
+    
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    if metrics_file is not None:
+        metrics.start_textfile(metrics_file)
+    if profile:
+        profiler.start()
+    
+    try:
+        if coordinator_queue is not None:
+            run_coordinator(
+                coordinator_queue,
+                category_id=category_id,
+                device_name=device_name,
+                full_scan=full_scan,
+                resume=resume,
+            )
+        elif worker_queue is not None:
+            run_worker(worker_queue, lease_seconds=lease_seconds)
+        elif engine == "async":
+            crawl_all_async(
+                category_id=category_id,
+                device_name=device_name,
+                full_scan=full_scan,
+                concurrency=concurrency,
+            )
+        else:
+            crawl_all(
+                category_id=category_id,
+                device_name=device_name,
+                full_scan=full_scan,
+                resume=resume,
+                retry_failed=retry_failed,
+            )
+    finally:
+        if profile:
+            profile_prefix = os.path.join(LOG_DIR, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            report_path, pstats_path = profiler.stop(profile_prefix)
+            logger.info(f"性能分析报告: {pathlib.Path(report_path).resolve()}")
+            logger.info(f"pstats 文件（可用 python -m pstats 或 snakeviz 查看）: {pathlib.Path(pstats_path).resolve()}")
+        parse_pool.shutdown()
+        # 退出前写入最终的指标
+        metrics.stop_textfile()
     
     logger.info("==== 完成 ====")
     logger.info(f"图片保存在: {pathlib.Path(DOWNLOAD_DIR).resolve()}")
@@ -0,0 +1,66 @@
+"""测试共用的夹具：每个测试在单独的临时目录中运行，网站地址指向本地假服务器（benchmark_gugong_walls.FakeDpmServer）"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 脚本导入时会在当前目录创建 logs/，先切换到临时目录再导入
+os.chdir(tempfile.mkdtemp(prefix="gugong_test_"))
+
+import benchmark_gugong_walls as bench  # noqa: E402
+import download_gugong_walls as gw  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """切换到空的工作目录（walls/、walls.db、.cache/ 都是相对路径），并清空上一个测试留下的内存状态"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gw.wallpaper_index, "db_path", None)
+    monkeypatch.setattr(gw.content_store, "db_path", None)
+    monkeypatch.setattr(gw.listing_page_sizes, "_sizes", {})
+    monkeypatch.setattr(gw.listing_cache, "enabled", False)
+    monkeypatch.setattr(gw.rate_limiters, "settings", {})
+    monkeypatch.setattr(gw.rate_limiters, "_limiters", {})
+    return tmp_path
+
+
+@pytest.fixture
+def fake_site(workdir, monkeypatch):
+    """启动假服务器并把模块指向它；返回 start(config) -> FakeDpmServer"""
+    servers = []
+
+    def start(config: bench.FakeSiteConfig) -> bench.FakeDpmServer:
+        server = bench.FakeDpmServer(config).__enter__()
+        servers.append(server)
+        base_url = server.base_url
+        monkeypatch.setattr(gw, "ALL_URL", f"{base_url}/lights/royal.html")
+        monkeypatch.setattr(gw, "FILTER_URL_TEMPLATE", f"{base_url}/searchs/royalb.html")
+        monkeypatch.setattr(
+            gw, "IMG_DOWNLOAD_URL_TEMPLATE", f"{base_url}/download/lights_image/id/{{primaryid}}/img_size/{{size}}.html"
+        )
+        gw.rate_limiters.configure(rps=1000, max_rps=1000)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+def expected_files(config: bench.FakeSiteConfig, device: str = "电脑", px: str = "4000x2250"):
+    """假服务器上全部壁纸按默认分辨率下载后应得到的 rel_path 集合"""
+    return {
+        os.path.join(gw.DOWNLOAD_DIR, device, "2026", "01", f"{primaryid}_故宫壁纸 {primaryid}_{px}.png")
+        for primaryid in (str(100000 + i) for i in range(config.total_items))
+    }
+
+
+def db_rows(columns: str = "primaryid, device, px, rel_path, size"):
+    conn = gw.db_get_connection()
+    try:
+        return conn.execute(f"SELECT {columns} FROM wallpapers ORDER BY primaryid").fetchall()
+    finally:
+        conn.close()
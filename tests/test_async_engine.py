@@ -0,0 +1,98 @@
+"""异步引擎（--engine async）在本地假服务器上的端到端测试"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from conftest import bench, db_rows, expected_files, gw
+
+pytestmark = pytest.mark.skipif(gw.aiohttp is None, reason="异步引擎需要 aiohttp")
+
+
+def scanned_files():
+    return {
+        os.path.relpath(os.path.join(folder, name))
+        for folder, _, names in os.walk(gw.DOWNLOAD_DIR)
+        for name in names
+    }
+
+
+@pytest.mark.parametrize("full_scan", [True, False])
+def test_crawl_all_async_downloads_every_wallpaper(fake_site, full_scan):
+    config = bench.FakeSiteConfig(pages=3, items_per_page=4, image_kb=2)
+    fake_site(config)
+
+    gw.crawl_all_async(device_name="电脑", full_scan=full_scan, concurrency=8)
+
+    expected = expected_files(config)
+    assert scanned_files() == expected
+    for rel_path in expected:
+        with open(rel_path, "rb") as f:
+            assert f.read() == config.image
+    rows = db_rows()
+    assert {(primaryid, device, px, size) for primaryid, device, px, _, size in rows} == {
+        (str(100000 + i), "电脑", "4000x2250", len(config.image)) for i in range(config.total_items)
+    }
+    assert {rel_path for *_, rel_path, _ in rows} == expected
+
+
+def test_crawl_all_async_skips_recorded_wallpapers(fake_site):
+    config = bench.FakeSiteConfig(pages=2, items_per_page=3, image_kb=1)
+    fake_site(config)
+    gw.crawl_all_async(device_name="电脑", full_scan=True, concurrency=4)
+    before = db_rows("primaryid, updated_at")
+
+    timer = bench.StageTimer(gw)
+    timer.wrap("async_download_to_file")
+    try:
+        gw.crawl_all_async(device_name="电脑", full_scan=True, concurrency=4)
+    finally:
+        timer.restore()
+
+    assert timer.samples["async_download_to_file"] == []
+    assert db_rows("primaryid, updated_at") == before
+
+
+def test_crawl_all_async_stops_at_first_empty_page(fake_site, monkeypatch):
+    """data-max 解析失败时按 100 页兜底，遇到空页后不再请求之后的页"""
+    config = bench.FakeSiteConfig(pages=3, items_per_page=2, image_kb=1)
+    fake_site(config)
+    monkeypatch.setattr(gw, "parse_total_pages", lambda html: 100)
+    timer = bench.StageTimer(gw)
+    timer.wrap("async_fetch_listing")
+    try:
+        gw.crawl_all_async(device_name="电脑", full_scan=True, concurrency=50)
+    finally:
+        timer.restore()
+
+    assert scanned_files() == expected_files(config)
+    # 第 1~3 页 + 每个页面协程最多多请求一页
+    assert len(timer.samples["async_fetch_listing"]) <= config.pages + gw.PAGE_THREAD_COUNT
+
+
+def test_slow_image_does_not_hold_back_later_pages(fake_site, monkeypatch):
+    """增量模式按页顺序扫描：第一页的慢图片只占住一个下载协程，后面的页照常抓取和下载"""
+    config = bench.FakeSiteConfig(pages=3, items_per_page=2, image_kb=1)
+    fake_site(config)
+    slow, last = "100000", str(100000 + config.total_items - 1)
+    download = gw.async_download_wallpaper
+    started, started_before_slow_finished = [], []
+
+    async def fake_download(client, limit, **task):
+        started.append(task["primaryid"])
+        if task["primaryid"] == slow:
+            # 一直等到最后一页的图片开始下载（旧实现中会等到超时）
+            deadline = time.monotonic() + 5
+            while last not in started and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            started_before_slow_finished.extend(started)
+        return await download(client, limit, **task)
+
+    monkeypatch.setattr(gw, "async_download_wallpaper", fake_download)
+    gw.crawl_all_async(device_name="电脑", full_scan=False, concurrency=4)
+
+    assert last in started_before_slow_finished
+    assert scanned_files() == expected_files(config)
+    # 高水位线在本设备的下载全部结束后才更新
+    assert gw.db_get_sync_mark("电脑", gw.DEFAULT_CATEGORY_ID) == slow
@@ -0,0 +1,44 @@
+"""跨设备内容去重（ContentStore）：只链接能确认完整的文件"""
+import hashlib
+import os
+
+import pytest
+
+from conftest import gw
+
+CONTENT = b"\x89PNG\r\n\x1a\n" + bytes(100)
+
+
+@pytest.fixture
+def stored_file(workdir):
+    path = os.path.join("walls", "电脑", "2026", "01", "1_a_4000x2250.png")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(CONTENT)
+    return path
+
+
+@pytest.mark.parametrize(
+    "sha256, size, usable",
+    [
+        (None, len(CONTENT), True),
+        (hashlib.sha256(CONTENT).hexdigest(), None, True),
+        (None, None, False),                       # [FS-SKIP] 补录的历史记录：无法确认完整
+        (None, len(CONTENT) + 10, False),          # 文件被截断
+        (hashlib.sha256(b"other").hexdigest(), None, False),
+    ],
+)
+def test_lookup_requires_verified_source(stored_file, sha256, size, usable):
+    store = gw.ContentStore()
+    store.add("1", "4000x2250", stored_file, sha256, size)
+    assert (store.lookup("1", "4000 x 2250") is not None) == usable
+
+
+def test_unverified_legacy_file_is_not_linked(stored_file, workdir):
+    gw.init_db()
+    gw.db_upsert_wallpaper("1", "电脑", "2026", "01", "a", "4000x2250", stored_file)
+    with gw.db_session():
+        target = os.path.join("walls", "4K", "2026", "01", "1_a_4000x2250.png")
+        os.makedirs(os.path.dirname(target))
+        assert gw.reuse_downloaded_content("1", "4000x2250", target) is None
+        assert not os.path.exists(target)
@@ -0,0 +1,63 @@
+"""数据库写线程（WallpaperDbWriter）的批量提交与失败处理"""
+import pytest
+
+from conftest import db_rows, gw
+
+
+def upsert(primaryid: str, rel_path):
+    gw.db_upsert_wallpaper(
+        primaryid=primaryid, device="电脑", year="2026", month="01", name=f"壁纸{primaryid}",
+        px="4000 x 2250", rel_path=rel_path, size=64,
+    )
+
+
+def test_failed_batch_is_retried_one_row_at_a_time(workdir):
+    with gw.db_session() as writer:
+        for i in range(5):
+            upsert(str(i), f"walls/电脑/2026/01/{i}.png")
+        # rel_path 为 NOT NULL 列：这一条使整个批次的 executemany 失败
+        upsert("bad", None)
+        upsert("5", "walls/电脑/2026/01/5.png")
+        writer.flush()
+
+        assert [row[0] for row in db_rows()] == ["0", "1", "2", "3", "4", "5"]
+        assert gw.db_has_wallpaper("0", "4000x2250", "电脑")
+        assert gw.db_has_wallpaper("5", "4000x2250", "电脑")
+        # 没有写入的记录从去重索引和内容索引中撤销，之后会重新下载
+        assert not gw.db_has_wallpaper("bad", "4000x2250", "电脑")
+        assert gw.content_store.lookup("bad", "4000x2250") is None
+
+
+def test_batches_are_committed_on_flush(workdir):
+    with gw.db_session() as writer:
+        for i in range(3):
+            upsert(str(i), f"walls/电脑/2026/01/{i}.png")
+        writer.flush()
+        assert len(db_rows()) == 3
+
+
+def test_non_sqlite_error_does_not_stop_writer(workdir):
+    with gw.db_session() as writer:
+        upsert("0", "walls/电脑/2026/01/0.png")
+        # 超出 SQLite INTEGER 范围的参数抛出 OverflowError（不是 sqlite3.Error）
+        gw.db_upsert_wallpaper(
+            primaryid="big", device="电脑", year="2026", month="01", name="壁纸big",
+            px="4000 x 2250", rel_path="walls/电脑/2026/01/big.png", size=2 ** 70,
+        )
+        writer.flush()
+        upsert("1", "walls/电脑/2026/01/1.png")
+        writer.flush()
+
+        assert [row[0] for row in db_rows()] == ["0", "1"]
+        assert not gw.db_has_wallpaper("big", "4000x2250", "电脑")
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_flush_raises_when_writer_thread_is_gone(workdir, monkeypatch):
+    writer = gw.WallpaperDbWriter(flush_interval=0.05)
+    monkeypatch.setattr(writer, "_commit", lambda conn, pending: 1 / 0)
+    writer.start()
+    writer.submit(("x",))
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    writer.close()
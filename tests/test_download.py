@@ -0,0 +1,76 @@
+"""单张图片下载（download_wallpaper / download_to_file）"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import bench, db_rows, gw
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(1000)
+
+
+@pytest.fixture
+def flaky_server():
+    """第一次请求返回 416，之后返回完整图片"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.headers.get("Range"))
+            status, body = (416, b"") if len(requests_seen) == 1 else (200, IMAGE)
+            self.send_response(status)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/image.png", requests_seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_416_without_part_file_is_retried(workdir, flaky_server, monkeypatch, caplog):
+    url, requests_seen = flaky_server
+    monkeypatch.setattr(gw, "download_retry_delay", lambda attempt: 0)
+    gw.rate_limiters.configure(rps=1000, max_rps=1000)
+
+    size, _ = gw.download_to_file(gw.http_sessions.get(), url, "image.png", {})
+
+    assert size == len(IMAGE)
+    assert requests_seen == [None, None]
+    with open("image.png", "rb") as f:
+        assert f.read() == IMAGE
+    assert not os.path.exists("image.png" + gw.PART_SUFFIX)
+    # 没有 .part 文件时不应该因为删除它而出错（重试原因应是 416 本身）
+    assert "FileNotFoundError" not in caplog.text and "No such file" not in caplog.text
+
+
+def test_duplicate_task_on_same_device_is_not_downloaded_twice(fake_site, monkeypatch):
+    config = bench.FakeSiteConfig(pages=1, items_per_page=1, image_kb=1)
+    fake_site(config)
+    # 模拟两个任务都已通过去重检查、在 claim 上排队的情况
+    monkeypatch.setattr(gw, "skip_existing_wallpaper", lambda *args: False)
+    task = dict(
+        url=gw.IMG_DOWNLOAD_URL_TEMPLATE.format(primaryid="100000", size=13),
+        name="故宫壁纸 100000", px="4000 x 2250", page_num=1, index=0,
+        device_folder="电脑", primaryid="100000", year="2026", month="01",
+    )
+    timer = bench.StageTimer(gw)
+    timer.wrap("download_to_file")
+    try:
+        with gw.db_session():
+            assert gw.download_wallpaper(**task)
+            assert gw.download_wallpaper(**task)
+    finally:
+        timer.restore()
+
+    assert len(timer.samples["download_to_file"]) == 1
+    assert [row[4] for row in db_rows()] == [len(config.image)]
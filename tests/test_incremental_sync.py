@@ -0,0 +1,62 @@
+"""增量同步（IncrementalSync）的高水位线与失败重试"""
+import os
+
+import pytest
+
+from conftest import bench, db_rows, expected_files, gw
+
+ENGINES = ["thread"] + (["async"] if gw.aiohttp is not None else [])
+
+
+def crawl(engine: str) -> None:
+    if engine == "async":
+        gw.crawl_all_async(device_name="电脑", full_scan=False, concurrency=4)
+    else:
+        gw.crawl_all(device_name="电脑", full_scan=False)
+
+
+def fail_downloads(monkeypatch, primaryids):
+    """让指定壁纸的下载失败（两种引擎都替换）"""
+    download_wallpaper = gw.download_wallpaper
+    async_download_wallpaper = gw.async_download_wallpaper
+
+    def fake_download(**task):
+        return False if task["primaryid"] in primaryids else download_wallpaper(**task)
+
+    async def fake_async_download(client, limit, **task):
+        return False if task["primaryid"] in primaryids else await async_download_wallpaper(client, limit, **task)
+
+    monkeypatch.setattr(gw, "download_wallpaper", fake_download)
+    monkeypatch.setattr(gw, "async_download_wallpaper", fake_async_download)
+
+
+def sync_retry_ids():
+    conn = gw.db_get_connection()
+    try:
+        return [row[0] for row in conn.execute("SELECT primaryid FROM sync_retries ORDER BY primaryid")]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_failed_download_is_retried_after_mark_moves_past_it(fake_site, monkeypatch, engine):
+    """列表为 A、B、C：C 已入库，A 下载成功、B 失败后，下次同步在 A 处停止，但仍要补下载 B"""
+    config = bench.FakeSiteConfig(pages=1, items_per_page=3, image_kb=1)
+    fake_site(config)
+    a, b, c = (str(100000 + i) for i in range(3))
+
+    with monkeypatch.context() as m:
+        fail_downloads(m, {a, b})
+        crawl(engine)
+    assert [row[0] for row in db_rows()] == [c]
+
+    with monkeypatch.context() as m:
+        fail_downloads(m, {b})
+        crawl(engine)
+    assert [row[0] for row in db_rows()] == [a, c]
+    assert sync_retry_ids() == [b]
+
+    crawl(engine)
+    assert [row[0] for row in db_rows()] == [a, b, c]
+    assert all(os.path.exists(rel_path) for rel_path in expected_files(config))
+    assert sync_retry_ids() == []
@@ -0,0 +1,83 @@
+"""分布式模式（--coordinator / --worker）：协调进程在本进程运行，工作进程以 spawn 方式启动"""
+import multiprocessing
+import os
+
+from conftest import bench, db_rows, expected_files, gw
+
+
+def journal_mode(db_path: str) -> str:
+    conn = gw.db_get_connection(db_path)
+    try:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_workers(base_url: str, workdir: str, queue_path: str, count: int = 2) -> None:
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=bench.queue_worker_process,
+            args=(base_url, workdir, queue_path, "WARNING", 1000.0, 30.0),
+        )
+        for _ in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(120)
+        if worker.is_alive():
+            worker.kill()
+            worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * count
+
+
+def test_worker_results_reach_coordinator_db(fake_site, workdir, monkeypatch):
+    config = bench.FakeSiteConfig(pages=2, items_per_page=3, image_kb=1)
+    server = fake_site(config)
+    monkeypatch.setattr(gw, "DB_WAL", True)
+    queue_path = str(workdir / "queue.db")
+    worker_dir = workdir / "worker"
+    worker_dir.mkdir()
+
+    gw.run_coordinator(queue_path, device_name="电脑")
+    assert gw.JobQueue(queue_path).counts() == {"pending": config.total_items}
+    run_workers(server.base_url, str(worker_dir), queue_path)
+
+    # 工作进程在自己的目录中下载并写入 walls.db（不使用 WAL），结果回报到任务队列
+    assert gw.JobQueue(queue_path).counts() == {"done": config.total_items}
+    assert all(os.path.exists(worker_dir / rel_path) for rel_path in expected_files(config))
+    assert journal_mode(str(worker_dir / gw.DB_PATH)) == "delete"
+    assert db_rows() == []
+
+    # 协调进程再次运行时导入这些记录：增量扫描在第一页的第一张壁纸处停止，高水位线推进到它
+    timer = bench.StageTimer(gw)
+    timer.wrap("fetch_listing")
+    try:
+        gw.run_coordinator(queue_path, device_name="电脑")
+    finally:
+        timer.restore()
+    rows = db_rows()
+    assert {rel_path for *_, rel_path, _ in rows} == expected_files(config)
+    assert {size for *_, size in rows} == {len(config.image)}
+    assert gw.db_get_sync_mark("电脑", gw.DEFAULT_CATEGORY_ID) == "100000"
+    assert len(timer.samples["fetch_listing"]) == 1
+    assert journal_mode(gw.DB_PATH) == "delete"
+    assert gw.JobQueue(queue_path).unimported_results() == []
+
+
+def test_stale_lease_cannot_complete_job(workdir):
+    job_queue = gw.JobQueue(str(workdir / "queue.db")).init()
+    job_queue.enqueue([{"device_folder": "电脑", "primaryid": "100000", "px": "4000 x 2250"}])
+
+    # a 的租约立即过期，任务重新分配给 b
+    job_id, _ = job_queue.lease("a", lease_seconds=-1)
+    assert job_queue.lease("b")[0] == job_id
+
+    assert not job_queue.complete(job_id, "a", True, {"rel_path": "a.png"})
+    assert job_queue.counts() == {"leased": 1}
+    assert job_queue.complete(job_id, "b", True, {"rel_path": "b.png"})
+    assert [result for *_, result in job_queue.unimported_results()] == [{"rel_path": "b.png"}]
+    # 任务完成后，迟到的结果同样不记录
+    assert not job_queue.complete(job_id, "a", False)
+    assert job_queue.counts() == {"done": 1}
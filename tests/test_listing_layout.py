@@ -0,0 +1,61 @@
+"""每页条数截断检测（ListingLayout）：按 .list-item 原始个数判断，增量模式下截断页按失败页处理"""
+import os
+import pickle
+
+import pytest
+
+from conftest import bench, gw
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "listing", "pc_page.html")
+
+
+@pytest.fixture
+def pc_page():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_malformed_item_does_not_count_as_truncation(workdir, pc_page, monkeypatch):
+    # pc_page 有 5 个 .list-item，其中 1 个没有 primaryid
+    wallpapers = gw.parse_listing_page(pc_page)
+    assert (len(wallpapers), gw.listing_item_count(wallpapers)) == (4, 5)
+
+    monkeypatch.setattr(gw, "LISTING_PAGE_SIZE_DEFAULT", 1)
+    gw.init_db()
+    layout = gw.ListingLayout(None, 5, total_pages=3)
+    layout.check(1, gw.listing_item_count(wallpapers))
+    with pytest.raises(gw.ListingTruncatedError):
+        layout.check(1, 4)
+
+
+def test_raw_count_survives_parse_pool_and_cache(workdir, pc_page):
+    wallpapers = gw.parse_listing_page(pc_page)
+    assert pickle.loads(pickle.dumps(wallpapers)).raw_count == 5
+
+    gw.listing_cache.enabled = True
+    url = "https://www.dpm.org.cn/searchs/royalb.html?category_id=624&p=1"
+    gw.listing_cache.store(url, {"ETag": '"v1"'}, pc_page, "电脑", wallpapers)
+    _, cached = gw.listing_cache.cached_page(gw.listing_cache.load(url), "电脑")
+    assert cached == wallpapers
+    assert gw.listing_item_count(cached) == 5
+
+
+def page_failures() -> float:
+    return gw.metrics._counters.get("gugong_failures_total", {}).get((("stage", "page"),), 0)
+
+
+@pytest.mark.parametrize("engine", ["thread"] + (["async"] if gw.aiohttp is not None else []))
+def test_incremental_scan_stops_cleanly_on_truncated_page(fake_site, monkeypatch, engine):
+    """服务器悄悄把每页截断为 30 条（请求 48 条）：该页按失败处理，扫描停止，不推进高水位线"""
+    config = bench.FakeSiteConfig(pages=4, items_per_page=24, image_kb=1, max_page_size=30, silent_truncation=True)
+    fake_site(config)
+    monkeypatch.setattr(gw.listing_page_sizes, "fixed", 48)
+    failures = page_failures()
+
+    if engine == "async":
+        gw.crawl_all_async(device_name="电脑", full_scan=False, concurrency=4)
+    else:
+        gw.crawl_all(device_name="电脑", full_scan=False)
+
+    assert page_failures() == failures + 1
+    assert gw.db_get_sync_mark("电脑", gw.DEFAULT_CATEGORY_ID) is None
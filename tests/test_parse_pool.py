@@ -0,0 +1,49 @@
+"""--parse_workers：解析进程池不使用 fork（导入脚本后日志监听线程已在运行）"""
+import concurrent.futures
+import os
+import threading
+
+import pytest
+
+from conftest import gw
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "listing", "pc_page.html")
+
+
+@pytest.fixture
+def pool(workdir):
+    pool = gw.ParsePool()
+    yield pool
+    pool.shutdown()
+
+
+def test_parse_pool_avoids_fork_and_matches_in_process_parse(pool, workdir):
+    assert gw.log_listener._thread is not None and threading.active_count() > 1
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+
+    pool.start(2)
+
+    assert pool.enabled
+    assert pool._executor._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert pool.parse(html, "电脑") == gw.parse_listing_html(html, device_type="电脑")
+    # 子进程重新导入脚本时不会在工作目录中新建日志文件
+    log_dir = workdir / gw.LOG_DIR
+    assert not log_dir.exists() or os.listdir(log_dir) == []
+
+
+def test_queued_pages_are_batched_into_one_task(pool):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    expected = gw.parse_listing_html(html, device_type="电脑")
+    pool.start(1)
+
+    assert pool.parse_many([(html, "电脑")] * 16) == [expected] * 16
+    assert (pool.tasks, pool.pages) == (4, 16)
+
+    # 唯一的解析进程在忙时，其他线程提交的页面排队，合并为一个任务发送
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda _: pool.parse(html, "电脑"), range(32)))
+    assert results == [expected] * 32
+    assert pool.pages == 16 + 32
+    assert pool.tasks - 4 < 32
@@ -0,0 +1,51 @@
+"""列表页解析：bs4 与 lxml 后端在保存的列表页（tests/fixtures/listing/）上的结果必须一致"""
+import os
+
+import pytest
+
+from conftest import gw
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "listing")
+FIXTURES = sorted(name for name in os.listdir(FIXTURE_DIR) if name.endswith(".html"))
+
+pytestmark = pytest.mark.skipif(gw.lxml is None, reason="需要 lxml")
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_with(backend: str, html: str, device_type: str, monkeypatch):
+    monkeypatch.setattr(gw, "PARSER_BACKEND", backend)
+    return gw.parse_listing_page(html, device_type)
+
+
+@pytest.mark.parametrize("device_type", gw.ALL_DEVICE_TYPES)
+@pytest.mark.parametrize("fixture", FIXTURES)
+def test_backends_agree(fixture, device_type, monkeypatch):
+    html = read_fixture(fixture)
+    assert parse_with("lxml", html, device_type, monkeypatch) == parse_with("bs4", html, device_type, monkeypatch)
+    assert gw.extract_list_items_lxml(html) == gw.extract_list_items_bs4(html)
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_pc_page_fields(backend, monkeypatch):
+    wallpapers = parse_with(backend, read_fixture("pc_page.html"), "电脑", monkeypatch)
+    by_id = {wp["primaryid"]: wp for wp in wallpapers}
+    # 没有 primaryid 的条目被跳过；只有 icon 的条目仍保留
+    assert list(by_id) == ["251230", "251229", "251228", "251227"]
+    assert by_id["251230"]["name"] == "雪落紫禁城"
+    assert (by_id["251230"]["year"], by_id["251230"]["month"]) == ("2026", "01")
+    assert by_id["251229"]["name"] == "瓷 & 器·青花缠枝莲纹"
+    assert (by_id["251229"]["year"], by_id["251229"]["month"]) == ("2025", "12")
+    assert by_id["251227"]["name"] == "角楼秋色"
+
+
+def test_check_parser_accepts_fixtures():
+    assert gw.check_parser_backends(FIXTURE_DIR, repeat=1)
+
+
+def test_total_pages_from_fixture():
+    assert gw.parse_total_pages(read_fixture("pc_page.html")) == 38
+    assert gw.parse_total_pages(read_fixture("calendar_page.html")) == 2
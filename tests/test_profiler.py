@@ -0,0 +1,39 @@
+"""--profile：StageProfiler 在多个线程中启用 cProfile 并合并结果"""
+import pstats
+import sys
+import threading
+
+from conftest import gw
+
+
+def busy_stage(profiler: gw.StageProfiler) -> None:
+    with profiler.stage("parse"):
+        sum(i * i for i in range(20000))
+
+
+def test_profiles_all_threads(workdir):
+    profiler = gw.StageProfiler()
+    profiler.start()
+    try:
+        threads = [threading.Thread(target=busy_stage, args=(profiler,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        busy_stage(profiler)
+    finally:
+        report_path, pstats_path = profiler.stop(str(workdir / "profile"))
+
+    # 分析结束后不再有任何线程处于分析状态
+    assert sys.getprofile() is None
+    assert threading.getprofile() is None
+    assert profiler._stages["parse"][0] == 4
+    # 3.12 以前每个线程（含重启的日志监听线程）一个 cProfile；3.12 起只有一个进程级的 cProfile
+    if gw.PROFILE_PER_THREAD:
+        assert len(profiler._profiles) >= 4
+    else:
+        assert len(profiler._profiles) == 1
+    calls = {func[2]: stat[1] for func, stat in pstats.Stats(pstats_path).stats.items()}
+    assert calls["busy_stage"] == 4
+    with open(report_path, encoding="utf-8") as f:
+        assert "parse" in f.read()
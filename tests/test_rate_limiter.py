@@ -0,0 +1,87 @@
+"""限速器（HostRateLimiter）的协程等待与异步引擎的默认参数"""
+import asyncio
+import threading
+
+from conftest import bench, gw
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_release_wakes_waiting_coroutine_without_polling():
+    limiter = gw.HostRateLimiter("test", rps=1e6, max_rps=1e6, in_flight=1, max_in_flight=1)
+
+    async def scenario():
+        slot = await limiter.acquire_async()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert not waiter.done()
+        limiter.release(slot)
+        # 唤醒通过 call_soon_threadsafe 调度，几轮事件循环内完成（不依赖定时轮询）
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert waiter.done()
+        limiter.release(waiter.result())
+
+    run(scenario())
+    assert limiter.in_flight == 0
+
+
+def test_release_from_another_thread_wakes_coroutine():
+    limiter = gw.HostRateLimiter("test", rps=1e6, max_rps=1e6, in_flight=1, max_in_flight=1)
+    slot = limiter.acquire()
+
+    async def scenario():
+        threading.Timer(0.01, limiter.release, args=(slot,)).start()
+        await asyncio.wait_for(limiter.acquire_async(), timeout=2)
+
+    run(scenario())
+    assert limiter.in_flight == 1
+
+
+def test_cancelled_waiter_passes_wakeup_on():
+    limiter = gw.HostRateLimiter("test", rps=1e6, max_rps=1e6, in_flight=1, max_in_flight=1)
+
+    async def scenario():
+        slot = await limiter.acquire_async()
+        first = asyncio.ensure_future(limiter.acquire_async())
+        second = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        limiter.release(slot)
+        # 第一个等待者已被唤醒但在运行前被取消，名额应转给第二个
+        first.cancel()
+        await asyncio.wait_for(second, timeout=2)
+
+    run(scenario())
+    assert limiter.in_flight == 1
+
+
+def test_many_coroutines_fill_the_in_flight_limit():
+    limiter = gw.HostRateLimiter("test", rps=1e6, max_rps=1e6, in_flight=200, max_in_flight=200)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.request_async() as slot:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            slot.mark_response(200)
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(500)))
+
+    run(scenario())
+    assert peak == 200
+    assert limiter.in_flight == 0
+
+
+def test_crawl_all_async_raises_limiter_defaults(fake_site):
+    fake_site(bench.FakeSiteConfig(pages=1, items_per_page=1, image_kb=1))
+    gw.rate_limiters.settings.pop("max_rps")
+    gw.crawl_all_async(device_name="电脑", full_scan=True, concurrency=120)
+    limiter = gw.rate_limiters.for_url(gw.ALL_URL)
+    assert limiter.max_in_flight == 120
+    assert limiter.limit >= 30
+    assert limiter.max_rps == gw.ASYNC_MAX_RPS
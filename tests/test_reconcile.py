@@ -0,0 +1,57 @@
+"""--reconcile：没有记录大小的截断图片按结束标记识别，--fix 删除后由下次增量同步重新下载"""
+import os
+
+import pytest
+
+from conftest import bench, expected_files, gw
+
+PNG = gw.PNG_SIGNATURE + bytes(100) + b"\x00\x00\x00\x00" + gw.PNG_TRAILER
+JPEG = gw.JPEG_SIGNATURE + bytes(100) + gw.JPEG_TRAILER
+
+
+@pytest.mark.parametrize(
+    "content, truncated",
+    [
+        (PNG, False),
+        (PNG[:-20], True),
+        (JPEG, False),
+        (JPEG + bytes(4), False),
+        (JPEG[:-10], True),
+        (b"<html>not an image</html>", False),
+    ],
+)
+def test_image_file_truncated(workdir, content, truncated):
+    path = str(workdir / "image.png")
+    with open(path, "wb") as f:
+        f.write(content)
+    assert gw.image_file_truncated(path, len(content)) is truncated
+
+
+def test_fix_requeues_truncated_unsized_files(fake_site):
+    config = bench.FakeSiteConfig(pages=1, items_per_page=3, image_kb=2)
+    fake_site(config)
+    gw.crawl_all(device_name="电脑", full_scan=False)
+    paths = sorted(expected_files(config))
+
+    # 第二张是 [FS-SKIP] 补录的截断文件（记录中没有大小），第三张是没有记录的截断文件
+    os.truncate(paths[1], 1000)
+    os.truncate(paths[2], 1000)
+    conn = gw.db_get_connection()
+    try:
+        with conn:
+            conn.execute("UPDATE wallpapers SET size = NULL, sha256 = NULL WHERE primaryid = '100001'")
+            conn.execute("DELETE FROM wallpapers WHERE primaryid = '100002'")
+    finally:
+        conn.close()
+
+    assert gw.reconcile_walls()["size_mismatch"] == 2
+    gw.reconcile_walls(fix=True)
+    assert not os.path.exists(paths[1]) and not os.path.exists(paths[2])
+    assert sum(gw.reconcile_walls().values()) == 0
+
+    # 高水位线是第一张壁纸，增量同步在第一页就停止，但重试列表中的两张仍会重新下载
+    gw.crawl_all(device_name="电脑", full_scan=False)
+    for path in paths:
+        with open(path, "rb") as f:
+            assert f.read() == config.image
+    assert gw.db_get_sync_retries("电脑", gw.DEFAULT_CATEGORY_ID) == []